@@ -3,6 +3,7 @@ Django settings for abbasproject project.
 """
 
 from pathlib import Path
+from urllib.parse import unquote, urlsplit
 import os
 
 # ----------------- Basic Paths -----------------
@@ -29,6 +30,7 @@ INSTALLED_APPS = [
 # ----------------- Middleware -----------------
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'inventory.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -37,6 +39,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Opt-in request profiling; samples are published at /metrics (staff only).
+if os.environ.get('INVENTORY_PROFILING'):
+    MIDDLEWARE.insert(0, 'inventory.profiling.RequestProfilingMiddleware')
+INVENTORY_PROFILING_SAMPLE_RATE = float(os.environ.get('INVENTORY_PROFILING_SAMPLE_RATE', '0.05'))
+
 # ----------------- URL and WSGI -----------------
 ROOT_URLCONF = 'abbasproject.urls'
 WSGI_APPLICATION = 'abbasproject.wsgi.application'
@@ -62,13 +69,65 @@ TEMPLATES = [
 ]
 
 # ----------------- Database -----------------
+# Transactions take SQLite's write lock when they begin (BEGIN IMMEDIATE), so
+# concurrent writers wait their turn for up to `timeout` seconds instead of
+# failing with "database is locked"; inventory/db.py retries the rest.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        },
     }
 }
 
+# INVENTORY_DB_PROFILE=production tunes SQLite for serving: write-ahead
+# logging (pages are read while a sale is being written), fsync once per
+# checkpoint rather than per commit, a memory-mapped file and a larger page
+# cache, and connections kept open between requests. WAL is a property of
+# the database file, so it stays on once set.
+INVENTORY_SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',  # 256 MB
+    'PRAGMA cache_size=-32000',    # 32 MB
+    'PRAGMA temp_store=MEMORY',
+]
+if os.environ.get('INVENTORY_DB_PROFILE') == 'production':
+    DATABASES['default']['OPTIONS']['init_command'] = ';'.join(INVENTORY_SQLITE_PRAGMAS)
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('INVENTORY_CONN_MAX_AGE', '600'))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# INVENTORY_REPLICAS lists read replicas, comma separated: SQLite files (kept
+# in step locally with `manage.py sync_replica`) or postgres:// URLs. The
+# dashboard, list pages, exports and forecasts read from them
+# (inventory/routers.py); a user's reads stay on the primary for
+# INVENTORY_REPLICA_LAG seconds after they change anything, so replicas must
+# not fall further behind than that.
+INVENTORY_REPLICA_ALIASES = []
+INVENTORY_REPLICA_LAG = int(os.environ.get('INVENTORY_REPLICA_LAG', '10'))
+for _number, _location in enumerate(filter(None, os.environ.get('INVENTORY_REPLICAS', '').split(',')), 1):
+    _location = _location.strip()
+    if _location.startswith(('postgres://', 'postgresql://')):
+        _url = urlsplit(_location)
+        _replica = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': _url.path.lstrip('/'),
+            'USER': unquote(_url.username or ''),
+            'PASSWORD': unquote(_url.password or ''),
+            'HOST': _url.hostname or '',
+            'PORT': _url.port or '',
+        }
+    else:
+        _replica = dict(DATABASES['default'], NAME=_location)
+    # Tests run the replicas against the test database itself.
+    _replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica{_number}'] = _replica
+    INVENTORY_REPLICA_ALIASES.append(f'replica{_number}')
+DATABASE_ROUTERS = ['inventory.routers.PrimaryReplicaRouter']
+
 # ----------------- Password Validators -----------------
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -92,8 +151,46 @@ STATICFILES_DIRS = [
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# collectstatic writes content-hashed copies of static files, which the
+# web server can serve with "Cache-Control: public, max-age=31536000, immutable".
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'inventory.storage.HashedStaticFilesStorage'},
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Files produced by background exports; deliberately not under MEDIA_ROOT.
+INVENTORY_EXPORT_ROOT = BASE_DIR / 'exports'
+
+# ----------------- Cache -----------------
+# The per-user page cache (inventory/caching.py). INVENTORY_CACHE picks the
+# backend: "locmem" (default, a size-bounded LRU in each process),
+# "file:///path/to/dir", or a "redis://" URL for any Redis-compatible
+# server. Use a shared backend when running several processes, otherwise
+# changes made in one are not seen by the others until entries expire.
+INVENTORY_CACHE = os.environ.get('INVENTORY_CACHE', 'locmem')
+if INVENTORY_CACHE.startswith(('redis://', 'rediss://')):
+    _inventory_cache = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': INVENTORY_CACHE,
+    }
+elif INVENTORY_CACHE.startswith('file://'):
+    _inventory_cache = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': INVENTORY_CACHE[len('file://'):],
+    }
+else:
+    _inventory_cache = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'inventory',
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('INVENTORY_CACHE_MAX_ENTRIES', 2000))},
+    }
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'inventory': _inventory_cache,
+}
+
 # ----------------- Default Auto Field -----------------
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -1,6 +1,6 @@
 # Register your models here.
 from django.contrib import admin
-from .models import Supplier, Customer, Product, Sale, Purchase, ContactMessage
+from .models import Supplier, Customer, Product, Sale, Purchase, PurchaseOrder, ReorderSuggestion, ContactMessage, Job
 
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
@@ -21,6 +21,23 @@ class SaleAdmin(admin.ModelAdmin):
 @admin.register(Purchase)
 class PurchaseAdmin(admin.ModelAdmin):
     list_display = ('id', 'product_name', 'supplier', 'quantity', 'total_price', 'date')
+
+class ReorderSuggestionInline(admin.TabularInline):
+    model = ReorderSuggestion
+    extra = 0
+    raw_id_fields = ('product',)
+
+@admin.register(PurchaseOrder)
+class PurchaseOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'supplier', 'status', 'total', 'date')
+    list_filter = ('status',)
+    inlines = [ReorderSuggestionInline]
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'priority', 'attempts', 'run_after', 'finished_at')
+    list_filter = ('status', 'task')
+
 @admin.register(ContactMessage)
 class ContactAdmin(admin.ModelAdmin):
     list_display = ('id','full_name','email','submitted_at')
@@ -0,0 +1,142 @@
+"""
+Helpers shared by the ``bench_*`` management commands: a throwaway
+database to seed, a synthetic shop generator and simple timing stats.
+"""
+import contextlib
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from . import rollups, search
+from .models import Customer, Product, Sale, StockLot, Supplier
+
+
+@contextlib.contextmanager
+def benchmark_database(on_disk=True, verbosity=0):
+    """
+    Run the block against a freshly migrated scratch database so seeding
+    millions of rows never touches the real one. SQLite databases are put
+    in a temporary file by default, since an in-memory database hides I/O.
+    """
+    setup_test_environment()
+    tmpdir = None
+    if on_disk and connection.vendor == 'sqlite':
+        tmpdir = tempfile.mkdtemp(prefix='inventory-bench-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        teardown_test_environment()
+        if tmpdir:
+            os.rmdir(tmpdir)
+
+
+def create_bench_user(username='bench'):
+    return User.objects.create_user(username=username, password='bench-password')
+
+
+def seed_shop(user, products=100, suppliers=10, customers=100, sales=0, days=365,
+              batch_size=10000, seed=0):
+    """Bulk-insert a synthetic shop for ``user`` and return its products."""
+    rng = random.Random(seed)
+
+    Supplier.objects.bulk_create(
+        [Supplier(user=user, name=f'Supplier {i}', contact='0300', email=f'supplier{i}@example.com')
+         for i in range(suppliers)],
+        batch_size=batch_size,
+    )
+    supplier_ids = list(Supplier.objects.filter(user=user).values_list('id', flat=True))
+
+    Customer.objects.bulk_create(
+        [Customer(user=user, name=f'Customer {i}') for i in range(customers)],
+        batch_size=batch_size,
+    )
+    customer_ids = list(Customer.objects.filter(user=user).values_list('id', flat=True))
+
+    today = timezone.localdate()
+    new_products = []
+    for i in range(products):
+        cost = Decimal(rng.randint(50, 5000)) / 10
+        new_products.append(Product(
+            user=user,
+            name=f'Product {i}',
+            category=f'Category {i % 20}',
+            cost_price=cost,
+            selling_price=cost * Decimal('1.25'),
+            stock=rng.randint(0, 500),
+            supplier_id=rng.choice(supplier_ids) if supplier_ids else None,
+            expiry_date=today + timedelta(days=rng.randint(-30, 365)) if i % 3 == 0 else None,
+        ))
+    Product.objects.bulk_create(new_products, batch_size=batch_size)
+    product_rows = list(Product.objects.filter(user=user).values_list('id', 'selling_price', 'cost_price'))
+    search.index_products((product_id for product_id, _, _ in product_rows), new=True)
+    StockLot.objects.bulk_create(
+        [StockLot(user=user, product_id=pk, quantity=stock, remaining=stock, expiry_date=expiry_date)
+         for pk, stock, expiry_date in Product.objects.filter(user=user, stock__gt=0)
+         .values_list('pk', 'stock', 'expiry_date')],
+        batch_size=batch_size,
+    )
+
+    if sales:
+        seed_sales(user, product_rows, customer_ids, sales, days, batch_size, rng)
+        rollups.rebuild_rollups(user)
+    return product_rows
+
+
+def seed_sales(user, product_rows, customer_ids, count, days, batch_size, rng):
+    # ``Sale.date`` is auto_now_add, which bulk_create would overwrite, so
+    # the history is written with a raw executemany instead.
+    table = Sale._meta.db_table
+    sql = (
+        f'INSERT INTO {table} (user_id, product_id, customer_id, quantity, amount, cost, date) '
+        'VALUES (%s, %s, %s, %s, %s, %s, %s)'
+    )
+    end = timezone.now()
+    span = days * 86400
+    adapt_date = connection.ops.adapt_datetimefield_value
+    adapt_decimal = connection.ops.adapt_decimalfield_value
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, count, batch_size):
+            rows = []
+            for _ in range(min(batch_size, count - start)):
+                product_id, price, cost = rng.choice(product_rows)
+                quantity = rng.randint(1, 5)
+                rows.append((
+                    user.id,
+                    product_id,
+                    rng.choice(customer_ids) if customer_ids and rng.random() < 0.7 else None,
+                    quantity,
+                    adapt_decimal(price * quantity, 12, 2),
+                    adapt_decimal(cost * quantity, 12, 2),
+                    adapt_date(end - timedelta(seconds=rng.randrange(span))),
+                ))
+            cursor.executemany(sql, rows)
+
+
+def time_call(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'p50_ms': round(statistics.median(ordered) * 1000, 2),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2),
+    }
@@ -0,0 +1,217 @@
+"""
+Query-count and latency budgets for every URL in ``inventory/urls.py``.
+
+``check_budgets`` requests each page as a logged-in user and records how
+many queries it ran, the time spent in the database and the wall time.
+It is used by ``ViewBudgetTests`` on a small shop and by the
+``bench_views`` command on a large one; both fail on any view that goes
+over its budget.
+"""
+import itertools
+import json
+import statistics
+import time
+
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from .models import Job, Product, Supplier
+
+# url name -> (max queries, max wall time in ms). Query budgets must not
+# grow with the size of the shop; a view that needs more as data grows
+# has an N+1.
+BUDGETS = {
+    'home': (4, 250),
+    'products': (3, 500),
+    'product_add': (8, 250),
+    'product_search': (5, 250),
+    'import_inventory': (2, 250),
+    'export_data': (3, 1000),
+    'export_background': (3, 250),
+    'job_detail': (3, 250),
+    'autocomplete': (3, 250),
+    'product_view': (5, 250),
+    'product_edit': (4, 250),
+    'product_delete': (12, 250),
+    'suppliers': (3, 250),
+    'supplier_add': (4, 250),
+    'customers': (3, 250),
+    'customer_add': (1, 250),
+    'sales': (3, 250),
+    'sale_add': (12, 250),
+    'invoice_add': (13, 500),
+    'purchases': (3, 500),
+    'purchase_add': (11, 250),
+    'purchase_order_add': (12, 500),
+    'dashboard': (4, 250),
+    'reports': (7, 250),
+    'expiring': (5, 250),
+    'metrics': (2, 250),
+    'contact': (2, 250),
+    'register': (0, 250),
+    'login': (0, 250),
+    'logout': (5, 250),
+}
+
+_unique = itertools.count()
+_TRANSACTION_STATEMENTS = ('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def view_requests(user):
+    """
+    Return ``{url_name: (method, path, data)}`` for one visit to every
+    page. Views that change data get a payload of their own, so this is
+    called again for every round of measurements.
+    """
+    products = list(Product.objects.filter(user=user).order_by('id')[:5])
+    supplier = Supplier.objects.filter(user=user).order_by('id').first()
+    Product.objects.filter(pk__in=[p.pk for p in products]).update(stock=10 ** 6)
+    product = products[0]
+    n = next(_unique)
+    doomed = Product.objects.create(user=user, name=f'Budget delete {n}', cost_price=1, selling_price=1)
+    lines = [{'product': p.pk, 'quantity': 1} for p in products]
+    job = Job.objects.create(user=user, task='stats.rebuild', payload={'user_id': user.pk})
+
+    return {
+        'home': ('get', reverse('home'), None),
+        'products': ('get', reverse('products'), None),
+        'product_add': ('post', reverse('product_add'), {
+            'name': f'Budget product {n}', 'cost_price': '1', 'selling_price': '2', 'stock': 3,
+        }),
+        'product_search': ('get', reverse('product_search'), {'q': 'product'}),
+        'import_inventory': ('get', reverse('import_inventory'), None),
+        'export_data': ('get', reverse('export_data', args=['stock-valuation', 'csv']), None),
+        'export_background': ('post', reverse('export_background', args=['sales', 'csv']), {}),
+        'job_detail': ('get', reverse('job_detail', args=[job.pk]), None),
+        'autocomplete': ('get', reverse('autocomplete', args=['customers']), {'q': 'customer'}),
+        'product_view': ('get', reverse('product_view', args=[product.pk]), None),
+        'product_edit': ('get', reverse('product_edit', args=[product.pk]), None),
+        'product_delete': ('post', reverse('product_delete', args=[doomed.pk]), {}),
+        'suppliers': ('get', reverse('suppliers'), None),
+        'supplier_add': ('post', reverse('supplier_add'), {
+            'name': f'Budget supplier {n}', 'contact': '0300', 'email': 'budget@example.com',
+        }),
+        'customers': ('get', reverse('customers'), None),
+        'customer_add': ('post', reverse('customer_add'), {'name': f'Budget customer {n}'}),
+        'sales': ('get', reverse('sales'), None),
+        'sale_add': ('post', reverse('sale_add'), {'product': product.pk, 'quantity': 1, 'amount': '2'}),
+        'invoice_add': ('json', reverse('invoice_add'), {'lines': lines}),
+        'purchases': ('get', reverse('purchases'), None),
+        'purchase_add': ('post', reverse('purchase_add'), {
+            'supplier': supplier.pk, 'product': product.pk, 'quantity': 1, 'total_price': '1',
+        }),
+        'purchase_order_add': ('json', reverse('purchase_order_add'), {
+            'supplier': supplier.pk, 'lines': [dict(line, total_price='1') for line in lines],
+        }),
+        'dashboard': ('get', reverse('dashboard'), None),
+        'reports': ('get', reverse('reports'), None),
+        'expiring': ('get', reverse('expiring'), None),
+        'metrics': ('get', reverse('metrics'), None),
+        'contact': ('get', reverse('contact'), None),
+        'register': ('get', reverse('register'), None),
+        'login': ('get', reverse('login'), None),
+        'logout': ('get', reverse('logout'), None),
+    }
+
+
+class _QueryTimer:
+    """
+    ``connection.execute_wrapper`` that counts queries and sums their time.
+    ``BEGIN`` and savepoint statements are timed but not counted, since
+    which of them an atomic block needs depends on the caller (tests run
+    every request inside a transaction).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            if not sql.startswith(_TRANSACTION_STATEMENTS):
+                self.count += 1
+
+
+def measure(client, method, path, data):
+    """Request ``path`` once and return its status, query count, DB time and wall time."""
+    timer = _QueryTimer()
+    with connection.execute_wrapper(timer):
+        start = time.perf_counter()
+        if method == 'json':
+            response = client.post(path, json.dumps(data), content_type='application/json')
+        else:
+            response = getattr(client, method)(path, data)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        wall = time.perf_counter() - start
+    return {
+        'status': response.status_code,
+        'queries': timer.count,
+        'db_ms': round(timer.seconds * 1000, 2),
+        'wall_ms': round(wall * 1000, 2),
+    }
+
+
+def check_budgets(user, repeat=1, budgets=BUDGETS):
+    """
+    Visit every page ``repeat`` times and return one report row per url
+    name: the worst query count, median DB and wall times, the budget and
+    a list of the ways it was exceeded (empty when within budget). An
+    extra first round warms lazily built state, such as the dashboard
+    stats row, and is not recorded.
+    """
+    samples = {name: [] for name in budgets}
+    for round_number in range(repeat + 1):
+        for name, (method, path, data) in view_requests(user).items():
+            client = Client()
+            client.force_login(user)
+            result = measure(client, method, path, data)
+            if round_number:
+                samples[name].append((path, result))
+
+    report = []
+    for name, (max_queries, max_ms) in budgets.items():
+        path = samples[name][0][0]
+        runs = [run for _, run in samples[name]]
+        row = {
+            'view': name,
+            'path': path,
+            'status': runs[-1]['status'],
+            'queries': max(run['queries'] for run in runs),
+            'db_ms': round(statistics.median(run['db_ms'] for run in runs), 2),
+            'wall_ms': round(statistics.median(run['wall_ms'] for run in runs), 2),
+            'budget_queries': max_queries,
+            'budget_ms': max_ms,
+        }
+        row['over'] = [
+            problem for problem, failed in (
+                (f"{row['queries']} queries > {max_queries}", row['queries'] > max_queries),
+                (f"{row['wall_ms']}ms > {max_ms}ms", row['wall_ms'] > max_ms),
+                (f"HTTP {row['status']}", row['status'] >= 400),
+            ) if failed
+        ]
+        report.append(row)
+    return report
+
+
+def compare_reports(old, new, tolerance=0.2):
+    """
+    Yield ``(view, field, old, new)`` for every measurement that got worse:
+    any extra query, or a time more than ``tolerance`` slower.
+    """
+    before = {row['view']: row for row in old}
+    for row in new:
+        previous = before.get(row['view'])
+        if previous is None:
+            continue
+        if row['queries'] > previous['queries']:
+            yield row['view'], 'queries', previous['queries'], row['queries']
+        for field in ('db_ms', 'wall_ms'):
+            if row[field] > previous[field] * (1 + tolerance):
+                yield row['view'], field, previous[field], row[field]
@@ -0,0 +1,225 @@
+"""
+Per-user cache for list pages and the dashboard.
+
+Every user has a data version number, bumped whenever any of their
+products, suppliers, customers, sales, purchases or purchase orders change
+(by the receivers in ``inventory.signals``, and explicitly by code that
+writes with ``bulk_create`` or ``update()``). Cache keys include the
+version, so one bump makes every older entry unreachable and stale entries
+simply age out of the backend.
+
+``cached()`` stores query results (``acached()`` in async views); the ``{% usercache %}`` tag in the
+``caching`` template library stores rendered fragments. Both use the
+``inventory`` alias in ``CACHES`` (see ``INVENTORY_CACHE`` in settings), and
+hits and misses are counted per name for ``/metrics``.
+
+The version also makes the ETag of these pages (``conditional_page``), so
+a browser revalidating an unchanged page gets a 304 without the page
+being rendered or any of its data read.
+"""
+import functools
+import hashlib
+from inspect import iscoroutinefunction
+import threading
+import time
+from collections import Counter
+from datetime import date
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.db import transaction
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+TIMEOUT = 60 * 60
+
+_MISSING = object()
+_lock = threading.Lock()
+_counts = Counter()
+
+
+def get_cache():
+    return caches['inventory']
+
+
+def _version_key(user_id):
+    return f'inventory:version:{user_id}'
+
+
+def _new_version():
+    # Time based, so a version evicted from the cache is never handed out
+    # again while entries stored under it may still be around.
+    return time.time_ns() // 1000
+
+
+async def adata_version(user_id):
+    cache = get_cache()
+    version = await cache.aget(_version_key(user_id))
+    if version is None:
+        version = _new_version()
+        if not await cache.aadd(_version_key(user_id), version, None):
+            version = await cache.aget(_version_key(user_id), version)
+    return version
+
+
+def data_version(user_id):
+    cache = get_cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = _new_version()
+        if not cache.add(_version_key(user_id), version, None):
+            version = cache.get(_version_key(user_id), version)
+    return version
+
+
+def _written_key(user_id):
+    return f'inventory:written:{user_id}'
+
+
+def _bump(user_id):
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), _new_version(), None)
+    if settings.INVENTORY_REPLICA_ALIASES:
+        cache.set(_written_key(user_id), True, settings.INVENTORY_REPLICA_LAG)
+
+
+def recently_written(user_id):
+    """Whether ``user_id`` changed anything in the last ``INVENTORY_REPLICA_LAG`` seconds."""
+    return get_cache().get(_written_key(user_id)) is not None
+
+
+def invalidate(user_id):
+    """
+    Make everything cached for ``user_id`` stale. The version is bumped at
+    once, so the rest of the request sees its own writes, and again after
+    commit, so a request that read the old rows in between cannot have
+    cached them under the current version.
+    """
+    if user_id is None:
+        return
+    _bump(user_id)
+    transaction.on_commit(lambda: _bump(user_id))
+
+
+def reset(user_id):
+    """Forget the version of a new account, so a reused id starts afresh."""
+    get_cache().delete(_version_key(user_id))
+
+
+def _key(user_id, version, name, vary):
+    digest = hashlib.md5(repr(vary).encode(), usedforsecurity=False).hexdigest()
+    return f'inventory:{user_id}:{version}:{name}:{digest}'
+
+
+def make_key(user_id, name, *vary):
+    return _key(user_id, data_version(user_id), name, vary)
+
+
+def cached(user_id, name, compute, *vary, timeout=TIMEOUT):
+    """
+    Return ``compute()`` for ``user_id``, cached until their data changes.
+    ``vary`` are the other inputs of ``compute``, such as page cursors.
+    """
+    cache = get_cache()
+    key = make_key(user_id, name, *vary)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        _count(name, 'miss')
+        value = compute()
+        cache.set(key, value, timeout)
+    else:
+        _count(name, 'hit')
+    return value
+
+
+async def acached(user_id, name, compute, *vary, timeout=TIMEOUT):
+    """``cached()`` for async views, where ``compute`` is a coroutine function."""
+    cache = get_cache()
+    key = _key(user_id, await adata_version(user_id), name, vary)
+    value = await cache.aget(key, _MISSING)
+    if value is _MISSING:
+        _count(name, 'miss')
+        value = await compute()
+        await cache.aset(key, value, timeout)
+    else:
+        _count(name, 'hit')
+    return value
+
+
+def _count(name, result):
+    with _lock:
+        _counts[name, result] += 1
+
+
+def counts():
+    """``{(name, 'hit' | 'miss'): count}`` since the process started."""
+    with _lock:
+        return dict(_counts)
+
+
+def reset_counts():
+    with _lock:
+        _counts.clear()
+
+
+def render_metrics():
+    """Hit and miss counters in the Prometheus text exposition format."""
+    lines = [
+        '# HELP inventory_cache_requests_total Lookups in the per-user cache.',
+        '# TYPE inventory_cache_requests_total counter',
+    ]
+    for (name, result), count in sorted(counts().items()):
+        lines.append(f'inventory_cache_requests_total{{name="{name}",result="{result}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+@functools.lru_cache(maxsize=None)
+def _release():
+    """Fingerprint of the app's code and templates, so a deploy changes every ETag."""
+    app = Path(__file__).resolve().parent
+    files = sorted(app.glob('*.py')) + sorted(app.glob('templates/**/*.html'))
+    stamp = ';'.join(f'{path.relative_to(app)}:{path.stat().st_mtime_ns}' for path in files)
+    return hashlib.md5(stamp.encode(), usedforsecurity=False).hexdigest()[:8]
+
+
+def page_etag(request, *args, **kwargs):
+    """
+    ETag of a page that depends only on the user's data, the URL and the
+    date. Pages with flash messages to show, and anonymous requests, get
+    none. The CSRF cookie is part of the tag, because the page embeds a
+    token derived from it.
+    """
+    user_id = request.user.id
+    if user_id is None or len(get_messages(request)):
+        return None
+    parts = (
+        user_id, data_version(user_id), _release(), date.today().isoformat(),
+        request.get_full_path(), request.META.get('CSRF_COOKIE', ''),
+    )
+    return hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def conditional_page(view):
+    """
+    Answer ``If-None-Match`` for ``view`` from ``page_etag``. Browsers are
+    told to revalidate every time and shared caches not to store the page.
+    """
+    if not iscoroutinefunction(view):
+        return cache_control(private=True, no_cache=True)(condition(etag_func=page_etag)(view))
+
+    # condition() calls the tag function synchronously, and page_etag reads
+    # the session, which must not happen on the event loop.
+    view = condition(etag_func=lambda request, *args, **kwargs: request.inventory_etag)(view)
+
+    @functools.wraps(view)
+    async def tagged(request, *args, **kwargs):
+        request.user = await request.auser()
+        request.inventory_etag = await sync_to_async(page_etag)(request, *args, **kwargs)
+        return await view(request, *args, **kwargs)
+    return cache_control(private=True, no_cache=True)(tagged)
@@ -0,0 +1,131 @@
+"""
+Write transactions that cope with a busy SQLite database.
+
+SQLite allows one writer at a time. With ``transaction_mode = IMMEDIATE``
+(see ``DATABASES`` in settings) a transaction takes the write lock as it
+begins, so concurrent writers queue at ``BEGIN`` for up to the connection
+``timeout`` instead of failing with "database is locked" halfway through,
+after they have already read rows another writer is about to change.
+``write_transaction`` runs a function in such a transaction and, should
+the wait still time out under a burst of writes, tries again a bounded
+number of times.
+
+``insert_rows`` and ``add_to_column`` write many rows with one statement of
+hand-written SQL, for the paths (imports, invoices) where compiling an ORM
+query or building model instances per row costs more than the write.
+"""
+import functools
+import logging
+import random
+import time
+
+from django.db import OperationalError, connection, connections, router, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Field types whose values need converting before they reach the database;
+# everything else the callers pass as what the driver takes.
+_PREPARED_TYPES = {'DecimalField', 'DateField', 'DateTimeField', 'FileField', 'ImageField', 'JSONField'}
+
+ATTEMPTS = 3
+BACKOFF = 0.05  # seconds before the second attempt, doubled for each one after
+
+
+def is_locked(exc):
+    message = str(exc)
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def write_transaction(func):
+    """
+    Run ``func`` in ``transaction.atomic()``, up to ``ATTEMPTS`` times while
+    the database reports itself locked. Called inside another transaction
+    it runs once, as a savepoint: only the outermost transaction can be
+    retried.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.in_atomic_block:
+            with transaction.atomic():
+                return func(*args, **kwargs)
+        for attempt in range(1, ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as exc:
+                if attempt == ATTEMPTS or not is_locked(exc):
+                    raise
+                logger.warning("%s: database locked, retrying (attempt %s)", func.__qualname__, attempt)
+                time.sleep(BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+    return wrapper
+
+
+def insert_rows(model, rows):
+    """
+    Insert ``rows`` of ``{attname: value}`` into ``model``'s table with one
+    ``executemany``. Missing or empty fields get their defaults and ``auto_now``
+    fields the current time. Unlike ``bulk_create`` no model instances are
+    built and the SQL is compiled once, not for every value, which makes
+    large imports about twice as fast. No signals are sent.
+    """
+    if not rows:
+        return
+    # The connection itself, not the thread-local proxy: it is used for every value.
+    db = connections[router.db_for_write(model)]
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    now = timezone.now()
+
+    columns = []
+    for field in fields:
+        convert = field.get_internal_type() in _PREPARED_TYPES
+        auto_now = getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+        default = now if auto_now else field.get_default()
+        if convert and default is not None:
+            default = field.get_db_prep_save(default, db)
+        columns.append((field, field.attname, default, convert))
+    qn = db.ops.quote_name
+    sql = (
+        f"INSERT INTO {qn(model._meta.db_table)} ({', '.join(qn(field.column) for field in fields)}) "
+        f"VALUES ({', '.join(['%s'] * len(fields))})"
+    )
+    params = []
+    for row in rows:
+        values = []
+        for field, attname, default, convert in columns:
+            value = row.get(attname)
+            if value is None:
+                value = default
+            elif convert:
+                value = field.get_db_prep_save(value, db)
+            values.append(value)
+        params.append(values)
+    with db.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def add_to_column(model, column, deltas, floor=None):
+    """
+    Add ``{pk: delta}`` to an integer ``column`` of ``model`` rows in one
+    UPDATE with a CASE branch per row. With a ``floor``, rows the delta would
+    take below it are left alone. Returns the number of rows updated.
+    """
+    if not deltas:
+        return 0
+    db = connections[router.db_for_write(model)]
+    qn = db.ops.quote_name
+    pk = qn(model._meta.pk.column)
+    target = qn(model._meta.get_field(column).column)
+    branches = [value for item in deltas.items() for value in item]
+    case = f"CASE {pk} {' '.join(['WHEN %s THEN %s'] * len(deltas))} END"
+    sql = (
+        f"UPDATE {qn(model._meta.db_table)} SET {target} = {target} + {case} "
+        f"WHERE {pk} IN ({', '.join(['%s'] * len(deltas))})"
+    )
+    params = branches + list(deltas)
+    if floor is not None:
+        sql += f" AND {target} + {case} >= %s"
+        params += branches + [floor]
+    with db.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
@@ -0,0 +1,112 @@
+"""
+Streaming CSV / JSON Lines exports of sales, purchases and stock valuation.
+
+Rows come from ``values_list(...).iterator()`` so neither model instances
+nor the full result set are ever held in memory; each row is encoded and
+yielded as soon as it is read.
+"""
+import csv
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.utils import timezone
+
+from .models import Product, Purchase, Sale
+
+CHUNK_SIZE = 2000
+CENTS = Decimal('0.01')
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def _sales(user):
+    return Sale.objects.filter(user=user).order_by('date', 'id').values_list(
+        'id', 'date', 'product__name', 'customer__name', 'quantity', 'amount', 'invoice_id',
+    )
+
+
+def _purchases(user):
+    return Purchase.objects.filter(user=user).order_by('date', 'id').values_list(
+        'id', 'date', 'supplier__name', 'product_name', 'quantity', 'total_price',
+    )
+
+
+def _stock_valuation(user):
+    value = ExpressionWrapper(F('stock') * F('cost_price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+    return Product.objects.filter(user=user).order_by('id').annotate(value=value).values_list(
+        'id', 'name', 'category', 'stock', 'cost_price', 'value',
+    )
+
+
+EXPORTS = {
+    'sales': (['id', 'date', 'product', 'customer', 'quantity', 'amount', 'invoice'], _sales),
+    'purchases': (['id', 'date', 'supplier', 'product', 'quantity', 'total_price'], _purchases),
+    'stock-valuation': (['id', 'name', 'category', 'stock', 'cost_price', 'value'], _stock_valuation),
+}
+
+
+class _Echo:
+    """File-like object whose ``write`` just hands the line back."""
+
+    def write(self, value):
+        return value
+
+
+def _clean(value):
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.localtime(value)
+    if isinstance(value, Decimal):
+        # SQLite drops trailing zeros from computed decimals like ``value``.
+        return value.quantize(CENTS)
+    return value
+
+
+def stream_export(user, kind, fmt):
+    """
+    Yield the export as text chunks. The header goes out on its own so the
+    response starts immediately; rows are then sent ``CHUNK_SIZE`` at a time
+    rather than one tiny write per row.
+    """
+    header, queryset = EXPORTS[kind]
+    rows = queryset(user).iterator(chunk_size=CHUNK_SIZE)
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(header)
+        lines = (writer.writerow([_clean(value) for value in row]) for row in rows)
+    elif fmt == 'jsonl':
+        encoder = DjangoJSONEncoder(separators=(',', ':'))
+        lines = (encoder.encode(dict(zip(header, map(_clean, row)))) + '\n' for row in rows)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def export_storage():
+    """Where background exports are written; outside MEDIA_ROOT so they are never served publicly."""
+    return FileSystemStorage(location=settings.INVENTORY_EXPORT_ROOT)
+
+
+def write_export(user, kind, fmt):
+    """Write the export to ``export_storage()`` and return the stored file name."""
+    with tempfile.TemporaryFile('w+b') as f:
+        for chunk in stream_export(user, kind, fmt):
+            f.write(chunk.encode('utf-8'))
+        f.seek(0)
+        return export_storage().save(f'{user.pk}/{kind}-{timezone.localdate()}.{fmt}', File(f))
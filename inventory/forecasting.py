@@ -0,0 +1,176 @@
+"""
+Demand forecasts for every product of a shop in one pass.
+
+Quantities and amounts sold per product per day over the last
+``HISTORY_DAYS`` complete days are read with one aggregate query into
+products x days matrices. Each row is split into a weekday profile and an
+exponentially smoothed level, and the forecast for a future day is
+``level + profile[weekday]`` (never below zero). NumPy does this for all
+products at once when it is installed; otherwise the same arithmetic runs
+in pure Python, which is fine for a small catalogue.
+
+Only completed days are used, so forecasts are cached per user until the
+date changes.
+"""
+from array import array
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Case, FloatField, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import Sale
+
+HISTORY_DAYS = 56  # whole weeks, so every weekday is seen equally often
+HORIZON = 8  # today, which is not in the history, and the week after it
+ALPHA = 0.3
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def smoothing_weights(days, alpha=ALPHA):
+    """
+    Weights that turn a series into its exponentially smoothed final level
+    (seeded with the first value), so the whole recurrence is one dot
+    product per row.
+    """
+    weights = [alpha * (1 - alpha) ** (days - 1 - j) for j in range(days)]
+    weights[0] = (1 - alpha) ** (days - 1)
+    return weights
+
+
+def forecast_rows(rows, horizon=HORIZON, alpha=ALPHA):
+    """
+    Forecast the ``horizon`` days that follow a products x days matrix
+    whose width is a multiple of seven. Returns a products x horizon
+    matrix of the same kind as ``rows`` (NumPy array or list of lists).
+    """
+    if numpy is not None and isinstance(rows, numpy.ndarray):
+        return _forecast_numpy(rows, horizon, alpha)
+    return [_forecast_row(row, horizon, alpha) for row in rows]
+
+
+def _forecast_numpy(rows, horizon, alpha):
+    products, days = rows.shape
+    profile = rows.reshape(products, days // 7, 7).mean(axis=1)
+    profile -= profile.mean(axis=1, keepdims=True)
+    deseasonalized = rows - numpy.tile(profile, days // 7)
+    level = deseasonalized @ numpy.array(smoothing_weights(days, alpha))
+    ahead = [(days + h) % 7 for h in range(horizon)]
+    return numpy.clip(level[:, None] + profile[:, ahead], 0, None)
+
+
+def _forecast_row(row, horizon, alpha):
+    days = len(row)
+    weeks = days // 7
+    profile = [sum(row[week * 7 + phase] for week in range(weeks)) / weeks for phase in range(7)]
+    mean = sum(profile) / 7
+    profile = [value - mean for value in profile]
+    level = sum(w * (x - profile[j % 7]) for j, (w, x) in enumerate(zip(smoothing_weights(days, alpha), row)))
+    return [max(0.0, level + profile[(days + h) % 7]) for h in range(horizon)]
+
+
+def daily_sales(user_id, today, days=HISTORY_DAYS):
+    """
+    Return ``(product_ids, quantities, amounts)`` for the ``days`` complete
+    days before ``today``: sorted product ids and two matching
+    products x days matrices, from a single aggregate query.
+    """
+    start = today - timedelta(days=days)
+    bounds = [_start_of_day(start + timedelta(days=i)) for i in range(days + 1)]
+    cells = list(
+        Sale.objects.filter(user_id=user_id, date__gte=bounds[0], date__lt=bounds[-1])
+        .annotate(day=_day_number(bounds, 0, days))
+        .values('product_id', 'day')
+        .annotate(quantity=Sum('quantity'), amount=Sum('amount', output_field=FloatField()))
+        .values_list('product_id', 'day', 'quantity', 'amount')
+        .order_by()
+    )
+
+    if numpy is not None:
+        cells = numpy.array(cells, dtype=float).reshape(-1, 4)
+        product_ids, rows = numpy.unique(cells[:, 0].astype(numpy.int64), return_inverse=True)
+        columns = cells[:, 1].astype(numpy.intp)
+        quantities = numpy.zeros((len(product_ids), days))
+        amounts = numpy.zeros((len(product_ids), days))
+        quantities[rows, columns] = cells[:, 2]
+        amounts[rows, columns] = cells[:, 3]
+        return product_ids.tolist(), quantities, amounts
+
+    product_ids = sorted({cell[0] for cell in cells})
+    index = {pk: i for i, pk in enumerate(product_ids)}
+    quantities = [[0.0] * days for _ in product_ids]
+    amounts = [[0.0] * days for _ in product_ids]
+    for pk, day, quantity, amount in cells:
+        quantities[index[pk]][day] = float(quantity)
+        amounts[index[pk]][day] = amount
+    return product_ids, quantities, amounts
+
+
+def _day_number(bounds, lo, hi):
+    """
+    ``Sale.date`` as a day number between ``lo`` and ``hi``, found by
+    binary search over the day boundaries. Plain comparisons keep SQLite
+    from calling back into Python for every row, as ``TruncDate`` would.
+    """
+    if hi - lo == 1:
+        return Value(lo)
+    mid = (lo + hi) // 2
+    return Case(
+        When(date__lt=bounds[mid], then=_day_number(bounds, lo, mid)),
+        default=_day_number(bounds, mid, hi),
+        output_field=IntegerField(),
+    )
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class Forecasts:
+    """
+    Per-product forecasts for one shop, stored in flat arrays so a cached
+    copy of a large catalogue loads quickly.
+    """
+
+    def __init__(self, product_ids, tomorrow, next_week, revenue_next_week):
+        self.product_ids = array('q', product_ids)
+        self.tomorrow = array('d', tomorrow)
+        self.next_week = array('d', next_week)
+        self.revenue_next_week = revenue_next_week
+
+    def for_product(self, product_id):
+        """``(tomorrow, next_week)`` quantities; zero for products with no recent sales."""
+        i = bisect_left(self.product_ids, product_id)
+        if i < len(self.product_ids) and self.product_ids[i] == product_id:
+            return self.tomorrow[i], self.next_week[i]
+        return 0.0, 0.0
+
+
+def build_forecasts(user_id, today=None):
+    today = today or timezone.localdate()
+    product_ids, quantities, amounts = daily_sales(user_id, today)
+    units = forecast_rows(quantities)
+    revenue = forecast_rows(amounts)
+    if numpy is not None:
+        return Forecasts(product_ids, units[:, 1], units[:, 1:].sum(axis=1), float(revenue[:, 1:].sum()))
+    return Forecasts(
+        product_ids,
+        [row[1] for row in units],
+        [sum(row[1:]) for row in units],
+        sum(sum(row[1:]) for row in revenue),
+    )
+
+
+def get_forecasts(user_id, today=None):
+    today = today or timezone.localdate()
+    key = f'inventory:forecasts:{user_id}:{today.isoformat()}'
+    forecasts = cache.get(key)
+    if forecasts is None:
+        forecasts = build_forecasts(user_id, today)
+        cache.set(key, forecasts, 24 * 60 * 60)
+    return forecasts
@@ -1,7 +1,10 @@
 from django import forms
 from .models import Product, ContactMessage, Supplier, Customer, Sale, Purchase
+from .widgets import Autocomplete
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
+from django.utils import timezone
+from datetime import datetime, time, timedelta
 
 class RegisterForm(UserCreationForm):
     email = forms.EmailField(
@@ -38,7 +41,20 @@ class RegisterForm(UserCreationForm):
             field.help_text = ""
 
 
-class ProductForm(forms.ModelForm):
+class AutocompleteFieldsMixin:
+    """
+    The queryset of an autocomplete field has already looked up the
+    submitted id for this user, so the model's own check that the row
+    exists is skipped rather than run as a second query.
+    """
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        exclude.update(name for name, field in self.fields.items() if isinstance(field.widget, Autocomplete))
+        return exclude
+
+
+class ProductForm(AutocompleteFieldsMixin, forms.ModelForm):
     class Meta:
         model = Product
         fields = [
@@ -58,7 +74,7 @@ class ProductForm(forms.ModelForm):
             'cost_price': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'selling_price': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'stock': forms.NumberInput(attrs={'class': 'form-control'}),
-            'supplier': forms.Select(attrs={'class': 'form-select'}),
+            'supplier': Autocomplete('suppliers'),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'image': forms.ClearableFileInput(attrs={'class': 'form-control'}),
             'expiry_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
@@ -66,9 +82,19 @@ class ProductForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
+        self.user = user
         if user:
             self.fields['supplier'].queryset = Supplier.objects.filter(user=user)
 
+    def clean_name(self):
+        # (user, name) is unique, but user is not a form field so the
+        # ModelForm's own unique check skips it.
+        name = self.cleaned_data['name']
+        owner = self.user or self.instance.user
+        if owner and Product.objects.filter(user=owner, name=name).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError("You already have a product with this name.")
+        return name
+
 
 
 class ContactForm(forms.ModelForm):
@@ -99,13 +125,15 @@ class SupplierForm(forms.ModelForm):
         widgets = {'name': forms.TextInput(attrs={'class': 'form-control'})}
 
 
-class SaleForm(forms.ModelForm):
+class SaleForm(AutocompleteFieldsMixin, forms.ModelForm):
+    quantity = forms.IntegerField(min_value=1)
+
     class Meta:
         model = Sale
         fields = ['product', 'customer', 'quantity', 'amount']
         widgets = {
-            'product': forms.Select(attrs={'class': 'form-select'}),
-            'customer': forms.Select(attrs={'class': 'form-select'}),
+            'product': Autocomplete('products'),
+            'customer': Autocomplete('customers'),
         }
 
     def __init__(self, *args, **kwargs):
@@ -117,17 +145,100 @@ class SaleForm(forms.ModelForm):
             self.fields['customer'].queryset = Customer.objects.filter(user=user)
 
 
+class ImportForm(forms.Form):
+    kind = forms.ChoiceField(choices=[('products', 'Products'), ('customers', 'Customers'),
+                                      ('suppliers', 'Suppliers')],
+                             widget=forms.Select(attrs={'class': 'form-select'}))
+    file = forms.FileField(widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}))
+
+
+class InvoiceForm(forms.Form):
+    customer = forms.IntegerField(required=False, min_value=1)
+
+
+class InvoiceLineForm(forms.Form):
+    product = forms.IntegerField(min_value=1)
+    quantity = forms.IntegerField(min_value=1)
+    amount = forms.DecimalField(max_digits=12, decimal_places=2, min_value=0, required=False)
+
+
+class SaleFilterForm(forms.Form):
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    product = forms.ModelChoiceField(queryset=Product.objects.none(), required=False,
+                                     widget=Autocomplete('products'))
+    customer = forms.ModelChoiceField(queryset=Customer.objects.none(), required=False,
+                                      widget=Autocomplete('customers'))
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user')
+        super().__init__(*args, **kwargs)
+        self.fields['product'].queryset = Product.objects.filter(user=user).only('id', 'name')
+        self.fields['customer'].queryset = Customer.objects.filter(user=user).only('id', 'name')
+
+    def filter(self, queryset):
+        data = self.cleaned_data
+        # Compare against day boundaries rather than ``date__date`` so the
+        # (user, date, id) index can still be used for the range.
+        if data.get('date_from'):
+            queryset = queryset.filter(date__gte=_start_of_day(data['date_from']))
+        if data.get('date_to'):
+            queryset = queryset.filter(date__lt=_start_of_day(data['date_to'] + timedelta(days=1)))
+        if data.get('product'):
+            queryset = queryset.filter(product=data['product'])
+        if data.get('customer'):
+            queryset = queryset.filter(customer=data['customer'])
+        return queryset
+
+
+class ReportForm(forms.Form):
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get('start') and cleaned.get('end') and cleaned['start'] > cleaned['end']:
+            raise forms.ValidationError("The start date must not be after the end date.")
+        return cleaned
 
 
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
 
 
-class PurchaseForm(forms.ModelForm):
+
+
+
+class PurchaseForm(AutocompleteFieldsMixin, forms.ModelForm):
+    expiry_date = forms.DateField(required=False, help_text="Leave empty for stock that does not expire.",
+                                  widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    quantity = forms.IntegerField(min_value=1, widget=forms.NumberInput(attrs={'class': 'form-control'}))
+
     class Meta:
         model = Purchase
-        fields = ['supplier', 'product_name', 'quantity', 'total_price']
+        fields = ['supplier', 'product', 'quantity', 'total_price']
         widgets = {
-            'supplier': forms.Select(attrs={'class': 'form-select'}),
-            'product_name': forms.TextInput(attrs={'class': 'form-control'}),
-            'quantity': forms.NumberInput(attrs={'class': 'form-control'}),
+            'supplier': Autocomplete('suppliers'),
+            'product': Autocomplete('products'),
             'total_price': forms.NumberInput(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        self.fields['product'].required = True
+
+        if user:
+            self.fields['supplier'].queryset = Supplier.objects.filter(user=user)
+            self.fields['product'].queryset = Product.objects.filter(user=user)
+
+
+class PurchaseOrderForm(forms.Form):
+    supplier = forms.IntegerField(min_value=1)
+
+
+class PurchaseOrderLineForm(forms.Form):
+    product = forms.IntegerField(min_value=1)
+    quantity = forms.IntegerField(min_value=1)
+    total_price = forms.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    expiry_date = forms.DateField(required=False)
@@ -0,0 +1,85 @@
+from collections import Counter
+from decimal import Decimal
+
+from django.utils import timezone
+
+from . import caching, rollups, stats
+from .db import insert_rows, write_transaction
+from .models import Customer, Invoice, Product, Sale, StockMovement
+from .stock import remove_stock_many
+
+
+class InvoiceError(Exception):
+    pass
+
+
+def create_invoice(user, lines, customer_id=None):
+    """
+    Record a multi-line sale. ``lines`` are dicts with ``product`` (id),
+    ``quantity`` and an optional ``amount`` (defaults to selling price x
+    quantity). Stock for every line is taken in one statement; if any
+    product is short the whole basket is rejected with ``InsufficientStock``.
+    """
+    if not lines:
+        raise InvoiceError("An invoice needs at least one line.")
+
+    # Reads happen before the transaction, which holds the write lock.
+    products = {
+        pk: (selling_price, cost_price)
+        for pk, selling_price, cost_price in Product.objects.filter(
+            user=user, pk__in={line['product'] for line in lines},
+        ).values_list('id', 'selling_price', 'cost_price')
+    }
+    missing = sorted({line['product'] for line in lines} - set(products))
+    if missing:
+        raise InvoiceError(f"Unknown product(s): {', '.join(map(str, missing))}")
+    customer = None
+    if customer_id is not None:
+        customer = Customer.objects.filter(user=user, pk=customer_id).first()
+        if customer is None:
+            raise InvoiceError(f"Unknown customer: {customer_id}")
+
+    quantities = Counter()
+    sales = []
+    for line in lines:
+        quantities[line['product']] += line['quantity']
+        selling_price, cost_price = products[line['product']]
+        amount = line.get('amount')
+        if amount is None:
+            amount = selling_price * line['quantity']
+        sales.append({'user_id': user.id, 'product_id': line['product'],
+                      'customer_id': customer and customer.id, 'quantity': line['quantity'],
+                      'amount': amount, 'cost': cost_price * line['quantity']})
+
+    return _save_invoice(user, customer, sales, quantities)
+
+
+@write_transaction
+def _save_invoice(user, customer, sales, quantities):
+    # Every write is one statement for the whole basket, in SQL compiled
+    # once: building and saving model instances per line cost more than the
+    # writes themselves.
+    remove_stock_many(quantities)
+    invoice = Invoice.objects.create(
+        user=user, customer=customer, total=sum((sale['amount'] for sale in sales), Decimal('0')),
+    )
+    now = timezone.now()
+    for sale in sales:
+        sale['invoice_id'] = invoice.id
+        sale['date'] = now
+    insert_rows(Sale, sales)
+    # Ids are not returned by executemany(); they follow the insert order.
+    pks = Sale.objects.filter(invoice=invoice).order_by('id').values_list('id', flat=True)
+    insert_rows(StockMovement, [
+        {'user_id': user.id, 'product_id': sale['product_id'], 'change': -sale['quantity'],
+         'reason': StockMovement.SALE, 'sale_id': pk, 'created_at': now}
+        for pk, sale in zip(pks, sales)
+    ])
+    # The inserts skip the post_save handlers that maintain the dashboard
+    # and the page cache.
+    stats.record_sales(user.id, [(sale['amount'], 1) for sale in sales])
+    rollups.record_sales(user.id, [
+        (sale['product_id'], now, sale['quantity'], sale['amount'], sale['cost']) for sale in sales
+    ])
+    caching.invalidate(user.id)
+    return invoice
@@ -0,0 +1,174 @@
+"""
+A small job queue kept in the database, so slow work can leave the
+request thread without Redis, Celery or any other broker.
+
+Tasks are plain functions registered with ``@task('name')`` that take the
+job's JSON payload as keyword arguments and return something JSON
+serializable. ``enqueue`` stores a ``Job``; ``manage.py run_workers``
+runs them, highest priority first.
+
+Workers claim a job with a conditional UPDATE (``status='queued'``), so
+two workers never run the same job on any database. A failed job is
+retried with exponential backoff until ``max_attempts``, and jobs whose
+worker died are put back in the queue after ``STALE_AFTER`` (or failed,
+once they are out of attempts).
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+STALE_AFTER = timedelta(minutes=15)
+POLL_INTERVAL = 1.0
+
+
+def task(name):
+    """Register the decorated function as the task called ``name``."""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, user=None, priority=0, idempotency_key=None, delay=None, max_attempts=3):
+    """
+    Queue ``name`` and return its ``Job``. With an ``idempotency_key``,
+    enqueueing the same key again returns the existing job instead.
+    """
+    if name not in TASKS:
+        raise KeyError(f"Unknown task: {name}")
+    fields = {
+        'task': name,
+        'payload': payload or {},
+        'user': user,
+        'priority': priority,
+        'max_attempts': max_attempts,
+        'run_after': timezone.now() + (delay or timedelta()),
+    }
+    if idempotency_key is None:
+        return Job.objects.create(**fields)
+    try:
+        with transaction.atomic():
+            return Job.objects.create(idempotency_key=idempotency_key, **fields)
+    except IntegrityError:
+        return Job.objects.get(idempotency_key=idempotency_key)
+
+
+def claim(worker_id):
+    """Take the most urgent job that is due, or return ``None``."""
+    now = timezone.now()
+    queue = Job.objects.filter(status=Job.QUEUED, run_after__lte=now).order_by('-priority', 'run_after', 'id')
+    for pk in queue.values_list('pk', flat=True)[:10]:
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run(job):
+    """Run a claimed job and record the outcome."""
+    try:
+        result = TASKS[job.task](**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=2 ** job.attempts)
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+        logger.warning("Job %s (%s) failed on attempt %s", job.pk, job.task, job.attempts)
+    else:
+        job.status = Job.DONE
+        job.result = result
+        job.finished_at = timezone.now()
+    job.locked_by = ''
+    job.locked_at = None
+    job.save(update_fields=['status', 'result', 'last_error', 'run_after', 'finished_at', 'locked_by', 'locked_at'])
+    return job
+
+
+def requeue_stale(older_than=STALE_AFTER):
+    """
+    Put back jobs whose worker stopped before finishing them. A job that
+    has used all its attempts is failed instead, since it may be what
+    killed the worker.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - older_than)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, locked_by='', locked_at=None,
+        last_error='The worker died while running this job, and it has no attempts left.',
+    )
+    return stale.filter(attempts__lt=F('max_attempts')).update(status=Job.QUEUED, locked_by='', locked_at=None)
+
+
+def work(worker_id, stop=None, burst=False, poll_interval=POLL_INTERVAL):
+    """
+    Run jobs until ``stop`` is set. With ``burst`` return as soon as the
+    queue has nothing due. Returns the number of jobs run.
+    """
+    stop = stop or threading.Event()
+    done = 0
+    while not stop.is_set():
+        close_old_connections()
+        job = claim(worker_id)
+        if job is None:
+            if burst:
+                break
+            requeue_stale()
+            stop.wait(poll_interval)
+            continue
+        run(job)
+        done += 1
+    return done
+
+
+def run_pool(threads=1, stop=None, burst=False, poll_interval=POLL_INTERVAL):
+    """Run ``threads`` workers in this process until ``stop`` is set (or the queue drains with ``burst``)."""
+    stop = stop or threading.Event()
+    prefix = f'{socket.gethostname()}:{os.getpid()}'
+    if threads == 1:
+        try:
+            work(f'{prefix}:0', stop, burst, poll_interval)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    def target(n):
+        try:
+            work(f'{prefix}:{n}', stop, burst, poll_interval)
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=target, args=(n,), daemon=True) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+
+def run_process(threads, burst, poll_interval):
+    """Entry point for worker processes started by ``run_workers --processes``."""
+    import django
+    django.setup()
+    run_pool(threads, burst=burst, poll_interval=poll_interval)
@@ -0,0 +1,129 @@
+"""
+Stock lots: every delivery (and opening stock or upward adjustment) is a
+``StockLot`` with its own quantity, expiry date and unit cost, and stock
+leaves first-expiry-first-out, lots without an expiry date last.
+
+``inventory.stock`` receives and takes lots alongside every change to
+``Product.stock``; purchase orders call ``receive`` themselves. Lots with
+stock left are indexed by expiry, so "expiring in the next N days" and
+"expired stock value" read only the lots in that range.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import (
+    Count, DecimalField, ExpressionWrapper, F, Min, OuterRef, Subquery, Sum,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .db import add_to_column
+from .models import Product, StockLot
+
+UNIT_COST_PLACES = Decimal('0.0001')
+
+
+def unit_cost(total, quantity):
+    return (Decimal(str(total)) / quantity).quantize(UNIT_COST_PLACES)
+
+
+def open_lots():
+    return StockLot.objects.filter(remaining__gt=0)
+
+
+def fefo_order():
+    return (F('expiry_date').asc(nulls_last=True), 'id')
+
+
+def receive(lots):
+    """Save new ``StockLot`` objects; ``remaining`` defaults to ``quantity``."""
+    for lot in lots:
+        if lot.remaining is None:
+            lot.remaining = lot.quantity
+    created = StockLot.objects.bulk_create(lots)
+    dated = {lot.product_id for lot in created if lot.expiry_date is not None}
+    if dated:
+        refresh_expiry(dated)
+    return created
+
+
+def take(quantities):
+    """
+    Take ``{product_id: quantity}`` out of each product's lots, earliest
+    expiry first. If the lots hold less than that (stock changed outside
+    ``inventory.stock``, e.g. in the admin), they are all emptied.
+    """
+    lots = (
+        open_lots().filter(product_id__in=quantities).select_for_update()
+        .order_by('product_id', *fefo_order()).values_list('pk', 'product_id', 'remaining')
+    )
+    needed = dict(quantities)
+    takes = {}
+    emptied = set()
+    for pk, product_id, remaining in lots:
+        if needed[product_id] <= 0:
+            continue
+        taken = min(needed[product_id], remaining)
+        needed[product_id] -= taken
+        takes[pk] = taken
+        if taken == remaining:
+            emptied.add(product_id)
+    if not takes:
+        return
+    add_to_column(StockLot, 'remaining', {pk: -taken for pk, taken in takes.items()})
+    # The earliest expiry only changes when a lot is used up.
+    if emptied:
+        refresh_expiry(emptied)
+
+
+def redate(product_id, old, new):
+    """
+    Change the expiry of a product's lots with stock left that expire on
+    ``old``. A product with no such lot (e.g. out of stock) keeps ``new``
+    as its own expiry date.
+    """
+    lots = open_lots().filter(product_id=product_id)
+    lots = lots.filter(expiry_date__isnull=True) if old is None else lots.filter(expiry_date=old)
+    if lots.update(expiry_date=new):
+        refresh_expiry([product_id])
+    else:
+        Product.objects.filter(pk=product_id).update(expiry_date=new)
+
+
+def refresh_expiry(product_ids):
+    """Set ``Product.expiry_date`` to the earliest expiry of its lots with stock left."""
+    earliest = open_lots().filter(product=OuterRef('pk')).values('product').annotate(first=Min('expiry_date'))
+    Product.objects.filter(pk__in=product_ids).update(expiry_date=Subquery(earliest.values('first')))
+
+
+def _value():
+    cost = Coalesce('unit_cost', 'product__cost_price')
+    return ExpressionWrapper(F('remaining') * cost, output_field=DecimalField(max_digits=16, decimal_places=4))
+
+
+def expiring(user, days, today=None):
+    """Lots with stock left that expire within ``days`` days from ``today``, soonest first."""
+    today = today or timezone.localdate()
+    return (
+        open_lots().filter(user=user, expiry_date__range=(today, today + timedelta(days=days)))
+        .select_related('product').only('id', 'remaining', 'expiry_date', 'unit_cost', 'product__name',
+                                         'product__cost_price')
+        .annotate(value=_value()).order_by('expiry_date', 'id')
+    )
+
+
+def expired(user, today=None):
+    """Lots with stock left past their expiry date, most recently expired first."""
+    today = today or timezone.localdate()
+    return (
+        open_lots().filter(user=user, expiry_date__lt=today)
+        .select_related('product').only('id', 'remaining', 'expiry_date', 'unit_cost', 'product__name',
+                                         'product__cost_price')
+        .annotate(value=_value()).order_by('-expiry_date', '-id')
+    )
+
+
+def expired_stock(user, today=None):
+    """``{'lots', 'units', 'value'}`` of the stock past its expiry date."""
+    totals = expired(user, today).order_by().aggregate(lots=Count('pk'), units=Sum('remaining'), value=Sum(_value()))
+    return {'lots': totals['lots'], 'units': totals['units'] or 0, 'value': totals['value'] or Decimal('0')}
@@ -0,0 +1,51 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+from inventory import caching, thumbnails
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = "Generate image renditions for products that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Processes resizing images in parallel (1 runs in this process).")
+        parser.add_argument('--force', action='store_true',
+                            help="Also check products that already have renditions.")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image=None)
+        if not options['force']:
+            products = products.filter(image_hash='')
+        # Several products may share one file; each is resized once.
+        names = sorted(set(products.values_list('image', flat=True)))
+        if not names:
+            self.stdout.write("Nothing to do.")
+            return
+
+        if options['workers'] <= 1:
+            results = map(thumbnails.backfill_one, names)
+            self._save(results, len(names))
+            return
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(options['workers'], mp_context=context, initializer=django.setup) as pool:
+            self._save(pool.map(thumbnails.backfill_one, names, chunksize=4), len(names))
+
+    def _save(self, results, total):
+        failed = 0
+        updated = []
+        for name, digest, error in results:
+            if error:
+                failed += 1
+                self.stderr.write(f"{name}: {error}")
+                continue
+            Product.objects.filter(image=name).update(image_hash=digest)
+            updated.append(name)
+        for user_id in set(Product.objects.filter(image__in=updated).values_list('user_id', flat=True)):
+            caching.invalidate(user_id)
+        self.stdout.write(f"Processed {len(updated)} of {total} image(s), {failed} failed.")
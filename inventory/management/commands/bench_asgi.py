@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.conf import settings
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from inventory.benchmarks import benchmark_database, create_bench_user, seed_shop, summarize
+
+VIEWS = ('home', 'dashboard', 'products')
+
+# Every request renders the page: with the per-user page cache in place
+# all but the first would be cache hits, and clearing it before each
+# request would still let concurrent requests hit what another just stored.
+NO_PAGE_CACHE = {'inventory': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare page latency under concurrent load when served through Django's WSGI handler "
+        "(a thread per request) and its ASGI handler (one event loop), with the page cache off."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', action='append', dest='views', choices=VIEWS,
+                            help="Page to request (may be repeated; default: all).")
+        parser.add_argument('--concurrency', type=int, default=8, help="Requests in flight at once.")
+        parser.add_argument('--requests', type=int, default=400, help="Requests per page and handler.")
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--sales', type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            user = create_bench_user()
+            self.stdout.write(f"Seeding {options['products']} products and {options['sales']} sales...")
+            seed_shop(user, products=options['products'], sales=options['sales'])
+
+            self.stdout.write(
+                f"{'view':<10} {'handler':<7} {'req/s':>7} {'p50':>9} {'p95':>9} {'max':>9}"
+            )
+            for view in options['views'] or VIEWS:
+                path = reverse(view)
+                for handler, run in (('wsgi', _run_wsgi), ('asgi', _run_asgi)):
+                    with override_settings(CACHES={**settings.CACHES, **NO_PAGE_CACHE}):
+                        began = time.perf_counter()
+                        samples = run(user, path, options['requests'], options['concurrency'])
+                        rate = len(samples) / (time.perf_counter() - began)
+                    stats = summarize(samples)
+                    self.stdout.write(
+                        f"{view:<10} {handler:<7} {rate:>7.0f} {stats['p50_ms']:>7}ms "
+                        f"{stats['p95_ms']:>7}ms {stats['max_ms']:>7}ms"
+                    )
+            connections.close_all()
+
+
+def _run_wsgi(user, path, requests, concurrency):
+    """Like a threaded WSGI server: each of ``concurrency`` threads serves requests in turn."""
+    samples = []
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def serve():
+        client = Client()
+        client.force_login(user)
+        client.get(path)  # warm up
+        try:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                began = time.perf_counter()
+                client.get(path)
+                elapsed = time.perf_counter() - began
+                with lock:
+                    samples.append(elapsed)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=serve) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def _run_asgi(user, path, requests, concurrency):
+    """Like an ASGI server: ``concurrency`` requests at a time on a single event loop."""
+    async def serve():
+        client = AsyncClient()
+        await client.aforce_login(user)
+        await client.get(path)  # warm up
+        gate = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with gate:
+                began = time.perf_counter()
+                await client.get(path)
+                return time.perf_counter() - began
+
+        return await asyncio.gather(*(request() for _ in range(requests)))
+
+    return list(asyncio.run(serve()))
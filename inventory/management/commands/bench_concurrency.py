@@ -0,0 +1,130 @@
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from inventory.benchmarks import benchmark_database, create_bench_user, seed_shop, summarize
+from inventory.invoices import create_invoice
+from inventory.models import Product, Sale
+
+# Connection options per profile. "django" is Django's stock SQLite setup,
+# "default" what settings.py uses, "production" INVENTORY_DB_PROFILE=production.
+PROFILES = {
+    'django': {'init_command': 'PRAGMA journal_mode=DELETE'},
+    'default': {'init_command': 'PRAGMA journal_mode=DELETE', 'transaction_mode': 'IMMEDIATE', 'timeout': 5},
+    'production': {'init_command': ';'.join(settings.INVENTORY_SQLITE_PRAGMAS),
+                   'transaction_mode': 'IMMEDIATE', 'timeout': 5},
+}
+# Time for the worker processes to start before the clock starts.
+WARMUP = 3
+
+
+class Command(BaseCommand):
+    help = "Measure read throughput on a scratch SQLite database while other processes record invoices."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', dest='profiles', choices=sorted(PROFILES),
+                            help="Database profile to measure (may be repeated; default: all).")
+        parser.add_argument('--readers', type=int, default=4, help="Reading processes.")
+        parser.add_argument('--writers', type=int, default=2, help="Writing processes.")
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--sales', type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark compares SQLite profiles.")
+        self.stdout.write(
+            f"{'profile':<11} {'journal':<8} {'reads/s':>8} {'read p95':>9} "
+            f"{'writes/s':>9} {'write p95':>10} {'errors':>7}"
+        )
+        for profile in options['profiles'] or list(PROFILES):
+            row = self.run(profile, options)
+            self.stdout.write(
+                f"{profile:<11} {row['journal']:<8} {row['reads']:>8.0f} {row['read']['p95_ms']:>7}ms "
+                f"{row['writes']:>9.0f} {row['write']['p95_ms']:>8}ms {row['errors']:>7}"
+            )
+
+    def run(self, profile, options):
+        with benchmark_database():
+            user = create_bench_user()
+            seed_shop(user, products=options['products'], customers=100, sales=options['sales'])
+            Product.objects.update(stock=10 ** 9)
+            product_ids = list(Product.objects.values_list('id', flat=True))
+            name = connection.settings_dict['NAME']
+            connection.close()
+
+            workers = options['readers'] + options['writers']
+            begin = time.time() + WARMUP
+            end = begin + options['seconds']
+            context = multiprocessing.get_context('spawn')
+            database = (name, PROFILES[profile])
+            with ProcessPoolExecutor(workers, mp_context=context, initializer=django.setup) as pool:
+                reads = [pool.submit(_read, database, user.id, begin, end) for _ in range(options['readers'])]
+                writes = [pool.submit(_write, database, user.id, product_ids, begin, end, seed)
+                          for seed in range(options['writers'])]
+                reads, writes = [f.result() for f in reads], [f.result() for f in writes]
+            journal = reads[0][2] if reads else writes[0][2]
+
+        read_samples = [s for samples, _, _ in reads for s in samples]
+        write_samples = [s for samples, _, _ in writes for s in samples]
+        return {
+            'journal': journal,
+            'reads': len(read_samples) / options['seconds'],
+            'writes': len(write_samples) / options['seconds'],
+            'read': summarize(read_samples or [0]),
+            'write': summarize(write_samples or [0]),
+            'errors': sum(errors for _, errors, _ in reads + writes),
+        }
+
+
+def _connect(database):
+    """Point this worker process at the scratch database; return its journal mode."""
+    name, options = database
+    connection.settings_dict.update(NAME=name, OPTIONS=options)
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        return cursor.fetchone()[0]
+
+
+def _run_until(end, operation):
+    samples, errors = [], 0
+    while time.time() < end:
+        began = time.perf_counter()
+        try:
+            operation()
+        except OperationalError:
+            errors += 1
+            continue
+        samples.append(time.perf_counter() - began)
+    return samples, errors
+
+
+def _read(database, user_id, begin, end):
+    journal = _connect(database)
+    time.sleep(max(0, begin - time.time()))
+
+    def read():
+        list(Sale.objects.filter(user_id=user_id).select_related('product').order_by('-date', '-id')[:25])
+        list(Product.objects.filter(user_id=user_id).order_by('id').values('id', 'name', 'stock')[:50])
+
+    return (*_run_until(end, read), journal)
+
+
+def _write(database, user_id, product_ids, begin, end, seed):
+    from django.contrib.auth.models import User
+
+    journal = _connect(database)
+    rng = random.Random(seed)
+    user = User.objects.get(pk=user_id)
+    time.sleep(max(0, begin - time.time()))
+
+    def write():
+        create_invoice(user, [{'product': pid, 'quantity': 1} for pid in rng.sample(product_ids, 3)])
+
+    return (*_run_until(end, write), journal)
@@ -0,0 +1,60 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventory import forecasting
+from inventory.benchmarks import benchmark_database, create_bench_user, seed_shop
+
+
+class Command(BaseCommand):
+    help = "Time demand forecasts for a large catalogue, from a synthetic matrix or a seeded database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skus', type=int, default=100_000)
+        parser.add_argument('--sales', type=int, default=0,
+                            help="Seed this many sales into a scratch database and time the full "
+                                 "build (query, matrix and forecast) instead of the maths alone.")
+        parser.add_argument('--pure-python', action='store_true',
+                            help="Time the fallback used when NumPy is not installed.")
+
+    def handle(self, *args, **options):
+        if forecasting.numpy is None and not options['pure_python']:
+            raise CommandError("NumPy is not installed; pass --pure-python to time the fallback.")
+        if options['pure_python']:
+            forecasting.numpy = None
+
+        if options['sales']:
+            self.time_build(options['skus'], options['sales'])
+        else:
+            self.time_forecast(options['skus'])
+
+    def time_forecast(self, skus):
+        rng = random.Random(0)
+        rows = [[float(rng.randint(0, 5)) for _ in range(forecasting.HISTORY_DAYS)] for _ in range(skus)]
+        if forecasting.numpy is not None:
+            rows = forecasting.numpy.array(rows)
+        start = time.perf_counter()
+        forecasting.forecast_rows(rows)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"Forecast {skus} SKUs x {forecasting.HISTORY_DAYS} days in {elapsed:.3f}s")
+
+    def time_build(self, skus, sales):
+        with benchmark_database():
+            user = create_bench_user()
+            self.stdout.write(f"Seeding {skus} products and {sales} sales...")
+            seed_shop(user, products=skus, customers=0, sales=sales, days=forecasting.HISTORY_DAYS)
+
+            today = timezone.localdate()
+            start = time.perf_counter()
+            product_ids, quantities, amounts = forecasting.daily_sales(user.id, today)
+            loaded = time.perf_counter()
+            forecasting.forecast_rows(quantities)
+            forecasting.forecast_rows(amounts)
+            done = time.perf_counter()
+
+        self.stdout.write(
+            f"{len(product_ids)} SKUs with sales: query and matrix {loaded - start:.2f}s, "
+            f"forecast {done - loaded:.2f}s, total {done - start:.2f}s"
+        )
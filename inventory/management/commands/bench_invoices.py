@@ -0,0 +1,74 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+
+from inventory.benchmarks import benchmark_database, create_bench_user, seed_shop
+from inventory.invoices import create_invoice
+from inventory.models import Product, Sale, StockMovement
+from inventory.stock import remove_stock
+
+
+class Command(BaseCommand):
+    help = "Measure multi-line invoice throughput against a scratch SQLite database in WAL mode."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=2000)
+        parser.add_argument('--lines', type=int, default=20, help="Lines per invoice.")
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--http', action='store_true',
+                            help="Post through the invoice endpoint instead of calling the service.")
+        parser.add_argument('--per-line', action='store_true',
+                            help="Baseline: record every line as its own sale, the way sale_add does.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with benchmark_database():
+            if connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode=WAL')
+                    cursor.execute('PRAGMA synchronous=NORMAL')
+            user = create_bench_user()
+            seed_shop(user, products=options['products'], customers=100)
+            Product.objects.update(stock=10 ** 9)
+            product_ids = list(Product.objects.values_list('id', flat=True))
+
+            baskets = [
+                [{'product': pid, 'quantity': rng.randint(1, 3)}
+                 for pid in rng.sample(product_ids, options['lines'])]
+                for _ in range(options['invoices'])
+            ]
+
+            if options['http']:
+                client = Client()
+                client.force_login(user)
+                url = reverse('invoice_add')
+
+                def submit(lines):
+                    client.post(url, json.dumps({'lines': lines}), content_type='application/json')
+            elif options['per_line']:
+                def submit(lines):
+                    for line in lines:
+                        with transaction.atomic():
+                            sale = Sale.objects.create(user=user, product_id=line['product'],
+                                                       quantity=line['quantity'], amount=1)
+                            remove_stock(sale.product_id, sale.quantity, StockMovement.SALE,
+                                         user=user, sale=sale)
+            else:
+                def submit(lines):
+                    create_invoice(user, lines)
+
+            start = time.perf_counter()
+            for lines in baskets:
+                submit(lines)
+            elapsed = time.perf_counter() - start
+
+        rate = options['invoices'] / elapsed
+        self.stdout.write(
+            f"{options['invoices']} invoices x {options['lines']} lines in {elapsed:.2f}s: "
+            f"{rate:.0f} invoices/s ({rate * options['lines']:.0f} lines/s)"
+        )
@@ -0,0 +1,59 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from inventory import rollups
+from inventory.benchmarks import benchmark_database, create_bench_user, seed_shop, summarize, time_call
+from inventory.models import Sale
+
+
+class Command(BaseCommand):
+    help = "Time the profit and loss report from the sales rollups against scanning the sales it summarises."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--sales', type=int, default=500_000)
+        parser.add_argument('--days', type=int, default=730, help="Days of sales history to seed.")
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--target-ms', type=float, default=100.0,
+                            help="Fail when the p95 of a report from the rollups is slower than this.")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            user = create_bench_user()
+            self.stdout.write(f"Seeding {options['products']} products and {options['sales']} sales...")
+            begin = time.perf_counter()
+            seed_shop(user, products=options['products'], customers=100, sales=options['sales'],
+                      days=options['days'])
+            self.stdout.write(f"Seeded, with rollups, in {time.perf_counter() - begin:.1f}s")
+
+            today = timezone.localdate()
+            ranges = {
+                'year to date': rollups.year_to_date(today),
+                'last 365 days': (today - timedelta(days=364), today),
+                'last 30 days': (today - timedelta(days=29), today),
+            }
+            slow = []
+            for name, (start, end) in ranges.items():
+                report = summarize(time_call(lambda: rollups.report(user, start, end), options['repeat']))
+                scan = summarize(time_call(lambda: self.scan(user, start, end), max(1, options['repeat'] // 5)))
+                self.stdout.write(
+                    f"{name:<14} rollups p50 {report['p50_ms']:>7}ms p95 {report['p95_ms']:>7}ms   "
+                    f"scanning sales p50 {scan['p50_ms']:>8}ms"
+                )
+                if report['p95_ms'] > options['target_ms']:
+                    slow.append(name)
+
+        if slow:
+            raise CommandError(f"Slower than {options['target_ms']}ms at p95: {', '.join(slow)}")
+
+    def scan(self, user, start, end):
+        """The same monthly totals and top sellers computed from the sales table."""
+        sales = Sale.objects.filter(user=user, date__date__range=(start, end))
+        sums = {'revenue': Sum('amount'), 'cost': Sum(F('quantity') * F('product__cost_price'))}
+        list(sales.annotate(month=TruncMonth('date')).values('month').annotate(**sums).order_by())
+        list(sales.values('product_id', 'product__name').annotate(**sums).order_by('-revenue')[:rollups.TOP_PRODUCTS])
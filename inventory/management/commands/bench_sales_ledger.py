@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from inventory.benchmarks import benchmark_database, create_bench_user, seed_shop, summarize, time_call
+from inventory.models import Sale
+from inventory.pagination import encode_cursor, keyset_paginate
+from inventory.views import SALES_PER_PAGE
+
+
+class Command(BaseCommand):
+    help = "Seed a scratch database with sales and time the sales ledger at increasing page depths."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sales', type=int, default=1_000_000)
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--depths', default='0,10,100,1000,10000',
+                            help="Comma-separated page numbers to time.")
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--in-memory', action='store_true',
+                            help="Use an in-memory SQLite database instead of a temp file.")
+
+    def handle(self, *args, **options):
+        depths = [int(d) for d in options['depths'].split(',')]
+        with benchmark_database(on_disk=not options['in_memory']):
+            user = create_bench_user()
+            self.stdout.write(f"Seeding {options['sales']} sales...")
+            seed_shop(user, products=options['products'], customers=options['customers'],
+                      sales=options['sales'])
+
+            client = Client()
+            client.force_login(user)
+            url = reverse('sales')
+            ledger = Sale.objects.filter(user=user).order_by('-date', '-id')
+
+            self.stdout.write(
+                f"{'page':>8} {'view p50':>12} {'view p95':>12} {'keyset query':>14} {'offset query':>14}"
+            )
+            for depth in depths:
+                offset = depth * SALES_PER_PAGE
+                if offset >= options['sales']:
+                    continue
+                # Build the cursor the ledger would have handed out on the
+                # previous page, without walking every page to get there.
+                params = {}
+                if offset:
+                    anchor = ledger.values('date', 'id')[offset - 1]
+                    params['after'] = encode_cursor(anchor['date'], anchor['id'])
+
+                view = summarize(time_call(lambda: client.get(url, params), options['repeat']))
+                keyset = summarize(time_call(
+                    lambda: keyset_paginate(ledger.select_related('product', 'customer'), params, 'date',
+                                            per_page=SALES_PER_PAGE),
+                    options['repeat'],
+                ))
+                by_offset = summarize(time_call(
+                    lambda: list(ledger.select_related('product', 'customer')[offset:offset + SALES_PER_PAGE]),
+                    options['repeat'],
+                ))
+                self.stdout.write(
+                    f"{depth:>8} {view['p50_ms']:>10}ms {view['p95_ms']:>10}ms "
+                    f"{keyset['p50_ms']:>12}ms {by_offset['p50_ms']:>12}ms"
+                )
@@ -0,0 +1,76 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import search
+from inventory.benchmarks import benchmark_database, create_bench_user, summarize, time_call
+from inventory.models import Product, Supplier
+
+ADJECTIVES = ['Fresh', 'Organic', 'Premium', 'Classic', 'Spicy', 'Sweet', 'Crunchy', 'Low Fat', 'Family', 'Mini']
+NOUNS = ['Chocolate', 'Biscuits', 'Yogurt', 'Basmati Rice', 'Green Tea', 'Shampoo', 'Detergent', 'Ketchup',
+         'Olive Oil', 'Chicken Masala', 'Orange Juice', 'Toothpaste', 'Cornflakes', 'Almonds', 'Honey']
+CATEGORIES = ['Snacks', 'Dairy', 'Grocery', 'Beverages', 'Personal Care', 'Household', 'Spices']
+SIZES = ['100g', '250g', '500g', '1kg', '1L', '2L', 'Pack of 6']
+
+QUERIES = {
+    'prefix': ['choc', 'bis', 'gre', 'sham', 'oli'],
+    'multi-word': ['organic honey', 'green tea 250', 'spicy chicken masala', 'premium basmati'],
+    'typo': ['choclate', 'biscuts', 'shampo', 'tothpaste', 'ketchp'],
+}
+
+
+class Command(BaseCommand):
+    help = "Seed a scratch catalogue and time product search against its latency target."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skus', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--target-ms', type=float, default=20.0,
+                            help="Fail when the p95 of any query kind is slower than this.")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            user = create_bench_user()
+            self.stdout.write(f"Seeding {options['skus']} products...")
+            self.seed(user, options['skus'])
+            start = time.perf_counter()
+            search.rebuild_index()
+            self.stdout.write(f"Indexed in {time.perf_counter() - start:.2f}s")
+
+            slow = []
+            for kind, queries in QUERIES.items():
+                samples = []
+                for query in queries:
+                    samples += time_call(lambda: search.search(user, query), options['repeat'])
+                stats = summarize(samples)
+                hits = len(search.search(user, queries[0]))
+                self.stdout.write(
+                    f"{kind:<11} p50 {stats['p50_ms']:>7}ms  p95 {stats['p95_ms']:>7}ms  "
+                    f"max {stats['max_ms']:>7}ms  ({hits} results for {queries[0]!r})"
+                )
+                if stats['p95_ms'] > options['target_ms']:
+                    slow.append(kind)
+
+        if slow:
+            raise CommandError(f"Slower than {options['target_ms']}ms at p95: {', '.join(slow)}")
+
+    def seed(self, user, skus):
+        rng = random.Random(0)
+        suppliers = Supplier.objects.bulk_create(
+            [Supplier(user=user, name=f'{name} Traders', contact='0300', email=f'{name.lower()}@example.com')
+             for name in ('Karachi', 'Lahore', 'Punjab', 'Indus', 'Metro', 'Hilal', 'Shan', 'National')]
+        )
+        Product.objects.bulk_create([
+            Product(
+                user=user,
+                name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice(SIZES)} #{i}',
+                category=rng.choice(CATEGORIES),
+                description='',
+                cost_price=10,
+                selling_price=12,
+                stock=rng.randint(0, 100),
+                supplier=rng.choice(suppliers),
+            )
+            for i in range(skus)
+        ], batch_size=10_000)
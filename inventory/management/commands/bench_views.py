@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.benchmarks import benchmark_database, create_bench_user, seed_shop
+from inventory.budgets import check_budgets, compare_reports
+
+
+class Command(BaseCommand):
+    help = "Seed a scratch shop, request every page and check it against its query and latency budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--suppliers', type=int, default=50)
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--sales', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help="Write the JSON report to this file.")
+        parser.add_argument('--compare', help="A previous JSON report to compare against.")
+        parser.add_argument('--no-fail', action='store_true',
+                            help="Report views over budget without exiting with an error.")
+        parser.add_argument('--in-memory', action='store_true',
+                            help="Use an in-memory SQLite database instead of a temp file.")
+
+    def handle(self, *args, **options):
+        with benchmark_database(on_disk=not options['in_memory']):
+            user = create_bench_user()
+            self.stdout.write(f"Seeding {options['products']} products and {options['sales']} sales...")
+            seed_shop(user, products=options['products'], suppliers=options['suppliers'],
+                      customers=options['customers'], sales=options['sales'])
+            report = check_budgets(user, repeat=options['repeat'])
+
+        self.stdout.write(
+            f"{'view':<20} {'status':>6} {'queries':>9} {'db ms':>9} {'wall ms':>9}  budget"
+        )
+        for row in report:
+            self.stdout.write(
+                f"{row['view']:<20} {row['status']:>6} {row['queries']:>9} {row['db_ms']:>9} "
+                f"{row['wall_ms']:>9}  {row['budget_queries']}q/{row['budget_ms']}ms"
+                + (f"  OVER: {', '.join(row['over'])}" if row['over'] else '')
+            )
+
+        document = {
+            'seed': {key: options[key] for key in ('products', 'suppliers', 'customers', 'sales', 'repeat')},
+            'views': report,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(document, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            for view, field, old, new in compare_reports(baseline['views'], report):
+                self.stdout.write(self.style.WARNING(f"{view}: {field} {old} -> {new}"))
+
+        over = [row['view'] for row in report if row['over']]
+        if over and not options['no_fail']:
+            raise CommandError(f"Over budget: {', '.join(over)}")
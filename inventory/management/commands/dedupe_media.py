@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+
+from inventory import caching, thumbnails
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = "Move existing product images to content-addressed names, keeping one copy of each."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change.")
+
+    def handle(self, *args, **options):
+        field = Product._meta.get_field('image')
+        storage = field.storage
+        directory = field.upload_to.rstrip('/')
+
+        moved = removed = freed = 0
+        targets = set()
+        for filename in sorted(storage.listdir(directory)[1]):
+            name = f'{directory}/{filename}'
+            if thumbnails.is_rendition(name):
+                continue
+            with storage.open(name, 'rb') as content:
+                target = storage.hashed_name(name, content)
+                if target == name:
+                    continue
+                duplicate = target in targets or storage.exists(target)
+                targets.add(target)
+                size = storage.size(name)
+                if options['dry_run']:
+                    self.stdout.write(f"{name} -> {target}{' (duplicate)' if duplicate else ''}")
+                elif not duplicate:
+                    storage.save(name, content)
+
+            if not options['dry_run']:
+                # Renditions are named after the image, so they are made
+                # again for the new name; the old ones are left to gc_media.
+                products = Product.objects.filter(image=name)
+                for user_id in set(products.values_list('user_id', flat=True)):
+                    caching.invalidate(user_id)
+                products.update(image=target, image_hash='')
+                storage.delete(name)
+            if duplicate:
+                removed += 1
+                freed += size
+            else:
+                moved += 1
+
+        verb = ("Would rename", "remove", "save") if options['dry_run'] else ("Renamed", "removed", "saving")
+        self.stdout.write(
+            f"{verb[0]} {moved} file(s) and {verb[1]} {removed} duplicate(s), {verb[2]} {freed / 1024:.0f} KiB."
+        )
+        if (moved or removed) and not options['dry_run']:
+            self.stdout.write("Run backfill_thumbnails to recreate renditions, then gc_media to remove old ones.")
@@ -0,0 +1,56 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory import thumbnails
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = "Delete product images and renditions that no product refers to."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age-hours', type=float, default=24,
+                            help="Keep files younger than this, which may belong to an upload in progress.")
+        parser.add_argument('--dry-run', action='store_true', help="List what would be deleted.")
+
+    def handle(self, *args, **options):
+        field = Product._meta.get_field('image')
+        storage = field.storage
+        directory = field.upload_to.rstrip('/')
+
+        keep = set()
+        for name, digest in Product.objects.exclude(image='').exclude(image=None).values_list('image', 'image_hash'):
+            keep.add(name)
+            if digest:
+                keep.update(
+                    thumbnails.rendition_name(name, digest, width, ext)
+                    for width in thumbnails.WIDTHS for ext in thumbnails.FORMATS
+                )
+
+        cutoff = timezone.now() - timedelta(hours=options['min_age_hours'])
+        deleted = freed = 0
+        for filename in storage.listdir(directory)[1]:
+            name = f'{directory}/{filename}'
+            if name in keep or storage.get_modified_time(name) > cutoff or _referenced(name):
+                continue
+            size = storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(f"Would delete {name}")
+            else:
+                storage.delete(name)
+            deleted += 1
+            freed += size
+        verb = "Would free" if options['dry_run'] else "Freed"
+        self.stdout.write(f"{verb} {freed / 1024:.0f} KiB in {deleted} orphaned file(s).")
+
+
+def _referenced(name):
+    # Checked again just before deleting: a product may have been given the
+    # file since ``keep`` was built.
+    if thumbnails.is_rendition(name):
+        digest = posixpath.basename(name).rsplit('.', 3)[1]
+        return Product.objects.filter(image_hash=digest).exists()
+    return Product.objects.filter(image=name).exists()
@@ -0,0 +1,40 @@
+import csv
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.importers import IMPORT_FORMS, UnreadableFile, import_rows, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Stream products, customers or suppliers from a CSV or XLSX file into a user's shop."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORT_FORMS))
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help="Username that will own the imported rows.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No such user: {options['user']}")
+
+        def report(line, errors):
+            for field, messages in errors.items():
+                self.stderr.write(f"line {line}: {field}: {' '.join(messages)}")
+
+        start = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = import_rows(user, options['kind'], iter_rows(fileobj, options['path']),
+                                     batch_size=options['batch_size'], on_error=report)
+        except (OSError, ImportError, UnicodeDecodeError, csv.Error, UnreadableFile) as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} {options['kind']} in {time.perf_counter() - start:.1f}s; "
+            f"{result.failed} row(s) rejected."
+        ))
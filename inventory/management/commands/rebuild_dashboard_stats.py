@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import caching
+from inventory.stats import rebuild_stats, stats_drift
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized dashboard aggregates from the sale, purchase and catalogue tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', metavar='USERNAME',
+                            help="Only process this user (may be repeated).")
+        parser.add_argument('--check', action='store_true',
+                            help="Report drift without writing anything; exit non-zero if any is found.")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        drifted = 0
+        for user in users.iterator():
+            if options['check']:
+                drift = stats_drift(user)
+                if drift:
+                    drifted += 1
+                    for name, stored, actual in drift:
+                        self.stdout.write(f"{user.username}: {name} is {stored}, expected {actual}")
+            else:
+                rebuild_stats(user)
+                caching.invalidate(user.pk)
+                self.stdout.write(f"Rebuilt dashboard stats for {user.username}")
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f"Dashboard stats drifted for {drifted} user(s).")
+            self.stdout.write(self.style.SUCCESS("Dashboard stats match the source tables."))
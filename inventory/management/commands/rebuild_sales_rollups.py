@@ -0,0 +1,40 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import caching
+from inventory.rollups import rebuild_rollups, rollup_drift
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily and monthly sales rollups behind the reports from the sale and purchase tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', metavar='USERNAME',
+                            help="Only process this user (may be repeated).")
+        parser.add_argument('--check', action='store_true',
+                            help="Report drift without writing anything; exit non-zero if any is found.")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        drifted = 0
+        for user in users.iterator():
+            if options['check']:
+                drift = rollup_drift(user)
+                if drift:
+                    drifted += 1
+                    for period, product_id, start, stored, actual in drift:
+                        self.stdout.write(
+                            f"{user.username}: product {product_id} on {period} {start} is {stored}, expected {actual}"
+                        )
+            else:
+                rebuild_rollups(user)
+                caching.invalidate(user.pk)
+                self.stdout.write(f"Rebuilt sales rollups for {user.username}")
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f"Sales rollups drifted for {drifted} user(s).")
+            self.stdout.write(self.style.SUCCESS("Sales rollups match the source tables."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inventory import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search index from the product and supplier tables."
+
+    def handle(self, *args, **options):
+        if not search.uses_fts():
+            self.stdout.write("This database searches without an index table; nothing to rebuild.")
+            return
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} product(s)."))
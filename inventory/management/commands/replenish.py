@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from inventory.replenishment import COVER_DAYS, LOOKBACK_DAYS, SAFETY_FACTOR, apply_plan, plan_replenishment
+
+
+class Command(BaseCommand):
+    help = "Recompute reorder points from sales velocity and draft purchase orders for low products."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', metavar='USERNAME',
+                            help="Only process this user (may be repeated).")
+        parser.add_argument('--lookback-days', type=int, default=LOOKBACK_DAYS,
+                            help="Days of sales used to measure velocity.")
+        parser.add_argument('--cover-days', type=int, default=COVER_DAYS,
+                            help="Days of demand each order should cover beyond the next delivery.")
+        parser.add_argument('--safety-factor', type=float, default=SAFETY_FACTOR,
+                            help="Standard deviations of demand to keep as safety stock.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report what would be suggested without saving anything.")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        for user in users.iterator():
+            plan = plan_replenishment(user, lookback_days=options['lookback_days'],
+                                      cover_days=options['cover_days'], safety_factor=options['safety_factor'])
+            summary = (
+                f"{user.username}: {plan.suggestion_count} product(s) to reorder from "
+                f"{len(plan.suggestions)} supplier(s), {len(plan.reorder_points)} reorder point(s) changed"
+            )
+            if plan.unassigned:
+                summary += f", {len(plan.unassigned)} product(s) without a supplier"
+            if not options['dry_run']:
+                apply_plan(user, plan)
+                summary += "; draft orders saved"
+            self.stdout.write(summary)
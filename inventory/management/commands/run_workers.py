@@ -0,0 +1,42 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+
+from inventory import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=2, help="Worker threads per process.")
+        parser.add_argument('--processes', type=int, default=1,
+                            help="Worker processes; each runs --threads threads.")
+        parser.add_argument('--poll-interval', type=float, default=jobs.POLL_INTERVAL,
+                            help="Seconds to wait when no job is due.")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit once nothing is left to run instead of waiting for more.")
+
+    def handle(self, *args, **options):
+        threads, burst, poll = options['threads'], options['burst'], options['poll_interval']
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+
+        if options['processes'] <= 1:
+            jobs.run_pool(threads, burst=burst, poll_interval=poll)
+            return
+
+        context = multiprocessing.get_context('spawn')
+        processes = [
+            context.Process(target=jobs.run_process, args=(threads, burst, poll))
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.join()
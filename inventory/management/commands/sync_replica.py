@@ -0,0 +1,42 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from inventory.routers import PRIMARY, replicas
+
+
+class Command(BaseCommand):
+    help = ("Copy the primary SQLite database over the SQLite replicas in INVENTORY_REPLICAS, "
+            "standing in for replication when trying replicas out locally.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help="Keep copying every this many seconds instead of once.")
+
+    def handle(self, *args, **options):
+        if connections[PRIMARY].vendor != 'sqlite':
+            raise CommandError("The primary is not SQLite; use the database's own replication.")
+        aliases = [alias for alias in replicas() if connections[alias].vendor == 'sqlite']
+        if not aliases:
+            raise CommandError("No SQLite replicas configured; set INVENTORY_REPLICAS.")
+
+        while True:
+            for alias in aliases:
+                self.copy(alias)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def copy(self, alias):
+        source = sqlite3.connect(connections[PRIMARY].settings_dict['NAME'])
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+        try:
+            # The backup API copies a consistent snapshot even while the
+            # primary is being written to.
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(f"Copied {PRIMARY} to {alias}")
@@ -0,0 +1,49 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+
+def dedupe_product_names(apps, schema_editor):
+    # (user, name) becomes unique in the next migration; rename any
+    # existing duplicates to "Name (2)", "Name (3)"... first.
+    Product = apps.get_model('inventory', 'Product')
+    seen = defaultdict(set)
+    renamed = []
+    for product in Product.objects.order_by('id').only('id', 'user_id', 'name').iterator():
+        names = seen[product.user_id]
+        if product.name in names:
+            base, n = product.name, 2
+            while f"{base} ({n})" in names:
+                n += 1
+            product.name = f"{base} ({n})"
+            renamed.append(product)
+        names.add(product.name)
+    Product.objects.bulk_update(renamed, ['name'], batch_size=500)
+
+
+def backfill_purchase_product(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    Purchase = apps.get_model('inventory', 'Purchase')
+    products = {
+        (user_id, name): pk
+        for pk, user_id, name in Product.objects.values_list('id', 'user_id', 'name').iterator()
+    }
+    matched = []
+    for purchase in Purchase.objects.filter(product__isnull=True).only('id', 'user_id', 'product_name').iterator():
+        product_id = products.get((purchase.user_id, purchase.product_name))
+        if product_id is not None:
+            purchase.product_id = product_id
+            matched.append(purchase)
+    Purchase.objects.bulk_update(matched, ['product'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_purchase_product_and_order'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_product_names, migrations.RunPython.noop),
+        migrations.RunPython(backfill_purchase_product, migrations.RunPython.noop),
+    ]
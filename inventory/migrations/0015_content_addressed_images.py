@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:33
+
+import inventory.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_product_image_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=inventory.storage.product_image_storage, upload_to='products/'),
+        ),
+    ]
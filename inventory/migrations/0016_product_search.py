@@ -0,0 +1,50 @@
+from django.db import migrations
+
+FTS_TABLE = 'inventory_product_fts'
+VOCAB_TABLE = 'inventory_product_fts_vocab'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                return  # search falls back to LIKE
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                "owner UNINDEXED, name, category, description, supplier, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            cursor.execute(f"CREATE VIRTUAL TABLE {VOCAB_TABLE} USING fts5vocab({FTS_TABLE}, 'row')")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, owner, name, category, description, supplier) "
+                "SELECT p.id, p.user_id, p.name, p.category, COALESCE(p.description, ''), "
+                "COALESCE(s.name, '') FROM inventory_product p "
+                "LEFT JOIN inventory_supplier s ON s.id = p.supplier_id"
+            )
+        elif vendor == 'postgresql':
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS product_name_trgm_idx ON inventory_product USING gin (name gin_trgm_ops)"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        if schema_editor.connection.vendor == 'sqlite':
+            cursor.execute(f"DROP TABLE IF EXISTS {VOCAB_TABLE}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        elif schema_editor.connection.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS product_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
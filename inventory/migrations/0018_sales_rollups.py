@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:18
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_sale_cost(apps, schema_editor):
+    # Earlier sales did not record their cost; the product's current cost
+    # price is the best estimate there is.
+    Product = apps.get_model('inventory', 'Product')
+    Sale = apps.get_model('inventory', 'Sale')
+    cost_price = Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('cost_price')[:1])
+    Sale.objects.update(cost=ExpressionWrapper(
+        cost_price * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2),
+    ))
+
+
+def build_rollups(apps, schema_editor):
+    Sale = apps.get_model('inventory', 'Sale')
+    Purchase = apps.get_model('inventory', 'Purchase')
+    DailySales = apps.get_model('inventory', 'DailySales')
+    MonthlySales = apps.get_model('inventory', 'MonthlySales')
+
+    days = defaultdict(lambda: [0, 0, 0, 0, 0])
+    sales = (
+        Sale.objects.annotate(day=TruncDate('date')).values_list('user_id', 'product_id', 'day')
+        .annotate(Sum('quantity'), Sum('amount'), Sum('cost')).order_by()
+    )
+    for user_id, product_id, day, quantity, amount, cost in sales:
+        days[user_id, product_id, day][:3] = quantity, amount, cost
+    purchases = (
+        Purchase.objects.filter(product__isnull=False, user__isnull=False)
+        .values_list('user_id', 'product_id', 'date').annotate(Sum('quantity'), Sum('total_price')).order_by()
+    )
+    for user_id, product_id, day, quantity, total in purchases:
+        days[user_id, product_id, day][3:] = quantity, total
+    months = defaultdict(lambda: [0, 0, 0, 0, 0])
+    for (user_id, product_id, day), values in days.items():
+        month = months[user_id, product_id, day.replace(day=1)]
+        for i, value in enumerate(values):
+            month[i] += value
+
+    fields = ('quantity', 'revenue', 'cost', 'purchased', 'purchase_total')
+    for model, period, buckets in ((DailySales, 'day', days), (MonthlySales, 'month', months)):
+        model.objects.bulk_create(
+            [model(user_id=user_id, product_id=product_id, **{period: start}, **dict(zip(fields, values)))
+             for (user_id, product_id, start), values in buckets.items() if user_id is not None],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_autocomplete_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='cost',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('purchased', models.IntegerField(default=0)),
+                ('purchase_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('day', models.DateField()),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.product')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'day'], name='daily_sales_user_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='daily_sales_product_day_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('purchased', models.IntegerField(default=0)),
+                ('purchase_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('month', models.DateField()),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.product')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'month'], name='monthly_sales_user_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'month'), name='monthly_sales_product_month_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_sale_cost, migrations.RunPython.noop),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def opening_lots(apps, schema_editor):
+    # Stock on hand becomes one lot per product, dated with the product's
+    # expiry and valued at its cost price.
+    Product = apps.get_model('inventory', 'Product')
+    StockLot = apps.get_model('inventory', 'StockLot')
+    products = Product.objects.filter(stock__gt=0).values_list('pk', 'user_id', 'stock', 'expiry_date')
+    StockLot.objects.bulk_create(
+        (StockLot(product_id=pk, user_id=user_id, quantity=stock, remaining=stock, expiry_date=expiry_date)
+         for pk, user_id, stock, expiry_date in products.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_sales_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('remaining', models.IntegerField()),
+                ('expiry_date', models.DateField(blank=True, null=True)),
+                ('unit_cost', models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='inventory.product')),
+                ('purchase', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lots', to='inventory.purchase')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('remaining__gt', 0)), fields=['user', 'expiry_date'], name='lot_user_expiry_idx'), models.Index(condition=models.Q(('remaining__gt', 0)), fields=['product', 'expiry_date'], name='lot_product_expiry_idx')],
+            },
+        ),
+        migrations.RunPython(opening_lots, migrations.RunPython.noop),
+    ]
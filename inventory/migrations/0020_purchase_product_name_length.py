@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_stock_lots'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchase',
+            name='product_name',
+            field=models.CharField(max_length=200),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:26
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0020_purchase_product_name_length'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='DailyRevenue',
+        ),
+    ]
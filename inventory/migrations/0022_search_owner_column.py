@@ -0,0 +1,46 @@
+from django.db import migrations
+
+FTS_TABLE = 'inventory_product_fts'
+VOCAB_TABLE = 'inventory_product_fts_vocab'
+
+
+def _recreate(schema_editor, owner):
+    with schema_editor.connection.cursor() as cursor:
+        if FTS_TABLE not in schema_editor.connection.introspection.table_names(cursor):
+            return  # no FTS5; search falls back to LIKE
+        cursor.execute(f"DROP TABLE IF EXISTS {VOCAB_TABLE}")
+        cursor.execute(f"DROP TABLE {FTS_TABLE}")
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"{owner}, name, category, description, supplier, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        cursor.execute(f"CREATE VIRTUAL TABLE {VOCAB_TABLE} USING fts5vocab({FTS_TABLE}, 'row')")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, owner, name, category, description, supplier) "
+            "SELECT p.id, p.user_id, p.name, p.category, COALESCE(p.description, ''), "
+            "COALESCE(s.name, '') FROM inventory_product p "
+            "LEFT JOIN inventory_supplier s ON s.id = p.supplier_id"
+        )
+
+
+def index_owner(apps, schema_editor):
+    # An indexed owner lets MATCH itself keep to one user's products.
+    if schema_editor.connection.vendor == 'sqlite':
+        _recreate(schema_editor, 'owner')
+
+
+def unindex_owner(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        _recreate(schema_editor, 'owner UNINDEXED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0021_drop_daily_revenue'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_owner, unindex_owner),
+    ]
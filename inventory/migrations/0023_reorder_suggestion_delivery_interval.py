@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:45
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0022_search_owner_column'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='reordersuggestion',
+            old_name='lead_time_days',
+            new_name='delivery_interval_days',
+        ),
+    ]
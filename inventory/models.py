@@ -1,5 +1,12 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Case, CharField, F, Q, Value, When
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .storage import product_image_storage
 
 
 class Supplier(models.Model):
@@ -9,6 +16,11 @@ class Supplier(models.Model):
     email = models.EmailField()
     address = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name'], name='supplier_user_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -20,10 +32,36 @@ class Customer(models.Model):
     email = models.EmailField(blank=True)
     address = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name'], name='customer_user_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 
+# Used for products that have no reorder point yet.
+LOW_STOCK_THRESHOLD = 5
+
+NEEDS_REORDER = Q(reorder_point__isnull=True, stock__lte=LOW_STOCK_THRESHOLD) | Q(stock__lte=F('reorder_point'))
+
+
+class ProductQuerySet(models.QuerySet):
+    def needing_reorder(self):
+        return self.filter(NEEDS_REORDER)
+
+    def with_expiry_status(self, today=None):
+        today = today or date.today()
+        return self.annotate(expiry_status=Case(
+            When(expiry_date__lt=today, then=Value('expired')),
+            When(expiry_date__lte=today + timedelta(days=7), then=Value('near')),
+            When(expiry_date__isnull=False, then=Value('good')),
+            default=None,
+            output_field=CharField(),
+        ))
+
+
 class Product(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=200)
@@ -33,37 +71,270 @@ class Product(models.Model):
     stock = models.IntegerField(default=0)
     supplier = models.ForeignKey(Supplier, null=True, blank=True, on_delete=models.SET_NULL)
     description = models.TextField(blank=True, null=True)
-    image = models.ImageField(upload_to='products/', blank=True, null=True)
+    image = models.ImageField(upload_to='products/', storage=product_image_storage, blank=True, null=True)
+    # Content hash naming the resized renditions; see inventory/thumbnails.py.
+    image_hash = models.CharField(max_length=12, blank=True, default='', editable=False)
     expiry_date = models.DateField(blank=True, null=True)
+    # Set by ``manage.py replenish`` from how fast the product sells.
+    reorder_point = models.IntegerField(blank=True, null=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='product_user_name_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'expiry_date'], name='product_user_expiry_idx'),
+            models.Index(fields=['user', 'stock'], name='product_user_stock_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def needs_reorder(self):
+        point = self.reorder_point if self.reorder_point is not None else LOW_STOCK_THRESHOLD
+        return self.stock <= point
+
+
+class Invoice(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    customer = models.ForeignKey(Customer, null=True, blank=True, on_delete=models.SET_NULL)
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Invoice #{self.id}"
+
 
 class Sale(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    invoice = models.ForeignKey(Invoice, null=True, blank=True, on_delete=models.CASCADE, related_name='lines')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     customer = models.ForeignKey(Customer, null=True, blank=True, on_delete=models.SET_NULL)
     quantity = models.IntegerField()
     amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # Cost of the goods sold, at the product's cost price when the sale was made.
+    cost = models.DecimalField(max_digits=12, decimal_places=2, editable=False)
     date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date', 'id'], name='sale_user_date_id_idx'),
+            models.Index(fields=['product', 'date', 'id'], name='sale_product_date_id_idx'),
+            models.Index(fields=['customer', 'date', 'id'], name='sale_customer_date_id_idx'),
+        ]
+
     def __str__(self):
         return f"Sale #{self.id} - {self.product.name}"
 
+    def save(self, *args, **kwargs):
+        if self.cost is None:
+            self.cost = Decimal(str(self.product.cost_price)) * self.quantity
+        super().save(*args, **kwargs)
+
+
+class PurchaseOrder(models.Model):
+    DRAFT = 'draft'
+    RECEIVED = 'received'
+    STATUS_CHOICES = [
+        (DRAFT, 'Draft'),
+        (RECEIVED, 'Received'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=RECEIVED)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Purchase order #{self.id} from {self.supplier.name}"
+
 
 class Purchase(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    order = models.ForeignKey(PurchaseOrder, null=True, blank=True, on_delete=models.CASCADE, related_name='lines')
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE)
-    product_name = models.CharField(max_length=100)
+    product = models.ForeignKey(Product, null=True, blank=True, on_delete=models.SET_NULL)
+    product_name = models.CharField(max_length=200)
     quantity = models.PositiveIntegerField()
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     date = models.DateField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date', 'id'], name='purchase_user_date_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.product_name} from {self.supplier.name}"
 
 
+class ReorderSuggestion(models.Model):
+    """A line of a draft purchase order proposed by ``manage.py replenish``."""
+    order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name='suggestions')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    stock = models.IntegerField()
+    reorder_point = models.IntegerField()
+    daily_velocity = models.FloatField()
+    delivery_interval_days = models.FloatField()
+    estimated_cost = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product}"
+
+
+class StockMovement(models.Model):
+    SALE = 'sale'
+    PURCHASE = 'purchase'
+    ADJUSTMENT = 'adjustment'
+    REASON_CHOICES = [
+        (SALE, 'Sale'),
+        (PURCHASE, 'Purchase'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='movements')
+    change = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    sale = models.ForeignKey(Sale, null=True, blank=True, on_delete=models.SET_NULL)
+    purchase = models.ForeignKey(Purchase, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='movement_product_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product} {self.change:+d} ({self.reason})"
+
+
+class StockLot(models.Model):
+    """
+    A batch of a product received together, sold first-expiry-first-out;
+    see ``inventory.lots``. ``Product.expiry_date`` is the earliest expiry
+    of its lots with stock left.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='lots')
+    purchase = models.ForeignKey(Purchase, null=True, blank=True, on_delete=models.SET_NULL, related_name='lots')
+    quantity = models.IntegerField()
+    remaining = models.IntegerField()
+    expiry_date = models.DateField(blank=True, null=True)
+    # None values the lot at the product's current cost price.
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=4, blank=True, null=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Only lots with stock left are ever searched by expiry, and
+            # most lots are used up, so the indexes leave the rest out.
+            models.Index(fields=['user', 'expiry_date'], condition=Q(remaining__gt=0),
+                         name='lot_user_expiry_idx'),
+            models.Index(fields=['product', 'expiry_date'], condition=Q(remaining__gt=0),
+                         name='lot_product_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product} lot #{self.id} ({self.remaining}/{self.quantity})"
+
+
+class DashboardStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='dashboard_stats')
+    product_count = models.IntegerField(default=0)
+    supplier_count = models.IntegerField(default=0)
+    customer_count = models.IntegerField(default=0)
+    sale_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    purchase_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Dashboard stats for {self.user}"
+
+
+class SalesRollup(models.Model):
+    """Sales and purchases of one product over a period; see ``inventory.rollups``."""
+    # Both are covered by the indexes of the concrete models.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', db_index=False)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    purchased = models.IntegerField(default=0)
+    purchase_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailySales(SalesRollup):
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='daily_sales_product_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day'], name='daily_sales_user_day_idx'),
+        ]
+
+
+class MonthlySales(SalesRollup):
+    month = models.DateField()  # the first day of the month
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'month'], name='monthly_sales_product_month_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'month'], name='monthly_sales_user_month_idx'),
+        ]
+
+
+class Job(models.Model):
+    """A unit of background work, run by ``manage.py run_workers``."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    priority = models.IntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_after', 'id'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.id} ({self.status})"
+
+
 class ContactMessage(models.Model):
     full_name = models.CharField(max_length=100)
     email = models.EmailField()
@@ -0,0 +1,86 @@
+import base64
+import binascii
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, prev_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(value, pk):
+    raw = f"{value.isoformat() if hasattr(value, 'isoformat') else value}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, field):
+    """Return ``(value, pk)`` for a cursor, or ``None`` if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        value, pk = raw.rsplit('|', 1)
+        return field.to_python(value), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, ValidationError):
+        return None
+
+
+def keyset_paginate(queryset, params, key, per_page=50, descending=True):
+    """
+    Paginate ``queryset`` on ``(key, pk)`` using the ``after``/``before``
+    cursors found in ``params`` instead of OFFSET, so every page costs the
+    same index seek however deep it is.
+    """
+    field = queryset.model._meta.get_field(key)
+    after = params.get('after')
+    before = params.get('before')
+    cursor = decode_cursor(after or before, field) if (after or before) else None
+    backwards = cursor is not None and not after
+
+    # Walking "forwards" means older rows for a descending ledger.
+    lt = 'lt' if descending != backwards else 'gt'
+    if cursor is not None:
+        value, pk = cursor
+        if field.primary_key:
+            queryset = queryset.filter(**{f'pk__{lt}': pk})
+        else:
+            # The plain range bound lets the database seek straight into the
+            # index; the OR only breaks ties between rows sharing ``key``.
+            queryset = queryset.filter(**{f'{key}__{lt}e': value}).filter(
+                Q(**{f'{key}__{lt}': value}) | Q(**{key: value, f'pk__{lt}': pk})
+            )
+
+    prefix = '-' if lt == 'lt' else ''
+    ordering = [f'{prefix}pk'] if field.primary_key else [f'{prefix}{key}', f'{prefix}pk']
+    rows = list(queryset.order_by(*ordering)[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def cursor_for(obj):
+        return encode_cursor(getattr(obj, key), obj.pk)
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards or has_more:
+            next_cursor = cursor_for(rows[-1])
+        if (has_more if backwards else cursor is not None):
+            prev_cursor = cursor_for(rows[0])
+    return KeysetPage(rows, next_cursor, prev_cursor)
@@ -0,0 +1,175 @@
+"""
+Opt-in request profiling.
+
+``RequestProfilingMiddleware`` samples a fraction of requests and records
+their total latency, SQL query count and time (through
+``connection.execute_wrapper``) and template render time. Samples are kept
+per URL name in fixed-size windows in process memory, and the ``metrics``
+view publishes their p50/p95/p99 in the Prometheus text format.
+
+Enable it with ``INVENTORY_PROFILING=1`` in the environment; the rate is
+``INVENTORY_PROFILING_SAMPLE_RATE`` (a fraction, default 0.05). Requests
+that are not sampled cost one call to ``random()``.
+"""
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connections
+
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW = 1024
+
+_active = contextvars.ContextVar('inventory_profile', default=None)
+
+
+class Summary:
+    """The last ``window`` observations of one metric, plus lifetime count and sum."""
+
+    def __init__(self, window=WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+class Registry:
+    METRICS = {
+        'request_duration_seconds': 'Total time to produce the response.',
+        'sql_duration_seconds': 'Time spent executing SQL.',
+        'sql_queries': 'SQL statements executed.',
+        'template_duration_seconds': 'Time spent rendering templates.',
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, **values):
+        with self._lock:
+            summaries = self._views.setdefault(view, {name: Summary() for name in self.METRICS})
+            for name, value in values.items():
+                summaries[name].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        """Return every summary in the Prometheus text exposition format."""
+        with self._lock:
+            snapshot = {
+                view: {name: (s.quantiles(), s.count, s.sum) for name, s in summaries.items()}
+                for view, summaries in sorted(self._views.items())
+            }
+        lines = []
+        for name, help_text in self.METRICS.items():
+            metric = f'inventory_{name}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} summary')
+            for view, summaries in snapshot.items():
+                quantiles, count, total = summaries[name]
+                label = _escape(view)
+                for q, value in quantiles.items():
+                    lines.append(f'{metric}{{view="{label}",quantile="{q}"}} {value:.6g}')
+                lines.append(f'{metric}_sum{{view="{label}"}} {total:.6g}')
+                lines.append(f'{metric}_count{{view="{label}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Profile:
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - start
+            self.sql_count += 1
+
+
+def _instrument_templates():
+    """
+    Time ``render()`` on Django template backend objects. Only the
+    outermost render of a request is timed, so includes and form widgets
+    are not counted twice.
+    """
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'profiled', False):
+        return
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        profile = _active.get()
+        if profile is None or profile.template_depth:
+            return original(self, context, request)
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            profile.template_seconds += time.perf_counter() - start
+            profile.template_depth -= 1
+
+    render.profiled = True
+    Template.render = render
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'INVENTORY_PROFILING_SAMPLE_RATE', 0.05)
+        _instrument_templates()
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = _Profile()
+        token = _active.set(profile)
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            _active.reset(token)
+
+        match = request.resolver_match
+        registry.record(
+            match.view_name if match else 'unmatched',
+            request_duration_seconds=elapsed,
+            sql_duration_seconds=profile.sql_seconds,
+            sql_queries=profile.sql_count,
+            template_duration_seconds=profile.template_seconds,
+        )
+        return response
@@ -0,0 +1,70 @@
+from collections import Counter
+from decimal import Decimal
+
+from . import caching, lots, rollups, stats
+from .db import write_transaction
+from .models import Product, Purchase, PurchaseOrder, StockLot, StockMovement, Supplier
+from .stock import add_stock_many
+
+
+class PurchaseOrderError(Exception):
+    pass
+
+
+def receive_purchase_order(user, supplier_id, lines):
+    """
+    Record a delivery of several products from one supplier. ``lines`` are
+    dicts with ``product`` (id), ``quantity``, ``total_price`` and an
+    optional ``expiry_date``. Stock for every line is increased, and
+    received as a lot, in the same transaction as the purchases.
+    """
+    if not lines:
+        raise PurchaseOrderError("A purchase order needs at least one line.")
+    supplier = Supplier.objects.filter(user=user, pk=supplier_id).first()
+    if supplier is None:
+        raise PurchaseOrderError(f"Unknown supplier: {supplier_id}")
+    product_ids = {line['product'] for line in lines}
+    products = Product.objects.filter(user=user).only('id', 'name').in_bulk(product_ids)
+    missing = sorted(product_ids - set(products))
+    if missing:
+        raise PurchaseOrderError(f"Unknown product(s): {', '.join(map(str, missing))}")
+
+    quantities = Counter()
+    purchases = []
+    expiry_dates = []
+    for line in lines:
+        product = products[line['product']]
+        quantities[product.pk] += line['quantity']
+        purchases.append(Purchase(user=user, supplier=supplier, product=product, product_name=product.name,
+                                  quantity=line['quantity'], total_price=line['total_price']))
+        expiry_dates.append(line.get('expiry_date'))
+    total = sum((p.total_price for p in purchases), Decimal('0'))
+
+    return _save_purchase_order(user, supplier, purchases, expiry_dates, quantities, total)
+
+
+@write_transaction
+def _save_purchase_order(user, supplier, purchases, expiry_dates, quantities, total):
+    add_stock_many(quantities)
+    order = PurchaseOrder.objects.create(user=user, supplier=supplier, total=total)
+    for purchase in purchases:
+        purchase.order = order
+    Purchase.objects.bulk_create(purchases)
+    StockMovement.objects.bulk_create([
+        StockMovement(user=user, product_id=purchase.product_id, change=purchase.quantity,
+                      reason=StockMovement.PURCHASE, purchase=purchase)
+        for purchase in purchases
+    ])
+    lots.receive([
+        StockLot(user=user, product_id=purchase.product_id, purchase=purchase, quantity=purchase.quantity,
+                 expiry_date=expiry_date, unit_cost=lots.unit_cost(purchase.total_price, purchase.quantity))
+        for purchase, expiry_date in zip(purchases, expiry_dates)
+    ])
+    # bulk_create skips the post_save handlers that maintain the dashboard
+    # and the page cache.
+    stats.bump(user.id, purchase_total=total)
+    rollups.record_purchases(user.id, [
+        (purchase.product_id, purchase.date, purchase.quantity, purchase.total_price) for purchase in purchases
+    ])
+    caching.invalidate(user.id)
+    return order
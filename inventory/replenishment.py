@@ -0,0 +1,146 @@
+"""
+Reorder points and purchase suggestions based on how fast products sell.
+
+For every product of a shop at once:
+
+* velocity is the mean number of units sold per day over the last
+  ``LOOKBACK_DAYS``;
+* the delivery interval is, per supplier, the average number of days
+  between its deliveries;
+* safety stock is ``SAFETY_FACTOR`` standard deviations of daily demand
+  over the delivery interval;
+* the reorder point is velocity x delivery interval + safety stock, enough
+  to last until the supplier's next delivery;
+* the reorder quantity tops stock up to cover the delivery interval plus
+  ``COVER_DAYS``, plus safety stock.
+
+Only deliveries are recorded, not when they were ordered, so the supplier's
+lead time itself cannot be measured; the delivery interval is the longest
+a product may have to wait for stock. Products with no sales in the
+lookback keep the reorder point they have.
+
+Sales, deliveries and products are each read with a single query, and
+reorder points are written with one UPDATE per distinct value, so a run
+costs the same handful of queries however large the catalogue is.
+"""
+import math
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from . import caching
+from .forecasting import daily_sales, numpy
+from .models import Product, Purchase, PurchaseOrder, ReorderSuggestion
+
+LOOKBACK_DAYS = 28
+COVER_DAYS = 14
+SAFETY_FACTOR = 1.65  # about a 95% chance of not running out before the next delivery
+DEFAULT_DELIVERY_INTERVAL_DAYS = 7
+UPDATE_BATCH_SIZE = 500
+
+
+def delivery_intervals(user_id):
+    """``{supplier_id: days}`` on average between each supplier's deliveries."""
+    intervals = {}
+    deliveries = (
+        Purchase.objects.filter(user_id=user_id)
+        .values('supplier_id')
+        .annotate(first=Min('date'), last=Max('date'), days=Count('date', distinct=True))
+        .order_by()
+    )
+    for row in deliveries:
+        if row['days'] > 1:
+            intervals[row['supplier_id']] = max(1.0, (row['last'] - row['first']).days / (row['days'] - 1))
+    return intervals
+
+
+def demand(user_id, today, days=LOOKBACK_DAYS):
+    """``{product_id: (mean, standard deviation)}`` of units sold per day."""
+    product_ids, quantities, _ = daily_sales(user_id, today, days)
+    if numpy is not None:
+        return dict(zip(product_ids, zip(quantities.mean(axis=1).tolist(), quantities.std(axis=1).tolist())))
+    stats = {}
+    for pk, row in zip(product_ids, quantities):
+        mean = sum(row) / days
+        stats[pk] = (mean, math.sqrt(sum((x - mean) ** 2 for x in row) / days))
+    return stats
+
+
+class Plan:
+    def __init__(self):
+        self.reorder_points = {}
+        self.suggestions = defaultdict(list)  # supplier_id -> [ReorderSuggestion]
+        self.unassigned = []  # suggestions for products without a supplier
+
+    @property
+    def suggestion_count(self):
+        return sum(map(len, self.suggestions.values())) + len(self.unassigned)
+
+
+def plan_replenishment(user, today=None, lookback_days=LOOKBACK_DAYS, cover_days=COVER_DAYS,
+                       safety_factor=SAFETY_FACTOR):
+    today = today or timezone.localdate()
+    velocities = demand(user.id, today, lookback_days)
+    intervals = delivery_intervals(user.id)
+
+    plan = Plan()
+    products = Product.objects.filter(user=user).values_list(
+        'id', 'stock', 'supplier_id', 'cost_price', 'reorder_point',
+    )
+    for pk, stock, supplier_id, cost_price, current_point in products.iterator():
+        if pk not in velocities:
+            continue
+        velocity, deviation = velocities[pk]
+        interval = intervals.get(supplier_id, DEFAULT_DELIVERY_INTERVAL_DAYS)
+        safety_stock = safety_factor * deviation * math.sqrt(interval)
+        reorder_point = math.ceil(velocity * interval + safety_stock)
+        if reorder_point != current_point:
+            plan.reorder_points[pk] = reorder_point
+        if stock > reorder_point:
+            continue
+        quantity = math.ceil(velocity * (interval + cover_days) + safety_stock) - stock
+        if quantity <= 0:
+            continue
+        suggestion = ReorderSuggestion(
+            product_id=pk, quantity=quantity, stock=stock, reorder_point=reorder_point,
+            daily_velocity=round(velocity, 3), delivery_interval_days=round(interval, 1),
+            estimated_cost=cost_price * quantity,
+        )
+        if supplier_id is None:
+            plan.unassigned.append(suggestion)
+        else:
+            plan.suggestions[supplier_id].append(suggestion)
+    return plan
+
+
+def apply_plan(user, plan):
+    """
+    Save the new reorder points and replace the user's draft purchase
+    orders with one per supplier. Returns the new drafts.
+    """
+    by_point = defaultdict(list)
+    for pk, point in plan.reorder_points.items():
+        by_point[point].append(pk)
+
+    with transaction.atomic():
+        for point, pks in by_point.items():
+            for start in range(0, len(pks), UPDATE_BATCH_SIZE):
+                Product.objects.filter(pk__in=pks[start:start + UPDATE_BATCH_SIZE]).update(reorder_point=point)
+
+        PurchaseOrder.objects.filter(user=user, status=PurchaseOrder.DRAFT).delete()
+        orders = PurchaseOrder.objects.bulk_create([
+            PurchaseOrder(user=user, supplier_id=supplier_id, status=PurchaseOrder.DRAFT,
+                          total=sum((s.estimated_cost for s in suggestions), Decimal('0')))
+            for supplier_id, suggestions in plan.suggestions.items()
+        ])
+        lines = []
+        for order, suggestions in zip(orders, plan.suggestions.values()):
+            for suggestion in suggestions:
+                suggestion.order = order
+                lines.append(suggestion)
+        ReorderSuggestion.objects.bulk_create(lines, batch_size=UPDATE_BATCH_SIZE)
+    caching.invalidate(user.id)
+    return orders
@@ -0,0 +1,274 @@
+"""
+Sales rollups for reporting: quantity, revenue and cost of goods sold, and
+the quantity and cost of stock purchased, per product and day
+(``DailySales``) and per product and month (``MonthlySales``).
+
+Rollups are updated in the same transaction as the sale or purchase, by the
+receivers in ``inventory.signals``; code that writes with ``bulk_create``
+or raw SQL calls ``record_sales``/``record_purchases`` itself. ``manage.py
+rebuild_sales_rollups`` recomputes them from the source tables.
+
+``report()`` reads whole months from ``MonthlySales`` and only the days at
+either end of the range from ``DailySales``, so a year costs a few hundred
+rows per product however many sales were made.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DailySales, MonthlySales, Product, Purchase, Sale
+
+FIELDS = ('quantity', 'revenue', 'cost', 'purchased', 'purchase_total')
+BATCH_SIZE = 500
+TOP_PRODUCTS = 10
+
+ONE_DAY = timedelta(days=1)
+
+
+def _day(when):
+    if isinstance(when, datetime):
+        return timezone.localtime(when).date() if timezone.is_aware(when) else when.date()
+    return when
+
+
+def _month(day):
+    return day.replace(day=1)
+
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _empty():
+    return [0, Decimal('0'), Decimal('0'), 0, Decimal('0')]
+
+
+def _accumulate(bucket, values):
+    for i, value in enumerate(values):
+        bucket[i] += value
+
+
+def _by_month(days):
+    months = defaultdict(_empty)
+    for (product_id, day), values in days.items():
+        _accumulate(months[product_id, _month(day)], values)
+    return months
+
+
+def record_sales(user_id, sales):
+    """
+    Add ``(product_id, date, quantity, amount, cost)`` tuples to the
+    rollups. Use negative values to reverse a sale.
+    """
+    _apply(user_id, (
+        (product_id, when, (quantity, Decimal(str(amount)), Decimal(str(cost)), 0, 0))
+        for product_id, when, quantity, amount, cost in sales
+    ))
+
+
+def record_purchases(user_id, purchases):
+    """
+    Add ``(product_id, date, quantity, total_price)`` tuples to the
+    rollups. Purchases without a product are left out.
+    """
+    _apply(user_id, (
+        (product_id, when, (0, 0, 0, quantity, Decimal(str(total))))
+        for product_id, when, quantity, total in purchases if product_id is not None
+    ))
+
+
+def _apply(user_id, changes):
+    days = defaultdict(_empty)
+    for product_id, when, values in changes:
+        _accumulate(days[product_id, _day(when)], values)
+    if not days:
+        return
+    with transaction.atomic():
+        _add(DailySales, 'day', user_id, days)
+        _add(MonthlySales, 'month', user_id, _by_month(days))
+
+
+def _add(model, period, user_id, buckets):
+    if connection.vendor in ('sqlite', 'postgresql'):
+        _upsert(model, period, user_id, list(buckets.items()))
+        return
+    for (product_id, start), values in buckets.items():
+        deltas = {field: F(field) + value for field, value in zip(FIELDS, values)}
+        rows = model.objects.filter(product_id=product_id, **{period: start})
+        if rows.update(**deltas):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(user_id=user_id, product_id=product_id, **{period: start},
+                                     **dict(zip(FIELDS, values)))
+        except IntegrityError:
+            # Another request created the row first.
+            rows.update(**deltas)
+
+
+def _upsert(model, period, user_id, buckets):
+    # One statement per batch instead of an UPDATE, and an INSERT when
+    # that missed, for every bucket.
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = ', '.join(map(qn, ('user_id', 'product_id', period) + FIELDS))
+    increments = ', '.join(f'{qn(field)} = {table}.{qn(field)} + excluded.{qn(field)}' for field in FIELDS)
+    row = f"({', '.join(['%s'] * (3 + len(FIELDS)))})"
+    adapt_date = connection.ops.adapt_datefield_value
+    adapt_decimal = connection.ops.adapt_decimalfield_value
+    with connection.cursor() as cursor:
+        for start in range(0, len(buckets), BATCH_SIZE):
+            batch = buckets[start:start + BATCH_SIZE]
+            params = []
+            for (product_id, when), (quantity, revenue, cost, purchased, purchase_total) in batch:
+                params += [user_id, product_id, adapt_date(when), quantity, adapt_decimal(revenue),
+                           adapt_decimal(cost), purchased, adapt_decimal(purchase_total)]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {', '.join([row] * len(batch))} "
+                f"ON CONFLICT ({qn('product_id')}, {qn(period)}) DO UPDATE SET {increments}",
+                params,
+            )
+
+
+def compute_rollups(user):
+    """Daily rollups recomputed from the source tables: ``{(product_id, day): values}``."""
+    days = defaultdict(_empty)
+    sales = (
+        Sale.objects.filter(user=user).annotate(day=TruncDate('date')).values_list('product_id', 'day')
+        .annotate(Sum('quantity'), Sum('amount'), Sum('cost')).order_by()
+    )
+    for product_id, day, *values in sales:
+        _accumulate(days[product_id, day], values)
+    purchases = (
+        Purchase.objects.filter(user=user, product__isnull=False).values_list('product_id', 'date')
+        .annotate(Sum('quantity'), Sum('total_price')).order_by()
+    )
+    for product_id, day, quantity, total in purchases:
+        _accumulate(days[product_id, day], (0, 0, 0, quantity, total))
+    return days
+
+
+def rebuild_rollups(user):
+    days = compute_rollups(user)
+    with transaction.atomic():
+        for model, period, buckets in ((DailySales, 'day', days), (MonthlySales, 'month', _by_month(days))):
+            model.objects.filter(user=user).delete()
+            model.objects.bulk_create(
+                [model(user=user, product_id=product_id, **{period: start}, **dict(zip(FIELDS, values)))
+                 for (product_id, start), values in buckets.items()],
+                batch_size=BATCH_SIZE,
+            )
+
+
+def rollup_drift(user):
+    """``(period, product_id, start, stored, actual)`` for every rollup row that is out of date."""
+    days = compute_rollups(user)
+    drift = []
+    for model, period, actual in ((DailySales, 'day', days), (MonthlySales, 'month', _by_month(days))):
+        stored = {
+            (product_id, start): list(values)
+            for product_id, start, *values in model.objects.filter(user=user).values_list('product_id', period, *FIELDS)
+        }
+        for key in sorted(set(stored) | set(actual)):
+            if stored.get(key, _empty()) != actual.get(key, _empty()):
+                drift.append((period, *key, stored.get(key), actual.get(key)))
+    return drift
+
+
+def _split(start, end):
+    """
+    The whole months within ``start``..``end`` as ``(first, after)``, or
+    ``None``, and the ranges of days before and after them.
+    """
+    first = start if start.day == 1 else _next_month(start)
+    after = _next_month(end) if end + ONE_DAY == _next_month(end) else _month(end)
+    if first >= after:
+        return None, [(start, end)]
+    days = []
+    if start < first:
+        days.append((start, first - ONE_DAY))
+    if end >= after:
+        days.append((after, end))
+    return (first, after), days
+
+
+def _totals(rows):
+    for row in rows:
+        row['profit'] = row['revenue'] - row['cost']
+        row['margin'] = round(row['profit'] / row['revenue'] * 100, 1) if row['revenue'] else None
+    return rows
+
+
+def report(user, start, end, top=TOP_PRODUCTS):
+    """
+    Profit and loss for ``start``..``end`` (inclusive dates): ``totals``,
+    one row per ``month``, and the ``top_products`` by revenue. Rows hold
+    the rollup fields plus ``profit`` and ``margin`` (a percentage of
+    revenue, ``None`` without sales).
+    """
+    months, days = _split(start, end)
+    sources = []
+    if months:
+        sources.append((MonthlySales, 'month', Q(month__gte=months[0], month__lt=months[1])))
+    # One source per range: SQLite plans a range on the (user, day) or
+    # (product, day) index well, but not two of them ORed together.
+    sources += [(DailySales, 'day', Q(day__range=range_)) for range_ in days]
+
+    by_month = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+    for model, period, within in sources:
+        # Days are grouped as they are and put in their month here, since
+        # SQLite would call back into Python for TruncMonth() on every row.
+        rows = model.objects.filter(within, user=user).values(period).annotate(**{f: Sum(f) for f in FIELDS})
+        for row in rows.order_by():
+            totals = by_month[_month(row[period])]
+            for field in FIELDS:
+                totals[field] += row[field]
+    month_rows = _totals([{'month': month, **by_month[month]} for month in sorted(by_month)])
+    totals = _totals([{field: sum((row[field] for row in month_rows), 0) for field in FIELDS}])[0]
+
+    return {
+        'totals': totals,
+        'months': month_rows,
+        'top_products': _top_products(user, sources, top) if sources else [],
+    }
+
+
+def _top_products(user, sources, top):
+    # Ranked inside the database, one short index range per product,
+    # rather than by fetching every product's totals.
+    zero = Value(0, output_field=DecimalField())
+    revenue = sum(
+        (Coalesce(Subquery(
+            model.objects.filter(within, product=OuterRef('pk')).values('product')
+            .annotate(total=Sum('revenue')).values('total')
+        ), zero) for model, _, within in sources),
+        zero,
+    )
+    ranked = (
+        Product.objects.filter(user=user).annotate(period_revenue=revenue)
+        .order_by('-period_revenue', 'name').values_list('pk', 'name', 'period_revenue')[:top]
+    )
+    names = {pk: name for pk, name, period_revenue in ranked if period_revenue > 0}
+    sellers = {pk: {'name': name, 'quantity': 0, 'revenue': 0, 'cost': 0} for pk, name in names.items()}
+    for model, _, within in sources:
+        rows = (
+            # The products are the user's, so their (product, period) index
+            # narrows this to a few rows each.
+            model.objects.filter(within, product__in=list(names)).values('product_id')
+            .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'), cost=Sum('cost')).order_by()
+        )
+        for row in rows:
+            seller = sellers[row['product_id']]
+            for field in ('quantity', 'revenue', 'cost'):
+                seller[field] += row[field]
+    return _totals(list(sellers.values()))
+
+
+def year_to_date(today=None):
+    today = today or timezone.localdate()
+    return date(today.year, 1, 1), today
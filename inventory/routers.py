@@ -0,0 +1,124 @@
+"""
+Routing between the primary database and read replicas.
+
+Everything reads from and writes to ``default`` except inside
+``replica_reads()``, which the ``reads_from_replica`` view decorator (the
+dashboard, list pages, exports and forecasts) and background exports use.
+Replicas lag behind the primary, so a block reads from the primary
+instead:
+
+* for ``INVENTORY_REPLICA_LAG`` seconds after the user last changed
+  anything (the same version bump that invalidates their page cache
+  marks them, see ``caching.recently_written``), so a cashier sees the
+  sale they just rang up, and a page cached under the new data version
+  is never built from rows the replica has not caught up with;
+* once anything has been written inside the block itself.
+
+Sessions, users and the admin always use the primary.
+"""
+import contextvars
+import functools
+import random
+from contextlib import contextmanager
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+
+from . import caching
+
+PRIMARY = 'default'
+PRIMARY_APPS = {'auth', 'sessions', 'admin', 'contenttypes'}
+
+_reads = contextvars.ContextVar('inventory_replica_reads', default=None)
+_DONE = object()
+
+
+class _ReplicaReads:
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.wrote = False
+
+
+def replicas():
+    return settings.INVENTORY_REPLICA_ALIASES
+
+
+def _replica_allowed(user_id):
+    return bool(replicas()) and not caching.recently_written(user_id)
+
+
+@contextmanager
+def replica_reads(user_id):
+    """Send reads in the block to a replica, unless ``user_id`` has just written."""
+    token = _reads.set(_ReplicaReads(_replica_allowed(user_id)))
+    try:
+        yield
+    finally:
+        _reads.reset(token)
+
+
+def iterate_from_replica(user_id, iterable):
+    """
+    Iterate ``iterable``, such as a streamed export, reading from a replica.
+    The routing is applied around each step rather than held across
+    yields, since a streaming response is consumed after the view returns.
+    """
+    allowed = _replica_allowed(user_id)
+    iterator = iter(iterable)
+    while True:
+        token = _reads.set(_ReplicaReads(allowed))
+        try:
+            item = next(iterator, _DONE)
+        finally:
+            _reads.reset(token)
+        if item is _DONE:
+            return
+        yield item
+
+
+def reads_from_replica(view):
+    if iscoroutinefunction(view):
+        # The async ORM runs queries in a worker thread, which inherits the
+        # context, and so the routing, of the awaiting task.
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            user = await request.auser()
+            with replica_reads(user.id):
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads(request.user.id):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def reading_from_replica():
+    reads = _reads.get()
+    return reads is not None and reads.enabled and not reads.wrote
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS or not reading_from_replica():
+            return PRIMARY
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        reads = _reads.get()
+        if reads is not None:
+            reads.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        if db in replicas():
+            return False
+        return None
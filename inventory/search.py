@@ -0,0 +1,195 @@
+"""
+Typeahead search over products.
+
+On SQLite, products are indexed in an FTS5 table (``inventory_product_fts``)
+holding their owner, name, category, description and supplier name. The
+owner is part of the MATCH, so a search only walks the user's own
+products. Every word of the query is matched as a prefix and all matches
+are ranked by BM25 with the name weighted highest. When that finds
+nothing, each word is corrected to indexed terms a small edit distance
+away (read from an ``fts5vocab`` table) and the search runs again, so
+"choclate" still finds chocolate.
+
+On PostgreSQL, product names are searched by trigram word similarity
+(``pg_trgm``) using their trigram index; other databases fall back to
+``icontains`` over the same fields as FTS. The index is kept in sync by
+the receivers in ``inventory.signals`` and by ``index_products()`` after
+bulk writes; ``manage.py rebuild_search_index`` rebuilds it.
+"""
+import re
+
+from django.db import connection
+from django.db.models import F, Q
+
+from .models import Product, Supplier
+
+FTS_TABLE = 'inventory_product_fts'
+VOCAB_TABLE = 'inventory_product_fts_vocab'
+# bm25() weights, in column order: owner, name, category, description, supplier
+WEIGHTS = (0.0, 10.0, 2.0, 1.0, 3.0)
+SEARCHED_COLUMNS = ('name', 'category', 'description', 'supplier')
+MAX_WORDS = 8
+MIN_FUZZY_LENGTH = 4
+BATCH_SIZE = 500
+
+_words = re.compile(r'\w+')
+
+
+def uses_fts():
+    if connection.vendor != 'sqlite':
+        return False
+    # Remembered per database, since tests and benchmarks switch the
+    # connection over to a scratch one.
+    name = connection.settings_dict['NAME']
+    if getattr(connection, '_inventory_fts', (None,))[0] != name:
+        connection._inventory_fts = (name, FTS_TABLE in connection.introspection.table_names())
+    return connection._inventory_fts[1]
+
+
+def _document_sql(where):
+    product, supplier = Product._meta.db_table, Supplier._meta.db_table
+    return (
+        f"INSERT INTO {FTS_TABLE} (rowid, owner, name, category, description, supplier) "
+        f"SELECT p.id, p.user_id, p.name, p.category, COALESCE(p.description, ''), "
+        f"COALESCE(s.name, '') FROM {product} p LEFT JOIN {supplier} s ON s.id = p.supplier_id {where}"
+    )
+
+
+def index_products(pks, new=False):
+    """
+    (Re)index the given products, e.g. after ``bulk_create``. ``new``
+    skips removing old entries for products that were just created.
+    """
+    if not uses_fts():
+        return
+    pks = list(pks)
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), BATCH_SIZE):
+            batch = pks[start:start + BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            if not new:
+                cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", batch)
+            cursor.execute(_document_sql(f"WHERE p.id IN ({placeholders})"), batch)
+
+
+def unindex_products(pks):
+    if not uses_fts():
+        return
+    pks = list(pks)
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), BATCH_SIZE):
+            batch = pks[start:start + BATCH_SIZE]
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(batch))})", batch)
+
+
+def rebuild_index():
+    """Reindex every product. Returns the number of products indexed."""
+    if not uses_fts():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(_document_sql(''))
+        count = cursor.rowcount
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return count
+
+
+def search(user, query, limit=10):
+    """
+    Up to ``limit`` of ``user``'s products matching ``query``, best first,
+    each with a ``supplier_name`` attribute.
+    """
+    words = _words.findall(query.lower())[:MAX_WORDS]
+    if not words:
+        return []
+    if uses_fts():
+        return _search_fts(user.id, words, limit)
+    if connection.vendor == 'postgresql':
+        return _search_trigram(user, ' '.join(words), limit)
+    return _search_like(user, words, limit)
+
+
+def _search_fts(user_id, words, limit):
+    found = _fts_query(user_id, [[f'"{word}"*'] for word in words], limit)
+    if not found:
+        alternatives = [[f'"{word}"*'] + [f'"{term}"' for term in _corrections(word)] for word in words]
+        if any(len(options) > 1 for options in alternatives):
+            found = _fts_query(user_id, alternatives, limit)
+    return found
+
+
+def _fts_query(user_id, alternatives, limit):
+    words = ' AND '.join(f"({' OR '.join(options)})" for options in alternatives)
+    match = f'owner:"{int(user_id)}" AND {{{" ".join(SEARCHED_COLUMNS)}}}: ({words})'
+    product, supplier = Product._meta.db_table, Supplier._meta.db_table
+    return list(Product.objects.raw(
+        f"SELECT p.id, p.name, p.category, p.selling_price, p.stock, s.name AS supplier_name "
+        f"FROM (SELECT rowid, bm25({FTS_TABLE}, {', '.join(map(str, WEIGHTS))}) AS score FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s ORDER BY score LIMIT %s) m "
+        f"JOIN {product} p ON p.id = m.rowid "
+        f"LEFT JOIN {supplier} s ON s.id = p.supplier_id "
+        f"ORDER BY m.score, p.id",
+        [match, limit],
+    ))
+
+
+def _corrections(word):
+    """Indexed terms within one edit (two for long words) of ``word`` or of a prefix of it."""
+    if len(word) < MIN_FUZZY_LENGTH:
+        return []
+    limit = 1 if len(word) < 8 else 2
+    with connection.cursor() as cursor:
+        # Typos are assumed to spare the first two letters, which keeps the
+        # candidates to one short range of the vocabulary.
+        cursor.execute(f"SELECT term FROM {VOCAB_TABLE} WHERE term >= %s AND term < %s",
+                       [word[:2], word[:2] + '\uffff'])
+        terms = [term for (term,) in cursor.fetchall()]
+    return [
+        term for term in terms
+        if term != word and not term.startswith(word) and len(term) >= len(word) - limit
+        and min(edit_distance(word, term, limit), edit_distance(word, term[:len(word)], limit)) <= limit
+    ]
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance between ``a`` and ``b`` (a swap of
+    neighbouring letters counts as one edit), or ``limit + 1`` once it is
+    known to exceed ``limit``.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+
+def _search_trigram(user, text, limit):
+    from django.contrib.postgres.lookups import TrigramWordSimilar
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    # Only the name is searched: ``%>`` on it can use the trigram index,
+    # while a similarity over several fields (one of them joined) could not.
+    return list(
+        Product.objects.filter(TrigramWordSimilar(F('name'), text), user=user)
+        .annotate(similarity=TrigramWordSimilarity(text, 'name'), supplier_name=F('supplier__name'))
+        .order_by('-similarity', 'name')[:limit]
+    )
+
+
+def _search_like(user, words, limit):
+    products = Product.objects.filter(user=user)
+    for word in words:
+        products = products.filter(
+            Q(name__icontains=word) | Q(category__icontains=word)
+            | Q(description__icontains=word) | Q(supplier__name__icontains=word)
+        )
+    return list(products.annotate(supplier_name=F('supplier__name')).order_by('name')[:limit])
@@ -0,0 +1,151 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import caching, rollups, search, stats
+from .models import Customer, Invoice, Product, Purchase, PurchaseOrder, Sale, Supplier
+
+COUNTED_MODELS = {
+    Product: 'product_count',
+    Supplier: 'supplier_count',
+    Customer: 'customer_count',
+}
+CACHED_MODELS = (Product, Supplier, Customer, Sale, Purchase, PurchaseOrder)
+
+
+# Receivers name their senders: a post_delete receiver for any model
+# would stop Django from fast-deleting every cascade.
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Supplier)
+@receiver(post_save, sender=Customer)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.user_id, **{COUNTED_MODELS[sender]: 1})
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_delete, sender=Customer)
+def count_deleted(sender, instance, **kwargs):
+    stats.bump(instance.user_id, **{COUNTED_MODELS[sender]: -1})
+
+
+@receiver(pre_save, sender=Sale)
+@receiver(pre_save, sender=Purchase)
+def remember_previous(sender, instance, **kwargs):
+    # Edits (e.g. from the admin) are applied as "remove old, add new".
+    instance._previous = sender.objects.filter(pk=instance.pk).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Sale)
+def sale_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    changes = [(instance.amount, 1)]
+    lines = [(instance.product_id, instance.date, instance.quantity, instance.amount, instance.cost)]
+    if previous is not None:
+        changes.append((-previous.amount, -1))
+        lines.append((previous.product_id, previous.date, -previous.quantity, -previous.amount, -previous.cost))
+    stats.record_sales(instance.user_id, changes)
+    rollups.record_sales(instance.user_id, lines)
+
+
+def _cascaded_from(origin, *models):
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in models
+
+
+@receiver(pre_delete, sender=Product)
+@receiver(pre_delete, sender=Invoice)
+def forget_sales(sender, instance, **kwargs):
+    # The sales go with the product or invoice. Take them off the totals in
+    # one go here, and sale_deleted leaves them alone.
+    field = 'product' if sender is Product else 'invoice'
+    sales = Sale.objects.filter(**{field: instance}).values_list('product_id', 'date', 'quantity', 'amount', 'cost')
+    sales = list(sales)
+    if not sales:
+        return
+    stats.record_sales(instance.user_id, [(-amount, -1) for _, _, _, amount, _ in sales])
+    # A product's rollup rows are deleted with it.
+    if sender is Invoice:
+        rollups.record_sales(instance.user_id, [
+            (product_id, when, -quantity, -amount, -cost) for product_id, when, quantity, amount, cost in sales
+        ])
+
+
+@receiver(post_delete, sender=Sale)
+def sale_deleted(sender, instance, origin=None, **kwargs):
+    # A deleted user takes their totals with them.
+    if _cascaded_from(origin, Product, Invoice, User):
+        return
+    amount, cost = Decimal(str(instance.amount)), Decimal(str(instance.cost))
+    stats.record_sales(instance.user_id, [(-amount, -1)])
+    rollups.record_sales(instance.user_id, [
+        (instance.product_id, instance.date, -instance.quantity, -amount, -cost),
+    ])
+
+
+@receiver(post_save, sender=Purchase)
+def purchase_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    delta = Decimal(str(instance.total_price)) - (previous.total_price if previous is not None else 0)
+    stats.bump(instance.user_id, purchase_total=delta)
+    lines = [(instance.product_id, instance.date, instance.quantity, instance.total_price)]
+    if previous is not None:
+        lines.append((previous.product_id, previous.date, -previous.quantity, -previous.total_price))
+    rollups.record_purchases(instance.user_id, lines)
+
+
+@receiver(post_delete, sender=Purchase)
+def purchase_deleted(sender, instance, origin=None, **kwargs):
+    if _cascaded_from(origin, User):
+        return
+    total = Decimal(str(instance.total_price))
+    stats.bump(instance.user_id, purchase_total=-total)
+    rollups.record_purchases(instance.user_id, [
+        (instance.product_id, instance.date, -instance.quantity, -total),
+    ])
+
+
+def invalidate_cache(sender, instance, **kwargs):
+    caching.invalidate(instance.user_id)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(invalidate_cache, sender=model)
+    post_delete.connect(invalidate_cache, sender=model)
+
+
+@receiver(post_save, sender=User)
+def new_user_cache(sender, instance, created, **kwargs):
+    if created:
+        caching.reset(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, created, **kwargs):
+    search.index_products([instance.pk], new=created)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.unindex_products([instance.pk])
+
+
+@receiver(post_save, sender=Supplier)
+def index_supplier_products(sender, instance, created, **kwargs):
+    if not created:
+        search.index_products(Product.objects.filter(supplier=instance).values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Supplier)
+def remember_supplier_products(sender, instance, **kwargs):
+    # SET_NULL clears the products' supplier with an UPDATE, which sends no signals.
+    instance._product_ids = list(Product.objects.filter(supplier=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Supplier)
+def reindex_supplier_products(sender, instance, **kwargs):
+    search.index_products(getattr(instance, '_product_ids', ()))
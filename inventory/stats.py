@@ -0,0 +1,81 @@
+"""
+Per-user dashboard aggregates kept in ``DashboardStats``.
+
+Rows are created lazily by ``get_dashboard_stats`` from a full recount and
+then maintained with ``F()`` deltas by the signal handlers in
+``inventory.signals``. Code that bypasses signals (``bulk_create``, raw
+SQL) must call ``bump``/``record_sales`` itself.
+"""
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import Customer, DashboardStats, Product, Purchase, Sale, Supplier
+
+COUNTERS = ('product_count', 'supplier_count', 'customer_count', 'sale_count', 'revenue', 'purchase_total')
+
+
+def bump(user_id, **deltas):
+    """
+    Add ``deltas`` to the user's stats row. Returns ``False`` when the row
+    has not been materialized yet; the next rebuild will count the change.
+    """
+    if user_id is None:
+        return False
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not updates:
+        return True
+    return DashboardStats.objects.filter(user_id=user_id).update(**updates, updated_at=timezone.now()) > 0
+
+
+def record_sales(user_id, sales):
+    """
+    Add ``(amount, sale_count)`` tuples to the lifetime totals. Use
+    negative values to reverse a sale.
+    """
+    total = sum((Decimal(str(amount)) for amount, _ in sales), Decimal('0'))
+    bump(user_id, revenue=total, sale_count=sum(count for _, count in sales))
+
+
+def compute_stats(user):
+    """Recount everything from the source tables."""
+    sales = Sale.objects.filter(user=user)
+    sale_totals = sales.aggregate(count=Count('id'), revenue=Sum('amount'))
+    totals = {
+        'product_count': Product.objects.filter(user=user).count(),
+        'supplier_count': Supplier.objects.filter(user=user).count(),
+        'customer_count': Customer.objects.filter(user=user).count(),
+        'sale_count': sale_totals['count'],
+        'revenue': sale_totals['revenue'] or Decimal('0'),
+        'purchase_total': (
+            Purchase.objects.filter(user=user).aggregate(total=Sum('total_price'))['total'] or Decimal('0')
+        ),
+    }
+    return totals
+
+
+def rebuild_stats(user):
+    stats, _ = DashboardStats.objects.update_or_create(user=user, defaults=compute_stats(user))
+    return stats
+
+
+def stats_drift(user):
+    """Return ``(name, stored, actual)`` for every aggregate that is out of date."""
+    totals = compute_stats(user)
+    stats = DashboardStats.objects.filter(user=user).first()
+    if stats is None:
+        return [('dashboard_stats', None, 'missing')]
+    return [(field, getattr(stats, field), totals[field])
+            for field in COUNTERS if getattr(stats, field) != totals[field]]
+
+
+def get_dashboard_stats(user):
+    stats = DashboardStats.objects.filter(user=user).first()
+    return stats if stats is not None else rebuild_stats(user)
+
+
+async def aget_dashboard_stats(user):
+    stats = await DashboardStats.objects.filter(user=user).afirst()
+    return stats if stats is not None else await sync_to_async(rebuild_stats)(user)
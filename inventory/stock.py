@@ -0,0 +1,97 @@
+"""
+Stock changes go through here so they are applied as conditional
+``UPDATE ... SET stock = stock + n`` statements rather than
+read-modify-save, and each one leaves a ``StockMovement`` behind. Stock
+added is received as a lot and stock removed is taken from the lots, first
+expiry first (see ``inventory.lots``).
+"""
+from django.db import transaction
+from django.db.models import F
+
+from . import lots
+from .db import add_to_column
+from .models import Product, StockLot, StockMovement
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id, requested, available):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Insufficient stock! Only {available} left.")
+
+
+def apply_stock_change(product_id, change, reason, user=None, sale=None, purchase=None, expiry_date=None,
+                       unit_cost=None):
+    """
+    Add ``change`` (negative to remove) to a product's stock and log it.
+    Removals only happen if enough stock is left; otherwise
+    ``InsufficientStock`` is raised and nothing is written. Stock added is
+    a new lot expiring on ``expiry_date``.
+    """
+    with transaction.atomic():
+        products = Product.objects.filter(pk=product_id)
+        if change < 0:
+            products = products.filter(stock__gte=-change)
+        if not products.update(stock=F('stock') + change):
+            available = Product.objects.filter(pk=product_id).values_list('stock', flat=True).first()
+            raise InsufficientStock(product_id, -change, available or 0)
+        if change > 0:
+            lots.receive([StockLot(user=user, product_id=product_id, purchase=purchase, quantity=change,
+                                   expiry_date=expiry_date, unit_cost=unit_cost)])
+        else:
+            lots.take({product_id: -change})
+        return StockMovement.objects.create(
+            user=user, product_id=product_id, change=change, reason=reason, sale=sale, purchase=purchase,
+        )
+
+
+def remove_stock(product_id, quantity, reason, **refs):
+    _check_quantity(quantity)
+    return apply_stock_change(product_id, -quantity, reason, **refs)
+
+
+def add_stock(product_id, quantity, reason, **refs):
+    _check_quantity(quantity)
+    return apply_stock_change(product_id, quantity, reason, **refs)
+
+
+def _check_quantity(quantity):
+    # A negative removal would add stock (and a lot) instead.
+    if quantity <= 0:
+        raise ValueError(f"Quantity must be positive, not {quantity}.")
+
+
+def remove_stock_many(quantities):
+    """
+    Take ``{product_id: quantity}`` out of stock with one conditional
+    UPDATE. Either every product had enough and all are decremented, or
+    ``InsufficientStock`` is raised for a short product and none are. The
+    stock is taken from the lots; the caller is responsible for logging
+    the movements.
+    """
+    for quantity in quantities.values():
+        _check_quantity(quantity)
+    try:
+        with transaction.atomic():
+            taken = {pk: -quantity for pk, quantity in quantities.items()}
+            if add_to_column(Product, 'stock', taken, floor=0) != len(taken):
+                raise InsufficientStock(None, None, None)
+            lots.take(quantities)
+    except InsufficientStock:
+        available = dict(Product.objects.filter(pk__in=quantities).values_list('pk', 'stock'))
+        short = [pk for pk in sorted(quantities) if available.get(pk, 0) < quantities[pk]]
+        # Empty only if a concurrent restock landed after our UPDATE.
+        pk = short[0] if short else sorted(quantities)[0]
+        raise InsufficientStock(pk, quantities[pk], available.get(pk, 0)) from None
+
+
+def add_stock_many(quantities):
+    """
+    Add ``{product_id: quantity}`` to stock with one UPDATE. The caller is
+    responsible for receiving the lots and logging the movements.
+    """
+    for quantity in quantities.values():
+        _check_quantity(quantity)
+    add_to_column(Product, 'stock', quantities)
+
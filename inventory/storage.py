@@ -0,0 +1,104 @@
+"""
+Content-addressed storage for product images.
+
+Files are named after the SHA-256 of their content
+(``products/<sha256>.jpg``), so uploading the same picture twice stores it
+once, and a name always refers to the same bytes, which lets browsers and
+proxies cache media for as long as they like. Files are never
+overwritten; unreferenced ones are removed by ``manage.py gc_media``.
+
+Renditions (see ``inventory.thumbnails``) already carry the hash of their
+original and are stored under the name they are given, replacing any file
+of that name, so jobs resizing the same image at once agree on the result.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from .thumbnails import is_rendition
+
+_HASHED_NAME = re.compile(r'^[0-9a-f]{64}(\.\w+)?$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        """Name ``content`` would be stored under when saved as ``name``."""
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        directory = posixpath.dirname(name)
+        ext = posixpath.splitext(name)[1].lower()
+        return posixpath.join(directory, digest.hexdigest() + ext)
+
+    def get_available_name(self, name, max_length=None):
+        if is_rendition(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        if is_rendition(name):
+            return self._replace(name, content)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # A fresh mtime keeps gc_media off a file that was orphaned
+            # until this upload.
+            os.utime(self.path(name))
+            return name
+        return super()._save(name, content)
+
+    def _replace(self, name, content):
+        # Written aside and renamed into place: readers never see half a
+        # file, and the last of several identical writes wins.
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+            raise
+        return name
+
+
+product_images = ContentAddressedStorage()
+
+
+def product_image_storage():
+    return product_images
+
+
+def is_immutable(name):
+    """Whether the media file ``name`` can never change: an original or a rendition named by hash."""
+    return bool(_HASHED_NAME.match(posixpath.basename(name))) or is_rendition(name)
+
+
+class HashedStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Static files with content hashes in their names once ``collectstatic``
+    has run, so they can be cached forever. Before that (development,
+    tests) the plain names are used.
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
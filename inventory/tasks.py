@@ -0,0 +1,38 @@
+"""Work that can be handed to ``manage.py run_workers`` with ``jobs.enqueue``."""
+from django.contrib.auth.models import User
+
+from . import caching, thumbnails
+from .exports import write_export
+from .jobs import task
+from .models import Product
+from .replenishment import apply_plan, plan_replenishment
+from .routers import replica_reads
+from .stats import rebuild_stats
+
+
+@task('stats.rebuild')
+def rebuild_dashboard_stats(user_id):
+    rebuild_stats(User.objects.get(pk=user_id))
+    caching.invalidate(user_id)
+
+
+@task('replenishment.run')
+def replenish(user_id):
+    user = User.objects.get(pk=user_id)
+    plan = plan_replenishment(user)
+    apply_plan(user, plan)
+    return {'suggestions': plan.suggestion_count}
+
+
+@task('exports.write')
+def export(user_id, kind, fmt):
+    with replica_reads(user_id):
+        return {'file': write_export(User.objects.get(pk=user_id), kind, fmt)}
+
+
+@task('thumbnails.refresh')
+def refresh_thumbnails(product_id, image):
+    # Skipped if the product was deleted or its image replaced since.
+    product = Product.objects.filter(pk=product_id, image=image).first()
+    if product is not None:
+        return {'hash': thumbnails.refresh(product)}
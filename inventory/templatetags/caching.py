@@ -0,0 +1,42 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from inventory import caching
+
+register = template.Library()
+
+
+class UserCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary = vary
+
+    def render(self, context):
+        request = context.get('request')
+        user_id = getattr(getattr(request, 'user', None), 'id', None)
+        if user_id is None:
+            return self.nodelist.render(context)
+        vary = [var.resolve(context) for var in self.vary]
+        return mark_safe(caching.cached(
+            user_id, self.name.resolve(context), lambda: str(self.nodelist.render(context)), *vary,
+        ))
+
+
+@register.tag
+def usercache(parser, token):
+    """
+    Cache the enclosed fragment for the current user until their data
+    changes::
+
+        {% usercache 'sale-form' %}{{ form.as_p }}{% endusercache %}
+
+    Extra arguments are added to the key. Keep ``{% csrf_token %}`` and
+    messages outside the block.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name.")
+    nodelist = parser.parse(('endusercache',))
+    parser.delete_first_token()
+    return UserCacheNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(b) for b in bits[2:]])
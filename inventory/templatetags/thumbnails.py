@@ -0,0 +1,34 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from inventory import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_image(product, display_width, **attrs):
+    """
+    ``<picture>`` for a product image shown ``display_width`` CSS pixels
+    wide, with WebP and JPEG ``srcset``s of its renditions. Falls back to the
+    original upload until renditions exist. Extra keyword arguments become
+    attributes of the ``<img>``.
+    """
+    image = product.image
+    if not image:
+        return ''
+    attrs.setdefault('alt', product.name)
+    attrs.setdefault('loading', 'lazy')
+    if not product.image_hash:
+        return format_html('<img src="{}"{}>', image.url, flatatt(attrs))
+
+    sizes = f'{display_width}px'
+    srcsets = thumbnails.srcsets(image.name, product.image_hash)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        srcsets['webp'], sizes,
+        thumbnails.fallback_url(image.name, product.image_hash, display_width), srcsets['jpg'], sizes,
+        flatatt(attrs),
+    )
@@ -1,3 +1,1609 @@
-from django.test import TestCase
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Customer, DailySales, DashboardStats, Invoice, Job, MonthlySales, Product, Purchase, PurchaseOrder, Sale,
+    StockLot, StockMovement, Supplier,
+)
+from .benchmarks import seed_shop
+from .forms import SaleForm
+from . import caching, db, forecasting, jobs, lots, rollups, search
+from .budgets import BUDGETS, check_budgets, compare_reports, view_requests
+from .forecasting import HISTORY_DAYS, build_forecasts, forecast_rows, get_forecasts
+from .invoices import create_invoice
+from .importers import IMPORT_FORMS, import_rows, iter_rows
+from .pagination import keyset_paginate
+from .profiling import registry as profiling_registry
+from .purchasing import receive_purchase_order
+from .replenishment import LOOKBACK_DAYS, apply_plan, plan_replenishment
+from .routers import PrimaryReplicaRouter, iterate_from_replica, reads_from_replica, replica_reads
+from .stats import get_dashboard_stats, stats_drift
+from .stock import InsufficientStock, add_stock, remove_stock
+from .urls import urlpatterns
+
+
+class SalesLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.product = Product.objects.create(user=cls.user, name='Soap', cost_price=10, selling_price=15)
+        cls.other = Product.objects.create(user=cls.user, name='Rice', cost_price=10, selling_price=15)
+        cls.customer = Customer.objects.create(user=cls.user, name='Ali')
+        sales = [
+            Sale(user=cls.user, product=cls.product if i % 2 else cls.other,
+                 customer=cls.customer if i % 3 == 0 else None, quantity=1, amount=Decimal('15'), cost=10)
+            for i in range(25)
+        ]
+        Sale.objects.bulk_create(sales)
+        # Force a few ties on ``date`` so the id tie-breaker is exercised.
+        now = timezone.now()
+        for i, sale in enumerate(Sale.objects.order_by('id')):
+            Sale.objects.filter(pk=sale.pk).update(date=now - timedelta(hours=i // 2))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def walk(self, params=None, per_page=4):
+        queryset = Sale.objects.filter(user=self.user)
+        params = dict(params or {})
+        seen = []
+        while True:
+            page = keyset_paginate(queryset, params, 'date', per_page=per_page)
+            seen.extend(page)
+            if not page.has_next:
+                return seen
+            params = {'after': page.next_cursor}
+
+    def test_walk_visits_every_sale_once_newest_first(self):
+        seen = self.walk()
+        expected = list(Sale.objects.filter(user=self.user).order_by('-date', '-id'))
+        self.assertEqual(seen, expected)
+
+    def test_before_cursor_returns_previous_page(self):
+        queryset = Sale.objects.filter(user=self.user)
+        first = keyset_paginate(queryset, {}, 'date', per_page=4)
+        second = keyset_paginate(queryset, {'after': first.next_cursor}, 'date', per_page=4)
+        back = keyset_paginate(queryset, {'before': second.prev_cursor}, 'date', per_page=4)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous)
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        page = keyset_paginate(Sale.objects.filter(user=self.user), {'after': '!!'}, 'date', per_page=4)
+        self.assertFalse(page.has_previous)
+        self.assertEqual(len(page), 4)
+
+    def test_view_fetches_ledger_rows_in_one_query(self):
+        # session, user, ledger page; the forms' autocomplete fields list no options
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('sales'))
+        self.assertEqual(len(response.context['sales']), 25)
+
+    def test_view_filters_by_product_and_customer(self):
+        response = self.client.get(reverse('sales'), {'product': self.product.pk, 'customer': self.customer.pk})
+        rows = list(response.context['sales'])
+        self.assertTrue(rows)
+        self.assertTrue(all(s.product_id == self.product.pk and s.customer_id == self.customer.pk for s in rows))
+
+    def test_view_filters_by_date_range(self):
+        today = timezone.localdate()
+        response = self.client.get(reverse('sales'), {'date_from': today + timedelta(days=1)})
+        self.assertEqual(len(response.context['sales']), 0)
+
+
+class ProductCatalogueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        today = date.today()
+        cls.expired = Product.objects.create(user=cls.user, name='Milk', cost_price=1, selling_price=2,
+                                             expiry_date=today - timedelta(days=1))
+        cls.near = Product.objects.create(user=cls.user, name='Bread', cost_price=1, selling_price=2,
+                                          expiry_date=today + timedelta(days=7))
+        cls.good = Product.objects.create(user=cls.user, name='Rice', cost_price=1, selling_price=2,
+                                          expiry_date=today + timedelta(days=8))
+        cls.undated = Product.objects.create(user=cls.user, name='Soap', cost_price=1, selling_price=2)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_expiry_status_is_annotated_in_sql(self):
+        statuses = dict(Product.objects.with_expiry_status().values_list('name', 'expiry_status'))
+        self.assertEqual(statuses, {'Milk': 'expired', 'Bread': 'near', 'Rice': 'good', 'Soap': None})
+
+    def test_products_page_is_paginated(self):
+        Product.objects.bulk_create([
+            Product(user=self.user, name=f'Item {i}', cost_price=1, selling_price=2) for i in range(60)
+        ])
+        # session, user, product page; the supplier field lists no options
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('products'))
+        page = response.context['page']
+        self.assertEqual(len(page), 50)
+        self.assertTrue(page.has_next)
+        self.assertContains(response, 'id="editProductModal"', count=1)
+
+        response = self.client.get(reverse('products'), {'after': page.next_cursor})
+        self.assertEqual(len(response.context['page']), 14)
+
+    def test_edit_form_is_served_as_a_fragment(self):
+        response = self.client.get(reverse('product_edit', args=[self.good.pk]))
+        self.assertContains(response, 'Edit Rice')
+        self.assertNotContains(response, '<html')
+
+    def test_edit_form_is_scoped_to_owner(self):
+        other = User.objects.create_user('other', password='pw')
+        self.client.force_login(other)
+        response = self.client.get(reverse('product_edit', args=[self.good.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class DashboardStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.supplier = Supplier.objects.create(user=cls.user, name='Acme', contact='1', email='a@example.com')
+        cls.product = Product.objects.create(user=cls.user, name='Soap', cost_price=10, selling_price=15, stock=50)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        get_dashboard_stats(self.user)
+
+    def test_incremental_updates_match_a_rebuild(self):
+        self.client.post(reverse('sale_add'), {'product': self.product.pk, 'quantity': 2, 'amount': '30'})
+        self.client.post(reverse('sale_add'), {'product': self.product.pk, 'quantity': 1, 'amount': '15'})
+        self.client.post(reverse('product_add'), {'name': 'Rice', 'cost_price': '1', 'selling_price': '2',
+                                                  'stock': 1})
+        self.client.post(reverse('purchase_add'), {'supplier': self.supplier.pk, 'product': self.product.pk,
+                                                   'quantity': 5, 'total_price': '50'})
+        Sale.objects.filter(amount=15).first().delete()
+        Customer.objects.create(user=self.user, name='Ali')
+
+        stats = DashboardStats.objects.get(user=self.user)
+        self.assertEqual((stats.product_count, stats.supplier_count, stats.customer_count), (2, 1, 1))
+        self.assertEqual((stats.sale_count, stats.revenue, stats.purchase_total), (1, 30, 50))
+        self.assertEqual(stats_drift(self.user), [])
+
+    def test_amounts_assigned_as_strings(self):
+        # A str stays a str on the instance until it is reloaded.
+        sale = Sale.objects.create(user=self.user, product=self.product, quantity=1, amount='12.50')
+        purchase = Purchase.objects.create(user=self.user, supplier=self.supplier, product=self.product,
+                                           product_name='Soap', quantity=1, total_price='20.25')
+        stats = DashboardStats.objects.get(user=self.user)
+        self.assertEqual((stats.revenue, stats.purchase_total), (Decimal('12.50'), Decimal('20.25')))
+        sale.delete()
+        purchase.delete()
+        self.assertEqual(stats_drift(self.user), [])
+        self.assertEqual(rollups.rollup_drift(self.user), [])
+
+    def test_deleting_a_product_with_many_sales(self):
+        Sale.objects.bulk_create([
+            Sale(user=self.user, product=self.product, quantity=1, amount=15, cost=10) for _ in range(200)
+        ])
+        call_command('rebuild_dashboard_stats', stdout=StringIO())
+        rollups.rebuild_rollups(self.user)
+        invoice = create_invoice(self.user, [{'product': self.product.pk, 'quantity': 1}])
+        # The sales are read and deleted in bulk, not one by one.
+        with self.assertNumQueries(16):
+            self.product.delete()
+        self.assertEqual(stats_drift(self.user), [])
+        self.assertEqual(rollups.rollup_drift(self.user), [])
+        self.assertFalse(Invoice.objects.filter(pk=invoice.pk, lines__isnull=False).exists())
+
+    def test_deleting_an_invoice(self):
+        rice = Product.objects.create(user=self.user, name='Rice', cost_price=1, selling_price=2, stock=5)
+        invoice = create_invoice(self.user, [{'product': self.product.pk, 'quantity': 2},
+                                             {'product': rice.pk, 'quantity': 1}])
+        invoice.delete()
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(stats_drift(self.user), [])
+        self.assertEqual(rollups.rollup_drift(self.user), [])
+
+    def test_dashboard_reads_materialized_row(self):
+        # session, user, stats row, sales history for the forecast
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_products'], 1)
+
+    def test_check_command_reports_drift(self):
+        DashboardStats.objects.filter(user=self.user).update(product_count=99)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_dashboard_stats', '--check', stdout=StringIO())
+        call_command('rebuild_dashboard_stats', stdout=StringIO())
+        self.assertEqual(stats_drift(self.user), [])
+
+
+class StockLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.product = Product.objects.create(user=cls.user, name='Soap', cost_price=10, selling_price=15, stock=3)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_sale_decrements_stock_and_logs_movement(self):
+        self.client.post(reverse('sale_add'), {'product': self.product.pk, 'quantity': 2, 'amount': '30'})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        movement = StockMovement.objects.get()
+        self.assertEqual((movement.change, movement.reason, movement.sale), (-2, 'sale', Sale.objects.get()))
+
+    def test_short_stock_rejects_sale_without_writing(self):
+        response = self.client.post(reverse('sale_add'), {'product': self.product.pk, 'quantity': 4,
+                                                          'amount': '60'}, follow=True)
+        self.assertContains(response, 'Only 3 left')
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_remove_stock_raises_when_short(self):
+        with self.assertRaises(InsufficientStock) as ctx:
+            remove_stock(self.product.pk, 5, StockMovement.SALE)
+        self.assertEqual(ctx.exception.available, 3)
+
+    def test_quantities_must_be_positive(self):
+        for quantity in (0, -5):
+            with self.assertRaises(ValueError):
+                remove_stock(self.product.pk, quantity, StockMovement.SALE)
+            with self.assertRaises(ValueError):
+                add_stock(self.product.pk, quantity, StockMovement.PURCHASE)
+            response = self.client.post(reverse('sale_add'), {'product': self.product.pk, 'quantity': quantity,
+                                                              'amount': '30'}, follow=True)
+            self.assertContains(response, 'Invalid sale data')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(StockLot.objects.exists())
+
+    def test_edit_logs_stock_change_as_adjustment(self):
+        data = {'name': 'Soap', 'cost_price': '10', 'selling_price': '15', 'stock': 10}
+        self.client.post(reverse('product_edit', args=[self.product.pk]), data)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+        movement = StockMovement.objects.get()
+        self.assertEqual((movement.change, movement.reason), (7, 'adjustment'))
+
+
+class ConcurrentStockTests(TransactionTestCase):
+    threads = 8
+    sales_per_thread = 250
+    initial_stock = 1500
+
+    def test_concurrent_sales_never_oversell(self):
+        user = User.objects.create_user('shop', password='pw')
+        product = Product.objects.create(user=user, name='Soap', cost_price=1, selling_price=2,
+                                         stock=self.initial_stock)
+        barrier = threading.Barrier(self.threads)
+        failures = []
+
+        def checkout():
+            try:
+                barrier.wait()
+                for _ in range(self.sales_per_thread):
+                    while True:
+                        try:
+                            with transaction.atomic():
+                                sale = Sale.objects.create(user=user, product=product, quantity=1, amount=2)
+                                remove_stock(product.pk, 1, StockMovement.SALE, sale=sale)
+                            break
+                        except InsufficientStock:
+                            break
+                        except OperationalError:
+                            # SQLite's shared-cache test database reports
+                            # lock contention instead of waiting on it.
+                            time.sleep(0.005)
+            except Exception as exc:
+                failures.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=checkout) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(failures, [])
+        product.refresh_from_db()
+        sold = Sale.objects.count()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(sold, self.initial_stock)
+        self.assertEqual(StockMovement.objects.filter(product=product).count(), sold)
+
+
+class InvoiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.soap = Product.objects.create(user=cls.user, name='Soap', cost_price=10, selling_price=15, stock=5)
+        cls.rice = Product.objects.create(user=cls.user, name='Rice', cost_price=1, selling_price=2, stock=1)
+        cls.customer = Customer.objects.create(user=cls.user, name='Ali')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post(self, payload):
+        return self.client.post(reverse('invoice_add'), json.dumps(payload), content_type='application/json')
+
+    def test_invoice_records_every_line_in_one_transaction(self):
+        response = self.post({'customer': self.customer.pk, 'lines': [
+            {'product': self.soap.pk, 'quantity': 2},
+            {'product': self.rice.pk, 'quantity': 1, 'amount': '1.50'},
+            {'product': self.soap.pk, 'quantity': 3},
+        ]})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total'], '76.50')
+        invoice = Invoice.objects.get()
+        self.assertEqual(invoice.lines.count(), 3)
+        self.assertEqual(StockMovement.objects.filter(sale__invoice=invoice).count(), 3)
+        self.assertEqual(dict(Product.objects.values_list('name', 'stock')), {'Soap': 0, 'Rice': 0})
+
+    def test_basket_is_written_in_a_fixed_number_of_queries(self):
+        lots.receive([StockLot(user=self.user, product=self.soap, quantity=5),
+                      StockLot(user=self.user, product=self.rice, quantity=1)])
+        lines = [{'product': self.soap.pk, 'quantity': 1}, {'product': self.rice.pk, 'quantity': 1},
+                 {'product': self.soap.pk, 'quantity': 2}]
+        # products, customer, stock, lots read, updated and the emptied one's
+        # expiry, invoice, sales, sale ids, movements, stats, daily and
+        # monthly rollups, plus savepoints
+        with self.assertNumQueries(19):
+            invoice = create_invoice(self.user, lines, customer_id=self.customer.pk)
+        movements = StockMovement.objects.filter(sale__invoice=invoice).values_list(
+            'sale__product', 'sale__quantity', 'sale__customer', 'product', 'change')
+        self.assertEqual(sorted(movements), sorted([
+            (self.soap.pk, 1, self.customer.pk, self.soap.pk, -1),
+            (self.rice.pk, 1, self.customer.pk, self.rice.pk, -1),
+            (self.soap.pk, 2, self.customer.pk, self.soap.pk, -2),
+        ]))
+        self.assertEqual(sorted(StockLot.objects.values_list('remaining', flat=True)), [0, 2])
+        self.assertEqual(rollups.rollup_drift(self.user), [])
+
+    def test_short_line_rejects_whole_basket(self):
+        response = self.post({'lines': [
+            {'product': self.soap.pk, 'quantity': 1},
+            {'product': self.rice.pk, 'quantity': 2},
+        ]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['product'], self.rice.pk)
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(dict(Product.objects.values_list('name', 'stock')), {'Soap': 5, 'Rice': 1})
+
+    def test_invalid_lines_are_reported(self):
+        response = self.post({'lines': [{'product': self.soap.pk, 'quantity': 0}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('lines.0', response.json()['errors'])
+
+    def test_other_users_products_are_rejected(self):
+        other = User.objects.create_user('other', password='pw')
+        foreign = Product.objects.create(user=other, name='Tea', cost_price=1, selling_price=2, stock=9)
+        response = self.post({'lines': [{'product': foreign.pk, 'quantity': 1}]})
+        self.assertEqual(response.status_code, 400)
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.stock, 9)
+
+    def test_dashboard_stats_include_invoice_lines(self):
+        get_dashboard_stats(self.user)
+        self.post({'lines': [{'product': self.soap.pk, 'quantity': 2}]})
+        self.assertEqual(stats_drift(self.user), [])
+
+
+class ImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.supplier = Supplier.objects.create(user=cls.user, name='Acme', contact='1', email='a@example.com')
+
+    def test_importer_mirrors_every_form_level_check(self):
+        # Rows only go through the form fields; any other check a form or
+        # model makes must be repeated by the importer (see its docstring).
+        from django import forms
+        from django.db import models
+
+        mirrored = {'products': {'clean_name'}}
+        for kind, form_class in IMPORT_FORMS.items():
+            hooks = {name for name in dir(form_class) if name.startswith('clean')} - set(dir(forms.ModelForm))
+            self.assertEqual(hooks, mirrored.get(kind, set()), kind)
+            self.assertIs(form_class._meta.model.clean, models.Model.clean, kind)
+
+    def test_products_are_validated_and_batched(self):
+        data = (
+            "name,category,cost_price,selling_price,stock,supplier,expiry_date\n"
+            "Soap,Bath,10,15,4,acme,2030-01-01\n"
+            "Rice,Food,oops,2,1,,\n"
+            "Tea,Food,1,2,0,Nobody,\n"
+            "Milk,Dairy,1,2,3,,\n"
+        )
+        result = import_rows(self.user, 'products', iter_rows(BytesIO(data.encode()), 'p.csv'), batch_size=1)
+        self.assertEqual((result.created, result.failed), (2, 2))
+        self.assertEqual([line for line, _ in result.errors], [3, 4])
+        self.assertIn('cost_price', result.errors[0][1])
+        soap = Product.objects.get(name='Soap')
+        self.assertEqual((soap.supplier, soap.stock, soap.user), (self.supplier, 4, self.user))
+        self.assertEqual(StockMovement.objects.count(), 2)
+        lot = StockLot.objects.get(product=soap)
+        self.assertEqual((lot.remaining, lot.expiry_date, lot.unit_cost), (4, date(2030, 1, 1), Decimal('10')))
+        self.assertIsNotNone(lot.received_at)
+
+    def test_duplicate_product_names_are_rejected(self):
+        Product.objects.create(user=self.user, name='Soap', cost_price=1, selling_price=2)
+        data = "name,cost_price,selling_price,stock\nSoap,1,2,0\nTea,1,2,0\nTea,1,2,0\n"
+        result = import_rows(self.user, 'products', iter_rows(BytesIO(data.encode()), 'p.csv'))
+        self.assertEqual((result.created, result.failed), (1, 2))
+        self.assertEqual(sorted(line for line, _ in result.errors), [2, 4])
+
+    def test_import_keeps_dashboard_counts(self):
+        get_dashboard_stats(self.user)
+        data = "name,email,phone\nAli,ali@example.com,123\nSara,not-an-email,\n"
+        import_rows(self.user, 'customers', iter_rows(BytesIO(data.encode()), 'c.csv'))
+        self.assertEqual(stats_drift(self.user), [])
+
+    def test_command_reports_rejected_rows(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write("name,contact,email\nAcme 2,123,acme@example.com\n,123,bad\n")
+        self.addCleanup(os.unlink, f.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_inventory', 'suppliers', f.name, user='shop', stdout=out, stderr=err)
+        self.assertIn('Imported 1 suppliers', out.getvalue())
+        self.assertIn('line 3: name', err.getvalue())
+
+    def test_upload_view(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('c.csv', b"name,phone\nAli,1\n", content_type='text/csv')
+        response = self.client.post(reverse('import_inventory'), {'kind': 'customers', 'file': upload})
+        self.assertContains(response, 'Imported 1 row(s); 0 rejected.')
+        self.assertTrue(Customer.objects.filter(user=self.user, name='Ali').exists())
+
+    @skipUnless(importlib.util.find_spec('openpyxl'), 'openpyxl is not installed')
+    def test_upload_view_reports_a_corrupt_workbook(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('c.xlsx', b"name,phone\nAli,1\n")
+        response = self.client.post(reverse('import_inventory'), {'kind': 'customers', 'file': upload})
+        self.assertContains(response, 'Could not read c.xlsx: not a valid .xlsx workbook')
+
+    def test_upload_view_reports_a_file_that_is_not_utf8(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('c.csv', "name\nZoë\n".encode('latin-1'), content_type='text/csv')
+        response = self.client.post(reverse('import_inventory'), {'kind': 'customers', 'file': upload})
+        self.assertContains(response, 'Could not read c.csv')
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        supplier = Supplier.objects.create(user=cls.user, name='Acme', contact='1', email='a@example.com')
+        cls.product = Product.objects.create(user=cls.user, name='Soap', cost_price='2.50', selling_price=4, stock=4)
+        Sale.objects.create(user=cls.user, product=cls.product, quantity=2, amount='8.00')
+        Purchase.objects.create(user=cls.user, supplier=supplier, product_name='Soap', quantity=3, total_price=7)
+        other = User.objects.create_user('other', password='pw')
+        Product.objects.create(user=other, name='Hidden', cost_price=1, selling_price=2, stock=1)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_sales_csv_streams(self):
+        response = self.client.get(reverse('export_data', args=['sales', 'csv']))
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,date,product,customer,quantity,amount,invoice')
+        self.assertEqual(len(lines), 2)
+        self.assertIn(',Soap,,2,8.00,', lines[1])
+
+    def test_stock_valuation_jsonl_is_scoped_to_user(self):
+        response = self.client.get(reverse('export_data', args=['stock-valuation', 'jsonl']))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(rows, [{'id': self.product.pk, 'name': 'Soap', 'category': '', 'stock': 4,
+                                 'cost_price': '2.50', 'value': '10.00'}])
+
+    def test_unknown_export_is_404(self):
+        response = self.client.get(reverse('export_data', args=['users', 'csv']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_command_writes_purchases(self):
+        out = StringIO()
+        call_command('export_inventory', 'purchases', user='shop', stdout=out)
+        self.assertIn(',Acme,Soap,3,7.00', out.getvalue())
+
+
+class PurchaseReceivingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.supplier = Supplier.objects.create(user=cls.user, name='Acme', contact='1', email='a@example.com')
+        cls.soap = Product.objects.create(user=cls.user, name='Soap', cost_price=10, selling_price=15, stock=1)
+        cls.rice = Product.objects.create(user=cls.user, name='Rice', cost_price=1, selling_price=2)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_purchase_links_product_and_increases_stock(self):
+        self.client.post(reverse('purchase_add'), {'supplier': self.supplier.pk, 'product': self.soap.pk,
+                                                   'quantity': 4, 'total_price': '40'})
+        purchase = Purchase.objects.get()
+        self.assertEqual((purchase.product, purchase.product_name), (self.soap, 'Soap'))
+        self.soap.refresh_from_db()
+        self.assertEqual(self.soap.stock, 5)
+
+    def test_purchase_keeps_a_long_product_name(self):
+        # SQLite ignores max_length, so compare the fields; PostgreSQL would raise DataError.
+        name_length = Product._meta.get_field('name').max_length
+        self.assertEqual(Purchase._meta.get_field('product_name').max_length, name_length)
+        product = Product.objects.create(user=self.user, name='x' * name_length, cost_price=1, selling_price=2)
+        self.client.post(reverse('purchase_add'), {'supplier': self.supplier.pk, 'product': product.pk,
+                                                   'quantity': 1, 'total_price': '1'})
+        self.assertEqual(Purchase.objects.get().product_name, product.name)
+
+    def test_duplicate_product_name_is_a_form_error(self):
+        response = self.client.post(reverse('product_add'), {'name': 'Soap', 'cost_price': '1',
+                                                             'selling_price': '2', 'stock': 0}, follow=True)
+        self.assertContains(response, 'already have a product with this name')
+        self.assertEqual(Product.objects.filter(name='Soap').count(), 1)
+
+    def test_receive_order_in_a_handful_of_queries(self):
+        products = Product.objects.bulk_create([
+            Product(user=self.user, name=f'Item {i}', cost_price=1, selling_price=2) for i in range(60)
+        ])
+        lines = [{'product': p.pk, 'quantity': 1 + i % 3, 'total_price': '5'} for i, p in enumerate(products)]
+        # session, user, supplier, products, stock, order, purchases,
+        # movements, lots, stats, daily and monthly rollups, plus savepoints
+        with self.assertNumQueries(16):
+            response = self.client.post(reverse('purchase_order_add'),
+                                        json.dumps({'supplier': self.supplier.pk, 'lines': lines}),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        order = PurchaseOrder.objects.get()
+        self.assertEqual((order.lines.count(), order.total), (60, 300))
+        self.assertEqual(Product.objects.get(name='Item 2').stock, 3)
+        self.assertEqual(StockMovement.objects.filter(purchase__order=order).count(), 60)
+
+    def test_receive_order_rejects_foreign_supplier(self):
+        other = User.objects.create_user('other', password='pw')
+        foreign = Supplier.objects.create(user=other, name='Evil', contact='1', email='e@example.com')
+        response = self.client.post(reverse('purchase_order_add'),
+                                    json.dumps({'supplier': foreign.pk,
+                                                'lines': [{'product': self.soap.pk, 'quantity': 1,
+                                                           'total_price': '1'}]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Purchase.objects.exists())
+
+
+class QueryPlanTests(TestCase):
+    """Every tenant-scoped page must reach its rows through an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        for owner in (cls.user, User.objects.create_user('other', password='pw')):
+            supplier = Supplier.objects.create(user=owner, name='Acme', contact='1', email='a@example.com')
+            customer = Customer.objects.create(user=owner, name='Ali')
+            products = Product.objects.bulk_create([
+                Product(user=owner, name=f'Item {i}', cost_price=1, selling_price=2, stock=i,
+                        expiry_date=date.today() + timedelta(days=i))
+                for i in range(20)
+            ])
+            Sale.objects.bulk_create([
+                Sale(user=owner, product=products[i % 20], customer=customer, quantity=1, amount=2, cost=1)
+                for i in range(50)
+            ])
+            Purchase.objects.bulk_create([
+                Purchase(user=owner, supplier=supplier, product=products[i], product_name=products[i].name,
+                         quantity=1, total_price=1)
+                for i in range(20)
+            ])
+        cls.product = Product.objects.filter(user=cls.user).first()
+        get_dashboard_stats(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        caching.get_cache().clear()
+        self.client.force_login(self.user)
+
+    def assertNoFullScans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+            scans = [step for step in plan if step.startswith('SCAN ') and 'INDEX' not in step]
+            self.assertFalse(scans, f"{url} scans a whole table:\n{sql}\n" + '\n'.join(plan))
+
+    def test_pages_use_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plans are checked with SQLite EXPLAIN QUERY PLAN.')
+        for url in (
+            reverse('home'),
+            reverse('dashboard'),
+            reverse('products'),
+            reverse('product_view', args=[self.product.pk]),
+            reverse('suppliers'),
+            reverse('customers'),
+            reverse('sales'),
+            reverse('sales') + f'?product={self.product.pk}',
+            reverse('purchases'),
+        ):
+            with self.subTest(url=url):
+                self.assertNoFullScans(url)
+
+
+class ViewBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        seed_shop(cls.user, products=30, suppliers=3, customers=10, sales=200)
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in urlpatterns}
+        self.assertEqual(names, set(BUDGETS))
+        self.assertEqual(set(view_requests(self.user)), set(BUDGETS))
+
+    def test_views_stay_within_query_budget(self):
+        # Wall-time budgets depend on the machine; bench_views checks them.
+        for row in check_budgets(self.user):
+            with self.subTest(view=row['view']):
+                self.assertLessEqual(row['queries'], row['budget_queries'], row)
+                self.assertLess(row['status'], 400, row)
+
+    def test_compare_reports_flags_regressions(self):
+        old = [{'view': 'sales', 'queries': 7, 'db_ms': 1.0, 'wall_ms': 100.0}]
+        new = [{'view': 'sales', 'queries': 8, 'db_ms': 1.1, 'wall_ms': 150.0}]
+        self.assertEqual(list(compare_reports(old, new)),
+                         [('sales', 'queries', 7, 8), ('sales', 'wall_ms', 100.0, 150.0)])
+
+
+PROFILED_MIDDLEWARE = ['inventory.profiling.RequestProfilingMiddleware'] + settings.MIDDLEWARE
+
+
+@override_settings(MIDDLEWARE=PROFILED_MIDDLEWARE, INVENTORY_PROFILING_SAMPLE_RATE=1.0)
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.staff = User.objects.create_user('admin', password='pw', is_staff=True)
+        Product.objects.create(user=cls.user, name='Soap', cost_price=10, selling_price=15)
+
+    def setUp(self):
+        profiling_registry.reset()
+        self.addCleanup(profiling_registry.reset)
+
+    def test_records_sql_and_template_time_per_view(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('products'))
+        self.client.get(reverse('products'))
+        summaries = profiling_registry._views['products']
+        self.assertEqual(summaries['request_duration_seconds'].count, 2)
+        miss, hit = summaries['sql_queries'].samples
+        self.assertGreaterEqual(miss, 3)
+        self.assertLess(hit, miss)  # the page came from the per-user cache
+        self.assertGreater(summaries['template_duration_seconds'].sum, 0)
+        self.assertLess(summaries['template_duration_seconds'].sum, summaries['request_duration_seconds'].sum)
+
+    @override_settings(INVENTORY_PROFILING_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_not_recorded(self):
+        self.client.get(reverse('home'))
+        self.assertEqual(profiling_registry.render().count('inventory_request_duration_seconds_count'), 0)
+
+    def test_metrics_are_staff_only_prometheus_text(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('home'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('# TYPE inventory_request_duration_seconds summary', body)
+        self.assertIn('inventory_sql_queries{view="home",quantile="0.95"}', body)
+        self.assertIn('inventory_request_duration_seconds_count{view="home"} 1', body)
+
+
+class ForecastTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.soap = Product.objects.create(user=cls.user, name='Soap', cost_price=10, selling_price=15, stock=20)
+        cls.rice = Product.objects.create(user=cls.user, name='Rice', cost_price=1, selling_price=2)
+        cls.today = timezone.localdate()
+        # Soap sells 7 a day on the weekday of tomorrow and nothing otherwise.
+        tomorrow = cls.today + timedelta(days=1)
+        for days_ago in range(1, HISTORY_DAYS + 1):
+            day = cls.today - timedelta(days=days_ago)
+            if day.weekday() == tomorrow.weekday():
+                sale = Sale.objects.create(user=cls.user, product=cls.soap, quantity=7, amount=105)
+                Sale.objects.filter(pk=sale.pk).update(
+                    date=timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=12)
+                )
+        # Today's sales are not part of the history.
+        Sale.objects.create(user=cls.user, product=cls.rice, quantity=50, amount=100)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_weekly_pattern(self):
+        forecasts = build_forecasts(self.user.id, self.today)
+        tomorrow, week = forecasts.for_product(self.soap.pk)
+        self.assertAlmostEqual(tomorrow, 7)
+        self.assertAlmostEqual(week, 7)
+        self.assertAlmostEqual(forecasts.revenue_next_week, 105)
+        self.assertEqual(forecasts.for_product(self.rice.pk), (0.0, 0.0))
+
+    @skipUnless(forecasting.numpy, 'NumPy is not installed')
+    def test_numpy_matches_pure_python(self):
+        rng = random.Random(1)
+        rows = [[float(rng.randint(0, 9)) for _ in range(HISTORY_DAYS)] for _ in range(20)]
+        expected = forecast_rows(rows)
+        actual = forecast_rows(forecasting.numpy.array(rows))
+        for expected_row, actual_row in zip(expected, actual.tolist()):
+            for e, a in zip(expected_row, actual_row):
+                self.assertAlmostEqual(e, a)
+
+    def test_forecasts_are_cached_per_user_and_day(self):
+        with self.assertNumQueries(1):
+            get_forecasts(self.user.id, self.today)
+        with self.assertNumQueries(0):
+            get_forecasts(self.user.id, self.today)
+
+    def test_pages_show_forecasts(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('product_view', args=[self.soap.pk]))
+        self.assertEqual(response.context['expected_sales'], 7)
+        self.assertEqual(response.context['future_stock'], 13)
+        self.assertEqual(self.client.get(reverse('dashboard')).context['predicted_next_week'], 105)
+
+
+class ReplenishmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.supplier = Supplier.objects.create(user=cls.user, name='Acme', contact='1', email='a@example.com')
+        cls.soap = Product.objects.create(user=cls.user, name='Soap', cost_price=10, selling_price=15,
+                                          stock=6, supplier=cls.supplier)
+        cls.rice = Product.objects.create(user=cls.user, name='Rice', cost_price=1, selling_price=2,
+                                          stock=500, supplier=cls.supplier)
+        cls.tea = Product.objects.create(user=cls.user, name='Tea', cost_price=1, selling_price=2, stock=0)
+        today = timezone.localdate()
+        # Two units of soap, rice and tea a day, every day of the lookback.
+        for days_ago in range(1, LOOKBACK_DAYS + 1):
+            noon = timezone.make_aware(datetime.combine(today - timedelta(days=days_ago), datetime.min.time()))
+            for product in (cls.soap, cls.rice, cls.tea):
+                sale = Sale.objects.create(user=cls.user, product=product, quantity=2, amount=2)
+                Sale.objects.filter(pk=sale.pk).update(date=noon + timedelta(hours=12))
+        # Acme delivers every five days.
+        for days_ago in (20, 15, 10):
+            purchase = Purchase.objects.create(user=cls.user, supplier=cls.supplier, product=cls.rice,
+                                               product_name='Rice', quantity=1, total_price=1)
+            Purchase.objects.filter(pk=purchase.pk).update(date=today - timedelta(days=days_ago))
+
+    def test_plan_uses_velocity_and_delivery_interval(self):
+        with self.assertNumQueries(3):
+            plan = plan_replenishment(self.user)
+        self.assertEqual(plan.reorder_points, {self.soap.pk: 10, self.rice.pk: 10, self.tea.pk: 14})
+        [suggestion] = plan.suggestions[self.supplier.pk]
+        self.assertEqual(suggestion.product_id, self.soap.pk)
+        # Delivery interval plus 14 days of cover at two a day, less the six on hand.
+        self.assertEqual((suggestion.quantity, suggestion.estimated_cost), (32, 320))
+        self.assertEqual([s.product_id for s in plan.unassigned], [self.tea.pk])
+
+    def test_products_without_sales_keep_their_reorder_point(self):
+        salt = Product.objects.create(user=self.user, name='Salt', cost_price=1, selling_price=2, stock=3,
+                                      reorder_point=5, supplier=self.supplier)
+        plan = plan_replenishment(self.user)
+        self.assertNotIn(salt.pk, plan.reorder_points)
+        apply_plan(self.user, plan)
+        salt.refresh_from_db()
+        self.assertTrue(salt.needs_reorder)
+
+    def test_command_replaces_draft_orders(self):
+        call_command('replenish', user=['shop'], stdout=StringIO())
+        call_command('replenish', user=['shop'], stdout=StringIO())
+        draft = PurchaseOrder.objects.get(status=PurchaseOrder.DRAFT)
+        self.assertEqual((draft.supplier, draft.total), (self.supplier, 320))
+        self.assertEqual(draft.suggestions.get().product, self.soap)
+        self.assertFalse(Purchase.objects.filter(order=draft).exists())
+        self.soap.refresh_from_db()
+        self.assertEqual(self.soap.reorder_point, 10)
+
+    def test_low_stock_follows_reorder_points(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('home')).context['low_stock'], 1)  # tea, by the default
+        call_command('replenish', stdout=StringIO())
+        self.assertEqual(self.client.get(reverse('home')).context['low_stock'], 2)  # soap and tea
+        self.assertContains(self.client.get(reverse('products')), 'Low!', count=2)
+
+
+class JobQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        Product.objects.create(user=cls.user, name='Soap', cost_price=10, selling_price=15, stock=4)
+
+    def setUp(self):
+        self.calls = []
+        jobs.TASKS['test.record'] = lambda **payload: self.calls.append(payload) or len(self.calls)
+        jobs.TASKS['test.fail'] = self.fail_task
+        self.addCleanup(jobs.TASKS.pop, 'test.record')
+        self.addCleanup(jobs.TASKS.pop, 'test.fail')
+
+    def fail_task(self):
+        raise ValueError('boom')
+
+    def test_idempotency_key_returns_the_same_job(self):
+        first = jobs.enqueue('test.record', {'n': 1}, idempotency_key='k')
+        second = jobs.enqueue('test.record', {'n': 2}, idempotency_key='k')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_higher_priority_runs_first(self):
+        jobs.enqueue('test.record', {'n': 'low'})
+        jobs.enqueue('test.record', {'n': 'high'}, priority=10)
+        jobs.enqueue('test.record', {'n': 'later'}, priority=20, delay=timedelta(hours=1))
+        self.assertEqual(jobs.work('test', burst=True), 2)
+        self.assertEqual(self.calls, [{'n': 'high'}, {'n': 'low'}])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 2)
+
+    def test_failures_are_retried_with_backoff_then_given_up(self):
+        job = jobs.enqueue('test.fail', max_attempts=2)
+        with self.assertLogs('inventory.jobs', 'WARNING'):
+            jobs.work('test', burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('ValueError: boom', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('inventory.jobs', 'WARNING'):
+            jobs.work('test', burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_stale_jobs_are_requeued(self):
+        job = jobs.enqueue('test.record')
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.QUEUED)
+
+    def test_stale_jobs_without_attempts_left_fail(self):
+        job = jobs.enqueue('test.record', max_attempts=2)
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, attempts=2,
+                                             locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+        self.assertIn('worker died', job.last_error)
+
+    def test_background_export(self):
+        export_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_root)
+        self.client.force_login(self.user)
+        url = reverse('export_background', args=['stock-valuation', 'csv'])
+        response = self.client.post(url, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.post(url, HTTP_IDEMPOTENCY_KEY='abc').json()['job'], response.json()['job'])
+        self.assertEqual(response.json()['status'], Job.QUEUED)
+
+        with override_settings(INVENTORY_EXPORT_ROOT=export_root):
+            call_command('run_workers', burst=True, threads=1, stdout=StringIO())
+            status = self.client.get(response.json()['url']).json()
+            self.assertEqual(status['status'], Job.DONE)
+            download = self.client.get(status['download'])
+            self.assertIn(b'Soap,,4,10.00,40.00', b''.join(download.streaming_content))
+
+        other = User.objects.create_user('other', password='pw')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(response.json()['url']).status_code, 404)
+
+
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client.force_login(self.user)
+
+    def upload(self, name='photo.jpg', size=(1200, 800)):
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_upload_creates_hashed_renditions(self):
+        from .thumbnails import FORMATS, WIDTHS, rendition_name
+
+        self.client.post(reverse('product_add'), {
+            'name': 'Soap', 'cost_price': '1', 'selling_price': '2', 'stock': 0, 'image': self.upload(),
+        })
+        product = Product.objects.get(name='Soap')
+        self.assertEqual(product.image_hash, '')
+        self.assertIn(product.image.url, self.client.get(reverse('products')).content.decode())
+
+        jobs.work('test', burst=True)
+        product.refresh_from_db()
+        self.assertEqual(len(product.image_hash), 12)
+        for width in WIDTHS:
+            for ext in FORMATS:
+                self.assertTrue(product.image.storage.exists(
+                    rendition_name(product.image.name, product.image_hash, width, ext)))
+
+        html = self.client.get(reverse('products')).content.decode()
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f'.{product.image_hash}.w100.jpg', html)
+        self.assertIn('sizes="50px"', html)
+
+    def test_backfill_command(self):
+        from django.core.files.storage import default_storage
+
+        name = default_storage.save('products/old.jpg', self.upload())
+        broken = default_storage.save('products/broken.jpg', SimpleUploadedFile('broken.jpg', b'not an image'))
+        Product.objects.create(user=self.user, name='Old', cost_price=1, selling_price=2, image=name)
+        Product.objects.create(user=self.user, name='Copy', cost_price=1, selling_price=2, image=name)
+        Product.objects.create(user=self.user, name='Broken', cost_price=1, selling_price=2, image=broken)
+
+        out, err = StringIO(), StringIO()
+        call_command('backfill_thumbnails', workers=1, stdout=out, stderr=err)
+        self.assertIn('Processed 1 of 2', out.getvalue())
+        self.assertIn('broken.jpg', err.getvalue())
+        hashes = set(Product.objects.filter(image=name).values_list('image_hash', flat=True))
+        self.assertEqual(len(hashes), 1)
+        self.assertNotIn('', hashes)
+        self.assertEqual(Product.objects.get(name='Broken').image_hash, '')
+
+
+class ContentAddressedMediaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.storage = Product._meta.get_field('image').storage
+
+    def png(self, colour=(0, 0, 255)):
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10), colour).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def files(self):
+        return sorted(os.listdir(os.path.join(self.media, 'products')))
+
+    def test_identical_uploads_share_one_file(self):
+        first = Product.objects.create(user=self.user, name='A', cost_price=1, selling_price=2,
+                                       image=SimpleUploadedFile('a.PNG', self.png()))
+        second = Product.objects.create(user=self.user, name='B', cost_price=1, selling_price=2,
+                                        image=SimpleUploadedFile('b.png', self.png()))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^products/[0-9a-f]{64}\.png$')
+        self.assertEqual(len(self.files()), 1)
+
+    def test_renditions_are_replaced_not_renamed(self):
+        from django.core.files.base import ContentFile
+        from .thumbnails import rendition_name
+
+        name = rendition_name('products/' + 'a' * 64 + '.png', 'abcdef012345', 100, 'webp')
+        # Two jobs resizing the same image write the same name.
+        self.assertEqual(self.storage.save(name, ContentFile(b'first')), name)
+        self.assertEqual(self.storage.save(name, ContentFile(b'second')), name)
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'second')
+        self.assertEqual(self.files(), [os.path.basename(name)])
+
+    def test_reused_file_is_not_collected(self):
+        product = Product.objects.create(user=self.user, name='A', cost_price=1, selling_price=2,
+                                         image=SimpleUploadedFile('a.png', self.png()))
+        path = self.storage.path(product.image.name)
+        product.delete()
+        os.utime(path, (0, 0))
+        # Uploading the same picture again makes the old orphan young again.
+        Product.objects.create(user=self.user, name='B', cost_price=1, selling_price=2,
+                               image=SimpleUploadedFile('b.png', self.png()))
+        self.assertGreater(os.path.getmtime(path), time.time() - 60)
+        call_command('gc_media', min_age_hours=1, stdout=StringIO())
+        self.assertTrue(os.path.exists(path))
+
+    def test_dedupe_then_gc(self):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import FileSystemStorage
+
+        plain = FileSystemStorage()
+        for name in ('products/default.png', 'products/default_x1.png'):
+            plain.save(name, ContentFile(self.png()))
+        plain.save('products/other.png', ContentFile(self.png((0, 255, 0))))
+        product = Product.objects.create(user=self.user, name='A', cost_price=1, selling_price=2,
+                                         image='products/default_x1.png', image_hash='stale')
+
+        out = StringIO()
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('Renamed 2 file(s) and removed 1 duplicate(s)', out.getvalue())
+        product.refresh_from_db()
+        self.assertRegex(product.image.name, r'^products/[0-9a-f]{64}\.png$')
+        self.assertEqual(product.image_hash, '')
+        self.assertEqual(len(self.files()), 2)
+
+        call_command('backfill_thumbnails', workers=1, stdout=StringIO())
+        call_command('gc_media', min_age_hours=0, stdout=StringIO())
+        product.refresh_from_db()
+        remaining = self.files()
+        self.assertEqual(len(remaining), 7)  # the image and its six renditions
+        self.assertIn(os.path.basename(product.image.name), remaining)
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.other = User.objects.create_user('other', password='pw')
+        cls.supplier = Supplier.objects.create(user=cls.user, name='Acme', contact='0300', email='a@example.com')
+        cls.product = Product.objects.create(user=cls.user, name='Soap', cost_price=10, selling_price=15, stock=5)
+
+    def setUp(self):
+        caching.get_cache().clear()
+        caching.reset_counts()
+        self.addCleanup(caching.reset_counts)
+        self.client.force_login(self.user)
+
+    def test_second_visit_is_served_from_cache(self):
+        for name in ('products', 'suppliers', 'customers', 'sales', 'purchases', 'dashboard'):
+            self.client.get(reverse(name))
+            with self.assertNumQueries(2):  # session and user only
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+        counts = caching.counts()
+        self.assertEqual(counts['sale-form', 'hit'], 1)
+        self.assertEqual(counts['dashboard', 'miss'], 1)
+
+    def test_writes_invalidate_only_their_owner(self):
+        self.client.get(reverse('products'))
+        other_version = caching.data_version(self.other.pk)
+        Product.objects.filter(pk=self.product.pk).update(name='Not seen yet')
+        self.assertNotContains(self.client.get(reverse('products')), 'Not seen yet')
+
+        Supplier.objects.create(user=self.user, name='Beta', contact='0301', email='b@example.com')
+        self.assertContains(self.client.get(reverse('products')), 'Not seen yet')
+        self.assertEqual(caching.data_version(self.other.pk), other_version)
+
+    def test_bulk_writes_invalidate(self):
+        self.client.get(reverse('sales'))
+        create_invoice(self.user, [{'product': self.product.pk, 'quantity': 2}])
+        self.assertContains(self.client.get(reverse('sales')), 'Rs. 30')
+
+    def test_hit_and_miss_counters_on_metrics(self):
+        self.client.get(reverse('suppliers'))
+        self.client.get(reverse('suppliers'))
+        staff = User.objects.create_user('admin', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('inventory_cache_requests_total{name="suppliers",result="hit"} 1', body)
+        self.assertIn('inventory_cache_requests_total{name="suppliers",result="miss"} 1', body)
+
+
+class HttpCachingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        Product.objects.create(user=cls.user, name='Soap', cost_price=10, selling_price=15, stock=5)
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.client.force_login(self.user)
+
+    def test_unchanged_page_is_answered_with_304_before_rendering(self):
+        self.client.get(reverse('products'))  # sets the CSRF cookie the page's ETag depends on
+        response = self.client.get(reverse('products'))
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+        with self.assertNumQueries(2), self.assertTemplateNotUsed('inventory/products.html'):
+            response = self.client.get(reverse('products'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Product.objects.create(user=self.user, name='Rice', cost_price=1, selling_price=2)
+        response = self.client.get(reverse('products'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_pages_with_messages_are_not_tagged(self):
+        self.client.post(reverse('supplier_add'), {'name': 'Acme', 'contact': '0300', 'email': 'a@example.com'})
+        response = self.client.get(reverse('suppliers'))
+        self.assertContains(response, 'Acme')
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_html_is_compressed(self):
+        response = self.client.get(reverse('products'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_hashed_media_is_immutable(self):
+        from django.core.files.base import ContentFile
+        from django.test import RequestFactory
+        from .views import serve_media
+
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        with override_settings(MEDIA_ROOT=media):
+            storage = Product._meta.get_field('image').storage
+            hashed = storage.save('products/a.png', ContentFile(b'png bytes'))
+            plain = FileSystemStorage().save('products/legacy.png', ContentFile(b'png bytes'))
+            request = RequestFactory().get('/media/')
+            self.assertIn('immutable', serve_media(request, hashed)['Cache-Control'])
+            self.assertFalse(serve_media(request, plain).has_header('Cache-Control'))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.other = User.objects.create_user('other', password='pw')
+        cls.supplier = Supplier.objects.create(user=cls.user, name='Hilal Foods', contact='0300', email='h@example.com')
+        cls.chocolate = Product.objects.create(user=cls.user, name='Dark Chocolate 100g', category='Snacks',
+                                               cost_price=1, selling_price=2, supplier=cls.supplier)
+        Product.objects.create(user=cls.user, name='Chicken Masala', category='Spices', cost_price=1, selling_price=2)
+        Product.objects.create(user=cls.other, name='Milk Chocolate', cost_price=1, selling_price=2)
+
+    def names(self, query, user=None):
+        return [product.name for product in search.search(user or self.user, query)]
+
+    def test_words_match_as_prefixes_across_fields(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest("PostgreSQL searches names only")
+        self.assertEqual(self.names('choc'), ['Dark Chocolate 100g'])
+        self.assertEqual(self.names('dark 100'), ['Dark Chocolate 100g'])
+        self.assertEqual(self.names('hilal'), ['Dark Chocolate 100g'])
+        self.assertEqual(self.names('spices'), ['Chicken Masala'])
+        self.assertEqual(self.names('  '), [])
+
+    def test_only_the_users_products_are_found(self):
+        self.assertEqual(self.names('milk'), [])
+        self.assertEqual(self.names('choc', self.other), ['Milk Chocolate'])
+
+    @skipUnless(connection.vendor == 'postgresql', "trigram search needs PostgreSQL")
+    def test_trigram_search_on_names(self):
+        self.assertEqual(self.names('chocolate'), ['Dark Chocolate 100g'])
+        self.assertEqual(self.names('chiken masala'), ['Chicken Masala'])
+        self.assertEqual(self.names('hilal'), [])
+        self.assertEqual(self.names('chocolate', self.other), ['Milk Chocolate'])
+
+    def test_best_match_wins_among_many(self):
+        Product.objects.bulk_create([
+            Product(user=self.user, name=f'Biscuits {i}', description='Wafer with a tea flavour', cost_price=1,
+                    selling_price=2)
+            for i in range(250)
+        ])
+        Product.objects.create(user=self.user, name='Tea', cost_price=1, selling_price=2)
+        search.index_products(Product.objects.filter(name__startswith='Biscuits').values_list('pk', flat=True),
+                              new=True)
+        self.assertEqual(self.names('tea')[0], 'Tea')
+
+    def test_typos_are_corrected(self):
+        if not search.uses_fts():
+            self.skipTest("needs SQLite with FTS5")
+        self.assertEqual(self.names('choclate'), ['Dark Chocolate 100g'])
+        self.assertEqual(self.names('chikcen'), ['Chicken Masala'])
+        self.assertEqual(self.names('xyzzy'), [])
+
+    def test_index_follows_writes(self):
+        self.chocolate.name = 'Dark Truffle'
+        self.chocolate.save()
+        self.assertEqual(self.names('truff'), ['Dark Truffle'])
+        self.assertEqual(self.names('chocolate'), [])
+
+        self.supplier.name = 'Shan Traders'
+        self.supplier.save()
+        self.assertEqual(self.names('shan'), ['Dark Truffle'])
+        self.supplier.delete()
+        self.assertEqual(self.names('shan'), [])
+
+        self.chocolate.delete()
+        self.assertEqual(self.names('truff'), [])
+
+    def test_imported_products_are_indexed(self):
+        data = "name,category,cost_price,selling_price,stock\nBasmati Rice,Grocery,1,2,5\n"
+        result = import_rows(self.user, 'products', iter_rows(BytesIO(data.encode()), 'p.csv'))
+        self.assertEqual(result.created, 1)
+        self.assertEqual(self.names('basm'), ['Basmati Rice'])
+
+    def test_rebuild(self):
+        with connection.cursor() as cursor:
+            if search.uses_fts():
+                cursor.execute(f"DELETE FROM {search.FTS_TABLE}")
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.names('choc'), ['Dark Chocolate 100g'])
+
+    def test_view_returns_json(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('product_search'), {'q': 'choc', 'limit': '500'})
+        self.assertEqual(response.json(), {'results': [{
+            'id': self.chocolate.pk, 'name': 'Dark Chocolate 100g', 'category': 'Snacks',
+            'supplier': 'Hilal Foods', 'selling_price': '2.00', 'stock': 0,
+        }]})
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.other = User.objects.create_user('other', password='pw')
+        Customer.objects.bulk_create([Customer(user=cls.user, name=f'Customer {i:02}') for i in range(30)])
+        cls.customer = Customer.objects.get(name='Customer 07')
+        cls.product = Product.objects.create(user=cls.user, name='Green Tea', cost_price=1, selling_price=2, stock=5)
+        cls.foreign = Product.objects.create(user=cls.other, name='Green Apple', cost_price=1, selling_price=2)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_form_renders_only_the_chosen_option(self):
+        form = SaleForm(user=self.user, initial={'customer': self.customer.pk})
+        with self.assertNumQueries(1):
+            html = str(form['customer']) + str(form['product'])
+        self.assertIn('value="Customer 07"', html)
+        self.assertNotIn('Customer 08', html)
+        self.assertNotIn('Green Tea', html)
+
+    def test_submitted_id_is_validated_against_the_owner(self):
+        form = SaleForm({'product': self.foreign.pk, 'quantity': 1, 'amount': '2'}, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('product', form.errors)
+        form = SaleForm({'product': self.product.pk, 'quantity': 1, 'amount': '2'}, user=self.user)
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
+
+    def test_lists_are_paged_by_name(self):
+        response = self.client.get(reverse('autocomplete', args=['customers']))
+        data = response.json()
+        self.assertEqual([r['text'] for r in data['results']][:2], ['Customer 00', 'Customer 01'])
+        self.assertEqual(len(data['results']), 20)
+        data = self.client.get(reverse('autocomplete', args=['customers']), {'after': data['next']}).json()
+        self.assertEqual(len(data['results']), 10)
+        self.assertIsNone(data['next'])
+
+        data = self.client.get(reverse('autocomplete', args=['customers']), {'q': 'er 07'}).json()
+        self.assertEqual(data['results'], [{'id': self.customer.pk, 'text': 'Customer 07'}])
+
+    def test_products_are_searched(self):
+        data = self.client.get(reverse('autocomplete', args=['products']), {'q': 'gree'}).json()
+        self.assertEqual(data, {'results': [{'id': self.product.pk, 'text': 'Green Tea'}], 'next': None})
+        self.assertEqual(self.client.get(reverse('autocomplete', args=['orders'])).status_code, 404)
+
+
+class WriteTransactionTests(TransactionTestCase):
+    def flaky(self, failures, message='database is locked'):
+        calls = []
+
+        @db.write_transaction
+        def write():
+            calls.append(connection.in_atomic_block)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return 'done'
+        return write, calls
+
+    def test_locked_writes_are_retried_in_a_transaction(self):
+        write, calls = self.flaky(1)
+        with self.assertLogs('inventory.db', 'WARNING'):
+            self.assertEqual(write(), 'done')
+        self.assertEqual(calls, [True, True])
+
+    def test_retries_are_bounded(self):
+        write, calls = self.flaky(db.ATTEMPTS)
+        with self.assertLogs('inventory.db', 'WARNING'), self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), db.ATTEMPTS)
+
+    def test_other_errors_and_nested_calls_are_not_retried(self):
+        write, calls = self.flaky(1, 'no such table: nowhere')
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+
+        write, calls = self.flaky(1)
+        with self.assertRaises(OperationalError), transaction.atomic():
+            write()
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(INVENTORY_REPLICA_ALIASES=['replica1'])
+class ReplicaRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.router = PrimaryReplicaRouter()
+
+    def test_only_marked_reads_go_to_a_replica(self):
+        self.assertEqual(self.router.db_for_read(Sale), 'default')
+        with replica_reads(self.user.pk):
+            self.assertEqual(self.router.db_for_read(Sale), 'replica1')
+            self.assertEqual(self.router.db_for_read(User), 'default')
+            self.assertEqual(self.router.db_for_write(Sale), 'default')
+            # Reads after a write in the same block see it.
+            self.assertEqual(self.router.db_for_read(Sale), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'inventory'))
+
+    def test_reads_stay_on_the_primary_right_after_a_write(self):
+        caching.invalidate(self.user.pk)
+        with replica_reads(self.user.pk):
+            self.assertEqual(self.router.db_for_read(Sale), 'default')
+        other = User.objects.create_user('other', password='pw')
+        with replica_reads(other.pk):
+            self.assertEqual(self.router.db_for_read(Sale), 'replica1')
+
+    def test_views_and_streams_read_from_replicas(self):
+        from django.test import RequestFactory
+
+        request = RequestFactory().get('/')
+        request.user = self.user
+        view = reads_from_replica(lambda request: self.router.db_for_read(Sale))
+        self.assertEqual(view(request), 'replica1')
+
+        stream = iterate_from_replica(self.user.pk, (self.router.db_for_read(Sale) for _ in range(2)))
+        self.assertEqual(list(stream), ['replica1', 'replica1'])
+        self.assertEqual(self.router.db_for_read(Sale), 'default')
+
+    @override_settings(INVENTORY_REPLICA_ALIASES=[])
+    def test_without_replicas_everything_uses_the_primary(self):
+        with replica_reads(self.user.pk):
+            self.assertEqual(self.router.db_for_read(Sale), 'default')
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        Product.objects.create(user=cls.user, name='Soap', cost_price=10, selling_price=15, stock=2)
+        Product.objects.create(user=cls.user, name='Milk', cost_price=10, selling_price=15, stock=50,
+                               expiry_date=date.today() + timedelta(days=3))
+
+    def setUp(self):
+        caching.get_cache().clear()
+        caching.reset_counts()
+        self.addCleanup(caching.reset_counts)
+        self.addCleanup(cache.clear)  # forecasts
+
+    def test_home_counts_in_one_query(self):
+        self.client.force_login(self.user)
+        with self.assertNumQueries(4):  # session, user, both counts, products
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['low_stock'], 1)
+        self.assertEqual(response.context['soon_expiring'], 1)
+        self.assertEqual(len(response.context['products']), 2)
+
+    async def test_anonymous_home(self):
+        response = await self.async_client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['low_stock'], 0)
+
+    async def test_dashboard_is_cached_and_tagged(self):
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.get(reverse('dashboard'))  # sets the CSRF cookie
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_products'], 2)
+        response = await self.async_client.get(reverse('dashboard'), headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(caching.counts()['dashboard', 'hit'], 1)
+
+    async def test_login_required(self):
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(INVENTORY_REPLICA_ALIASES=['replica1'])
+    async def test_async_views_read_from_replicas(self):
+        from django.test import RequestFactory
+
+        async def view(request):
+            return PrimaryReplicaRouter().db_for_read(Sale)
+
+        request = RequestFactory().get('/')
+        request.auser = lambda: asyncio.sleep(0, self.user)
+        self.assertEqual(await reads_from_replica(view)(request), 'replica1')
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.supplier = Supplier.objects.create(user=cls.user, name='Acme', contact='0300', email='a@example.com')
+        cls.soap = Product.objects.create(user=cls.user, name='Soap', cost_price=10, selling_price=15, stock=100)
+        cls.rice = Product.objects.create(user=cls.user, name='Rice', cost_price=40, selling_price=50, stock=100)
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.client.force_login(self.user)
+
+    def sell(self, product, quantity, when):
+        sale = Sale.objects.create(user=self.user, product=product, quantity=quantity,
+                                   amount=product.selling_price * quantity)
+        Sale.objects.filter(pk=sale.pk).update(date=timezone.make_aware(datetime.combine(when, datetime.min.time())))
+
+    def test_writes_keep_rollups_in_step(self):
+        self.client.post(reverse('sale_add'), {'product': self.soap.pk, 'quantity': 2, 'amount': '30'})
+        sale = Sale.objects.get()
+        self.assertEqual(sale.cost, 20)
+        create_invoice(self.user, [{'product': self.soap.pk, 'quantity': 1}, {'product': self.rice.pk, 'quantity': 3}])
+        receive_purchase_order(self.user, self.supplier.pk, [{'product': self.rice.pk, 'quantity': 5,
+                                                               'total_price': Decimal('180')}])
+        sale.delete()
+
+        day = DailySales.objects.get(product=self.rice)
+        self.assertEqual((day.quantity, day.revenue, day.cost, day.purchased, day.purchase_total),
+                         (3, 150, 120, 5, 180))
+        self.assertEqual(MonthlySales.objects.get(product=self.soap).quantity, 1)
+        self.assertEqual(rollups.rollup_drift(self.user), [])
+
+    def test_report_combines_whole_months_and_edge_days(self):
+        self.sell(self.soap, 1, date(2025, 1, 20))
+        self.sell(self.soap, 2, date(2025, 2, 10))
+        self.sell(self.rice, 1, date(2025, 3, 5))
+        self.sell(self.rice, 1, date(2025, 3, 25))
+        rollups.rebuild_rollups(self.user)
+
+        report = rollups.report(self.user, date(2025, 1, 15), date(2025, 3, 10))
+        self.assertEqual([row['month'] for row in report['months']],
+                         [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)])
+        self.assertEqual((report['totals']['revenue'], report['totals']['cost'], report['totals']['profit']),
+                         (95, 70, 25))
+        self.assertEqual([(row['name'], row['quantity']) for row in report['top_products']],
+                         [('Rice', 1), ('Soap', 3)])
+        self.assertEqual(report['top_products'][1]['margin'], Decimal('33.3'))
+        self.assertEqual(rollups.report(self.user, date(2025, 4, 1), date(2025, 4, 30))['totals']['margin'], None)
+
+    def test_split_into_months_and_days(self):
+        self.assertEqual(rollups._split(date(2025, 1, 15), date(2025, 3, 10)),
+                         ((date(2025, 2, 1), date(2025, 3, 1)),
+                          [(date(2025, 1, 15), date(2025, 1, 31)), (date(2025, 3, 1), date(2025, 3, 10))]))
+        self.assertEqual(rollups._split(date(2025, 1, 1), date(2025, 12, 31)),
+                         ((date(2025, 1, 1), date(2026, 1, 1)), []))
+        self.assertEqual(rollups._split(date(2025, 1, 3), date(2025, 1, 9)),
+                         (None, [(date(2025, 1, 3), date(2025, 1, 9))]))
+
+    def test_rebuild_command_finds_and_fixes_drift(self):
+        self.sell(self.soap, 1, date(2025, 1, 20))
+        DailySales.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_sales_rollups', '--check', stdout=StringIO())
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        call_command('rebuild_sales_rollups', '--check', stdout=StringIO())
+
+    def test_report_page(self):
+        create_invoice(self.user, [{'product': self.rice.pk, 'quantity': 2}])
+        response = self.client.get(reverse('reports'))
+        self.assertContains(response, 'Rs. 100')
+        self.assertEqual(response.context['top_products'][0]['profit'], 20)
+        response = self.client.get(reverse('reports'), {'start': '2025-03-01', 'end': '2025-02-01'})
+        self.assertContains(response, 'must not be after')
+
+
+class StockLotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shop', password='pw')
+        cls.supplier = Supplier.objects.create(user=cls.user, name='Acme', contact='0300', email='a@example.com')
+        cls.milk = Product.objects.create(user=cls.user, name='Milk', cost_price=100, selling_price=120)
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.client.force_login(self.user)
+        self.today = date.today()
+
+    def buy(self, quantity, expiry_date, total='500'):
+        self.client.post(reverse('purchase_add'), {
+            'supplier': self.supplier.pk, 'product': self.milk.pk, 'quantity': quantity, 'total_price': total,
+            'expiry_date': expiry_date or '',
+        })
+
+    def remaining(self):
+        return list(StockLot.objects.filter(product=self.milk).order_by('id').values_list('remaining', flat=True))
+
+    def test_purchases_are_lots_and_sales_take_the_first_to_expire(self):
+        self.buy(5, self.today + timedelta(days=20))
+        self.buy(5, self.today + timedelta(days=3), total='400')
+        self.buy(5, None)
+        lot = StockLot.objects.get(product=self.milk, expiry_date=self.today + timedelta(days=3))
+        self.assertEqual((lot.purchase.quantity, lot.unit_cost), (5, Decimal('80')))
+        self.milk.refresh_from_db()
+        self.assertEqual((self.milk.stock, self.milk.expiry_date), (15, self.today + timedelta(days=3)))
+
+        self.client.post(reverse('sale_add'), {'product': self.milk.pk, 'quantity': 7, 'amount': '840'})
+        self.assertEqual(self.remaining(), [3, 0, 5])
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.expiry_date, self.today + timedelta(days=20))
+
+        create_invoice(self.user, [{'product': self.milk.pk, 'quantity': 4}])
+        self.assertEqual(self.remaining(), [0, 0, 4])
+        self.milk.refresh_from_db()
+        self.assertEqual((self.milk.stock, self.milk.expiry_date), (4, None))
+
+    def test_purchase_order_lines_are_lots(self):
+        receive_purchase_order(self.user, self.supplier.pk, [
+            {'product': self.milk.pk, 'quantity': 4, 'total_price': Decimal('10'),
+             'expiry_date': self.today + timedelta(days=1)},
+            {'product': self.milk.pk, 'quantity': 2, 'total_price': Decimal('10')},
+        ])
+        self.assertEqual(list(StockLot.objects.order_by('id').values_list('remaining', 'expiry_date', 'unit_cost')),
+                         [(4, self.today + timedelta(days=1), Decimal('2.5')), (2, None, Decimal('5'))])
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.expiry_date, self.today + timedelta(days=1))
+
+    def test_editing_stock_and_expiry(self):
+        self.buy(5, self.today + timedelta(days=3))
+        form = {'name': 'Milk', 'cost_price': '100', 'selling_price': '120'}
+        self.client.post(reverse('product_edit', args=[self.milk.pk]),
+                         dict(form, stock=8, expiry_date=self.today + timedelta(days=9)))
+        self.assertEqual(list(StockLot.objects.order_by('id').values_list('remaining', 'expiry_date')),
+                         [(5, self.today + timedelta(days=3)), (3, self.today + timedelta(days=9))])
+
+        self.client.post(reverse('product_edit', args=[self.milk.pk]),
+                         dict(form, stock=6, expiry_date=self.today + timedelta(days=4)))
+        self.assertEqual(list(StockLot.objects.order_by('id').values_list('remaining', 'expiry_date')),
+                         [(3, self.today + timedelta(days=4)), (3, self.today + timedelta(days=9))])
+        self.milk.refresh_from_db()
+        self.assertEqual((self.milk.stock, self.milk.expiry_date), (6, self.today + timedelta(days=4)))
+
+    def test_editing_expiry_without_stock(self):
+        self.client.post(reverse('product_edit', args=[self.milk.pk]), {
+            'name': 'Milk', 'cost_price': '100', 'selling_price': '120', 'stock': 0, 'expiry_date': '2031-05-05',
+        })
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.expiry_date, date(2031, 5, 5))
+
+    def test_expiring_and_expired_stock(self):
+        StockLot.objects.bulk_create([
+            StockLot(user=self.user, product=self.milk, quantity=4, remaining=2,
+                     expiry_date=self.today - timedelta(days=2), unit_cost=Decimal('90')),
+            StockLot(user=self.user, product=self.milk, quantity=3, remaining=3,
+                     expiry_date=self.today - timedelta(days=1)),
+            StockLot(user=self.user, product=self.milk, quantity=3, remaining=0,
+                     expiry_date=self.today - timedelta(days=1)),
+            StockLot(user=self.user, product=self.milk, quantity=1, remaining=1,
+                     expiry_date=self.today + timedelta(days=5)),
+            StockLot(user=self.user, product=self.milk, quantity=1, remaining=1,
+                     expiry_date=self.today + timedelta(days=30)),
+        ])
+        self.assertEqual([lot.expiry_date for lot in lots.expiring(self.user, 7)], [self.today + timedelta(days=5)])
+        self.assertEqual(lots.expired_stock(self.user), {'lots': 2, 'units': 5, 'value': Decimal('480')})
+
+        response = self.client.get(reverse('expiring'), {'days': 30})
+        self.assertEqual(len(response.context['expiring_lots']), 2)
+        self.assertContains(response, 'worth Rs. 480.00')
+
+    @skipUnless(connection.vendor == 'sqlite', "Checks SQLite's query plan")
+    def test_expiry_queries_use_the_partial_index(self):
+        self.assertIn('lot_user_expiry_idx', lots.expired(self.user).explain())
+        self.assertIn('lot_user_expiry_idx', lots.expiring(self.user, 7).explain())
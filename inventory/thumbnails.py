@@ -0,0 +1,130 @@
+"""
+Resized renditions of product images.
+
+Every upload is scaled to each of ``WIDTHS`` and saved as WebP and JPEG
+next to the original, named after a hash of the original's content:
+``products/DSC_0585.3f2a9c1b7e4d.w100.webp``. The hash is kept on
+``Product.image_hash``, so templates can build every rendition URL
+without touching storage, and a replaced image never reuses the old
+renditions. Products without a hash yet fall back to the original file.
+"""
+import hashlib
+import io
+import posixpath
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from . import caching
+
+WIDTHS = (100, 300, 600)
+# extension -> (Pillow format, save options)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+HASH_LENGTH = 12
+
+
+def content_hash(fileobj):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(1 << 16), b''):
+        digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def rendition_name(name, digest, width, ext):
+    stem = posixpath.splitext(name)[0]
+    return f'{stem}.{digest}.w{width}.{ext}'
+
+
+def is_rendition(name):
+    parts = posixpath.basename(name).rsplit('.', 3)
+    return len(parts) == 4 and len(parts[1]) == HASH_LENGTH and parts[2][:1] == 'w' and parts[3] in FORMATS
+
+
+def image_storage():
+    """The storage product images, and so their renditions, live in."""
+    from .models import Product
+
+    return Product._meta.get_field('image').storage
+
+
+def generate(name, storage=None):
+    """
+    Write every rendition of the image stored as ``name`` and return its
+    content hash. Renditions that already exist are left alone; two jobs
+    racing on the same image write the same names, and the storage
+    replaces rather than renames an existing rendition.
+    """
+    storage = storage or image_storage()
+    with storage.open(name, 'rb') as original:
+        digest = content_hash(original)
+        wanted = [
+            (width, ext, rendition_name(name, digest, width, ext))
+            for width in WIDTHS for ext in FORMATS
+        ]
+        wanted = [item for item in wanted if not storage.exists(item[2])]
+        if not wanted:
+            return digest
+        original.seek(0)
+        image = Image.open(original)
+        # Let the JPEG decoder skip detail no rendition needs; a large
+        # photo then decodes several times faster.
+        image.draft('RGB', (max(WIDTHS), max(WIDTHS) * image.height // max(image.width, 1)))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    for width, ext, target in wanted:
+        resized = image.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+        pil_format, options = FORMATS[ext]
+        if pil_format == 'JPEG' and resized.mode != 'RGB':
+            resized = _flatten(resized)
+        elif resized.mode not in ('RGB', 'RGBA'):
+            resized = resized.convert('RGBA')
+        buffer = io.BytesIO()
+        resized.save(buffer, pil_format, **options)
+        storage.save(target, ContentFile(buffer.getvalue()))
+    return digest
+
+
+def _flatten(image):
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def refresh(product):
+    """Generate renditions for ``product.image`` and store its hash on the product."""
+    from .models import Product
+
+    digest = generate(product.image.name, product.image.storage) if product.image else ''
+    product.image_hash = digest
+    Product.objects.filter(pk=product.pk).update(image_hash=digest)
+    caching.invalidate(product.user_id)
+    return digest
+
+
+def backfill_one(name):
+    """Process-pool entry point: ``(name, hash, error)`` for one stored image."""
+    try:
+        return name, generate(name), None
+    except Exception as exc:  # a corrupt upload must not stop the rest
+        return name, None, f'{type(exc).__name__}: {exc}'
+
+
+def srcsets(name, digest):
+    """``{ext: srcset}`` for the renditions of ``name``."""
+    storage = image_storage()
+    return {
+        ext: ', '.join(f'{storage.url(rendition_name(name, digest, w, ext))} {w}w' for w in WIDTHS)
+        for ext in FORMATS
+    }
+
+
+def fallback_url(name, digest, display_width):
+    """URL of the smallest JPEG rendition sharp on a 2x screen at ``display_width``."""
+    width = next((w for w in WIDTHS if w >= display_width * 2), WIDTHS[-1])
+    return image_storage().url(rendition_name(name, digest, width, 'jpg'))
@@ -6,6 +6,12 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('products/', views.products, name='products'),
     path('products/add/', views.product_add, name='product_add'),
+    path('products/search/', views.product_search, name='product_search'),
+    path('import/', views.import_inventory, name='import_inventory'),
+    path('export/<str:kind>.<str:fmt>', views.export_data, name='export_data'),
+    path('export/<str:kind>.<str:fmt>/background/', views.export_background, name='export_background'),
+    path('jobs/<int:pk>/', views.job_detail, name='job_detail'),
+    path('autocomplete/<str:kind>/', views.autocomplete, name='autocomplete'),
     path('products/<int:pk>/', views.product_view, name='product_view'),
     path('products/<int:pk>/edit/', views.product_edit, name='product_edit'),
     path('products/<int:pk>/delete/', views.product_delete, name='product_delete'),
@@ -18,11 +24,16 @@ urlpatterns = [
 
     path('sales/', views.sales, name='sales'),
     path('sales/add/', views.sale_add, name='sale_add'),
+    path('sales/invoice/', views.invoice_add, name='invoice_add'),
 
     path('purchases/', views.purchases, name='purchases'),
     path('purchases/add/', views.purchase_add, name='purchase_add'),
+    path('purchases/receive/', views.purchase_order_add, name='purchase_order_add'),
 
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('reports/', views.reports, name='reports'),
+    path('expiring/', views.expiring, name='expiring'),
+    path('metrics', views.metrics, name='metrics'),
     path('contact/', views.contact, name='contact'),
      path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
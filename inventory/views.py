@@ -1,12 +1,41 @@
+import asyncio
+import csv
+import json
+import os
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_POST
+from django.views.static import serve
 from django.contrib import messages
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Count, Q
+from django.urls import reverse
 from datetime import date, timedelta
-from .models import Product, Supplier, Customer, Sale, Purchase, ContactMessage
-from .forms import ProductForm, ContactForm, SupplierForm, CustomerForm, SaleForm, PurchaseForm
-from decimal import Decimal
+from .models import NEEDS_REORDER, Product, Supplier, Customer, Sale, Purchase, ContactMessage, StockLot, StockMovement, Job
+from .forms import ProductForm, ContactForm, SupplierForm, CustomerForm, SaleForm, PurchaseForm, SaleFilterForm
+from .forms import ImportForm, InvoiceForm, InvoiceLineForm, PurchaseOrderForm, PurchaseOrderLineForm, ReportForm
+from .db import write_transaction
+from .exports import EXPORTS, FORMATS, export_storage, stream_export
+from .forecasting import get_forecasts
+from .importers import UnreadableFile, import_rows, iter_rows
+from .invoices import InvoiceError, create_invoice
+from .jobs import enqueue
+from .pagination import keyset_paginate
+from .profiling import registry as profiling_registry
+from .purchasing import PurchaseOrderError, receive_purchase_order
+from .routers import iterate_from_replica, reads_from_replica
+from .search import search as search_products
+from .stats import aget_dashboard_stats
+from .stock import InsufficientStock, add_stock, apply_stock_change, remove_stock
+from .storage import is_immutable
+from . import caching, lots, rollups
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from .forms import RegisterForm
 
 def register_view(request):
@@ -43,117 +72,103 @@ def logout_view(request):
     logout(request)
     return redirect('login')
 
-def home(request):
-    products = Product.objects.all()[:6]
-
-    low_stock = Product.objects.filter(stock__lt=5).count()
-    soon_expiring = Product.objects.filter(
-        expiry_date__lte=date.today() + timedelta(days=7)
-    ).count()
+async def home(request):
+    # Shared with the template context, which would load the user again.
+    request.user = user = await request.auser()
+    products = Product.objects.all()
+    counts = {'low_stock': 0, 'soon_expiring': 0}
+    if user.is_authenticated:
+        products = products.filter(user=user)
+        counts, products = await asyncio.gather(
+            products.aaggregate(
+                low_stock=Count('pk', filter=NEEDS_REORDER),
+                soon_expiring=Count('pk', filter=Q(expiry_date__lte=date.today() + timedelta(days=7))),
+            ),
+            _alist(products[:6]),
+        )
+    else:
+        products = await _alist(products[:6])
 
-    return render(request, "inventory/home.html", {
+    # Rendering reads the session and user, which is blocking I/O.
+    return await sync_to_async(render)(request, "inventory/home.html", {
         "products": products,
-        "low_stock": low_stock,
-        "soon_expiring": soon_expiring,
+        **counts,
     })
 
 
+async def _alist(queryset):
+    return [obj async for obj in queryset]
 
-@login_required
-def dashboard(request):
-    total_products = Product.objects.filter(user=request.user).count()
-    total_suppliers = Supplier.objects.filter(user=request.user).count()
-    total_customers = Customer.objects.filter(user=request.user).count()
 
-    total_sales = (
-        Sale.objects.filter(user=request.user)
-        .aggregate(total=Sum('amount'))['total'] or 0
-    )
 
-    last_7_days_sales = (
-        Sale.objects.filter(
-            user=request.user,
-            date__gte=date.today() - timedelta(days=7)
+@login_required
+@caching.conditional_page
+@reads_from_replica
+async def dashboard(request):
+    request.user = user = await request.auser()
+
+    async def overview():
+        stats, forecasts = await asyncio.gather(
+            aget_dashboard_stats(user),
+            sync_to_async(get_forecasts)(user.id),
         )
-        .aggregate(total=Sum('amount'))['total'] or 0
-    )
+        return {
+            "total_products": stats.product_count,
+            "total_suppliers": stats.supplier_count,
+            "total_customers": stats.customer_count,
+            "total_sales": stats.revenue,
+            # Forecasts change with the date as well as the data.
+            "predicted_next_week": round(forecasts.revenue_next_week),
+        }
+
+    context = await caching.acached(user.id, 'dashboard', overview, date.today())
+    return await sync_to_async(render)(request, "inventory/dashboard.html", context)
 
-    predicted_next_week = round(last_7_days_sales * Decimal('1.10'))
 
-    return render(request, "inventory/dashboard.html", {
-        "total_products": total_products,
-        "total_suppliers": total_suppliers,
-        "total_customers": total_customers,
-        "total_sales": total_sales,
-        "predicted_next_week": predicted_next_week,
-    })
 
 
+PRODUCTS_PER_PAGE = 50
 
 
 @login_required
+@caching.conditional_page
+@reads_from_replica
 def products(request):
-    products = Product.objects.filter(user=request.user)
-    suppliers = Supplier.objects.filter(user=request.user)
-    form = ProductForm()
-
-    today = date.today()
-    next_7 = today + timedelta(days=7)
-
-    for p in products:
-        if p.expiry_date:
-            if p.expiry_date < today:
-                p.expiry_status = "expired"
-            elif today <= p.expiry_date <= next_7:
-                p.expiry_status = "near"
-            else:
-                p.expiry_status = "good"
-        else:
-            p.expiry_status = None
+    products = (
+        Product.objects.filter(user=request.user)
+        .with_expiry_status()
+        .only('id', 'name', 'category', 'selling_price', 'stock', 'reorder_point', 'image', 'image_hash', 'expiry_date')
+    )
+    page = caching.cached(
+        request.user.id, 'products',
+        lambda: keyset_paginate(products, request.GET, 'id', per_page=PRODUCTS_PER_PAGE, descending=False),
+        # The expiry status of each row depends on the date.
+        request.GET.get('after'), request.GET.get('before'), date.today(),
+    )
+    form = ProductForm(user=request.user)
 
     return render(request, 'inventory/products.html', {
-        'products': products,
+        'products': page,
+        'page': page,
         'form': form,
-        'suppliers': suppliers,
     })
 
 
-
+@reads_from_replica
 def product_view(request, pk):
-    product = get_object_or_404(Product, pk=pk)
-
-    today = date.today()
-    next_7 = today + timedelta(days=7)
-
-    # EXPIRY STATUS
-    if product.expiry_date:
-        if product.expiry_date < today:
-            product.expiry_status = "expired"
-        elif today <= product.expiry_date <= next_7:
-            product.expiry_status = "near"
-        else:
-            product.expiry_status = "good"
-    else:
-        product.expiry_status = None
+    product = get_object_or_404(Product.objects.with_expiry_status(), pk=pk)
+    product_lots = lots.open_lots().filter(product=product).order_by(*lots.fefo_order())
 
     # SALES PREDICTION LOGIC
-    last_10_sales = (
-        Sale.objects.filter(product=product)
-        .order_by('-date')[:10]
-        .values_list('quantity', flat=True)
-    )
-
-    if last_10_sales:
-        avg_sales = sum(last_10_sales) / len(last_10_sales)
-        expected_sales = round(avg_sales)
-    else:
-        expected_sales = 0
+    tomorrow, _ = get_forecasts(product.user_id).for_product(product.pk)
+    expected_sales = round(tomorrow)
 
     expected_profit = expected_sales * (product.selling_price - product.cost_price)
     future_stock = product.stock - expected_sales
 
     return render(request, 'inventory/product_view.html', {
         'product': product,
+        'lots': product_lots,
         'expected_sales': expected_sales,
         'expected_profit': expected_profit,
         'future_stock': future_stock,
@@ -161,18 +176,41 @@ def product_view(request, pk):
 
 
 
+@login_required
 def product_edit(request, pk):
-    product = get_object_or_404(Product, pk=pk)
+    product = get_object_or_404(Product, pk=pk, user=request.user)
 
     if request.method == 'POST':
-        form = ProductForm(request.POST, request.FILES, instance=product)
+        old_stock, old_expiry = product.stock, product.expiry_date
+        form = ProductForm(request.POST, request.FILES, instance=product, user=request.user)
         if form.is_valid():
-            form.save()
-            messages.success(request, 'Product updated successfully.')
-            return redirect('products')
-    else:
-        form = ProductForm(instance=product)
+            product = form.save(commit=False)
+            # Stock is not saved with the row; the difference is logged as
+            # an adjustment so the movement history still adds up. Added
+            # stock is a lot expiring on the date given; otherwise a new
+            # date corrects the lots that expire first.
+            try:
+                with transaction.atomic():
+                    product.save(update_fields=[f for f in form.fields if f not in ('stock', 'expiry_date')])
+                    if product.stock != old_stock:
+                        apply_stock_change(product.pk, product.stock - old_stock, StockMovement.ADJUSTMENT,
+                                           user=request.user, expiry_date=product.expiry_date,
+                                           unit_cost=product.cost_price)
+                    if product.stock <= old_stock and product.expiry_date != old_expiry:
+                        lots.redate(product.pk, old_expiry, product.expiry_date)
+                if 'image' in form.changed_data:
+                    _refresh_thumbnails(product)
+                messages.success(request, 'Product updated successfully.')
+            except InsufficientStock as exc:
+                messages.error(request, str(exc))
+        else:
+            for field, errors in form.errors.items():
+                for error in errors:
+                    messages.error(request, f"{field}: {error}")
+        return redirect('products')
 
+    # GET returns just the form, which products.html loads into its edit modal
+    form = ProductForm(instance=product, user=request.user)
     return render(request, 'inventory/product_edit.html', {'form': form, 'product': product})
 
 
@@ -201,8 +239,10 @@ def contact(request):
 
 
 @login_required
+@caching.conditional_page
+@reads_from_replica
 def suppliers(request):
-    suppliers = Supplier.objects.filter(user=request.user)
+    suppliers = caching.cached(request.user.id, 'suppliers', lambda: list(Supplier.objects.filter(user=request.user)))
     form = SupplierForm()
     return render(request, 'inventory/suppliers.html', {
         'suppliers': suppliers,
@@ -214,8 +254,10 @@ def suppliers(request):
 
 
 @login_required
+@caching.conditional_page
+@reads_from_replica
 def customers(request):
-    customers = Customer.objects.filter(user=request.user)
+    customers = caching.cached(request.user.id, 'customers', lambda: list(Customer.objects.filter(user=request.user)))
     form = CustomerForm()
 
     if request.method == 'POST':
@@ -243,12 +285,38 @@ def customer_add(request):
 
 
 
+SALES_PER_PAGE = 50
+
+
 @login_required
+@caching.conditional_page
+@reads_from_replica
 def sales(request):
-    sales = Sale.objects.filter(user=request.user)
+    sales = (
+        Sale.objects.filter(user=request.user)
+        .select_related('product', 'customer')
+        .only('id', 'quantity', 'amount', 'date', 'product__name', 'customer__name')
+    )
+    filter_form = SaleFilterForm(request.GET, user=request.user)
+    if filter_form.is_valid():
+        sales = filter_form.filter(sales)
+    page = caching.cached(
+        request.user.id, 'sales',
+        lambda: keyset_paginate(sales, request.GET, 'date', per_page=SALES_PER_PAGE),
+        request.GET.urlencode(),
+    )
+
+    # Keep the active filters on the pager links, but not the old cursor.
+    filter_query = request.GET.copy()
+    filter_query.pop('after', None)
+    filter_query.pop('before', None)
+
     form = SaleForm(user=request.user)
     return render(request, 'inventory/sales.html', {
-        'sales': sales,
+        'sales': page,
+        'page': page,
+        'filter_form': filter_form,
+        'filter_query': filter_query.urlencode(),
         'form': form
     })
 
@@ -260,9 +328,13 @@ def sales(request):
 
 
 @login_required
+@caching.conditional_page
+@reads_from_replica
 def purchases(request):
-    purchases = Purchase.objects.filter(user=request.user)
-    form = PurchaseForm()
+    purchases = caching.cached(request.user.id, 'purchases', lambda: list(
+        Purchase.objects.filter(user=request.user).select_related('supplier').order_by('-date', '-id')
+    ))
+    form = PurchaseForm(user=request.user)
     return render(request, 'inventory/purchases.html', {
         'form': form,
         'purchases': purchases
@@ -272,11 +344,20 @@ def purchases(request):
 @login_required
 def product_add(request):
     if request.method == "POST":
-        form = ProductForm(request.POST, request.FILES)
+        form = ProductForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             product = form.save(commit=False)
             product.user = request.user
-            product.save()
+            with transaction.atomic():
+                product.save()
+                if product.stock:
+                    # Opening stock, so the movement log adds up to the stock level
+                    StockMovement.objects.create(user=request.user, product=product, change=product.stock,
+                                                 reason=StockMovement.ADJUSTMENT)
+                    lots.receive([StockLot(user=request.user, product=product, quantity=product.stock,
+                                           expiry_date=product.expiry_date, unit_cost=product.cost_price)])
+            if product.image:
+                _refresh_thumbnails(product)
             messages.success(request, "Product added successfully!")
         else:
             for field, errors in form.errors.items():
@@ -284,6 +365,124 @@ def product_add(request):
                     messages.error(request, f"{field}: {error}")
     return redirect('products')
 
+def _refresh_thumbnails(product):
+    # Resizing a large photo takes a while, so a worker does it; until
+    # then the page shows the original image.
+    if product.image_hash:
+        product.image_hash = ''
+        Product.objects.filter(pk=product.pk).update(image_hash='')
+        caching.invalidate(product.user_id)
+    if product.image:
+        enqueue('thumbnails.refresh', {'product_id': product.pk, 'image': product.image.name}, user=product.user,
+                priority=5)
+
+@login_required
+def import_inventory(request):
+    form = ImportForm()
+    result = None
+    if request.method == 'POST':
+        form = ImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = import_rows(request.user, form.cleaned_data['kind'], iter_rows(upload, upload.name))
+            except (ImportError, UnicodeDecodeError, csv.Error, UnreadableFile) as exc:
+                messages.error(request, f"Could not read {upload.name}: {exc}")
+            else:
+                messages.success(request, f"Imported {result.created} row(s); {result.failed} rejected.")
+
+    return render(request, 'inventory/import.html', {'form': form, 'result': result})
+
+@login_required
+def export_data(request, kind, fmt):
+    if kind not in EXPORTS or fmt not in FORMATS:
+        raise Http404("Unknown export")
+    rows = iterate_from_replica(request.user.id, stream_export(request.user, kind, fmt))
+    response = StreamingHttpResponse(rows, content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{kind}-{date.today()}.{fmt}"'
+    return response
+
+@login_required
+@require_POST
+def export_background(request, kind, fmt):
+    if kind not in EXPORTS or fmt not in FORMATS:
+        raise Http404("Unknown export")
+    # A client retrying the same request sends the same Idempotency-Key
+    # and gets the job it already queued.
+    key = request.headers.get('Idempotency-Key')
+    job = enqueue('exports.write', {'user_id': request.user.id, 'kind': kind, 'fmt': fmt}, user=request.user,
+                  idempotency_key=f'export:{request.user.id}:{key}' if key else None)
+    return JsonResponse(_job_json(job), status=202)
+
+@login_required
+def job_detail(request, pk):
+    job = get_object_or_404(Job, pk=pk, user=request.user)
+    if 'download' in request.GET:
+        if job.task != 'exports.write' or job.status != Job.DONE:
+            raise Http404("Nothing to download yet")
+        name = job.result['file']
+        return FileResponse(export_storage().open(name, 'rb'), as_attachment=True, filename=os.path.basename(name))
+    return JsonResponse(_job_json(job))
+
+def _job_json(job):
+    data = {
+        'job': job.id,
+        'task': job.task,
+        'status': job.status,
+        'attempts': job.attempts,
+        'result': job.result,
+        'url': reverse('job_detail', args=[job.id]),
+    }
+    if job.task == 'exports.write' and job.status == Job.DONE:
+        data['download'] = data['url'] + '?download=1'
+    return data
+
+SEARCH_LIMIT = 50
+
+
+@login_required
+def product_search(request):
+    """JSON typeahead results for ``?q=``, best matches first."""
+    try:
+        limit = min(int(request.GET.get('limit', 10)), SEARCH_LIMIT)
+    except ValueError:
+        limit = 10
+    results = search_products(request.user, request.GET.get('q', ''), limit=max(limit, 1))
+    return JsonResponse({'results': [{
+        'id': product.id,
+        'name': product.name,
+        'category': product.category,
+        'supplier': product.supplier_name,
+        'selling_price': str(product.selling_price),
+        'stock': product.stock,
+    } for product in results]})
+
+AUTOCOMPLETE_MODELS = {'products': Product, 'customers': Customer, 'suppliers': Supplier}
+AUTOCOMPLETE_PER_PAGE = 20
+
+
+@login_required
+def autocomplete(request, kind):
+    """
+    Choices for the autocomplete widgets as ``{results: [{id, text}], next}``.
+    Rows are listed by name a page at a time (``next`` is the ``after``
+    cursor of the following page); products matching ``q`` come from the
+    search index instead, best first.
+    """
+    model = AUTOCOMPLETE_MODELS.get(kind)
+    if model is None:
+        raise Http404("Unknown list")
+    q = request.GET.get('q', '').strip()
+    if kind == 'products' and q:
+        found = search_products(request.user, q, limit=AUTOCOMPLETE_PER_PAGE)
+        return JsonResponse({'results': [{'id': p.id, 'text': p.name} for p in found], 'next': None})
+
+    rows = model.objects.filter(user=request.user).only('id', 'name')
+    if q:
+        rows = rows.filter(name__icontains=q)
+    page = keyset_paginate(rows, request.GET, 'name', per_page=AUTOCOMPLETE_PER_PAGE, descending=False)
+    return JsonResponse({'results': [{'id': obj.id, 'text': obj.name} for obj in page], 'next': page.next_cursor})
+
 @login_required
 def supplier_add(request):
     if request.method == 'POST':
@@ -304,37 +503,148 @@ def sale_add(request):
         if form.is_valid():
             sale = form.save(commit=False)
             sale.user = request.user
-            
-            # Stock Check Logic
-            product = sale.product
-            if product.stock >= sale.quantity:
-                sale.save()
-                product.stock -= sale.quantity
-                product.save()
+
+            # Stock Check Logic: the sale is rolled back if the stock ran out
+            try:
+                _record_sale(sale)
                 messages.success(request, 'Sale recorded and stock updated!')
-            else:
-                messages.error(request, f"Insufficient stock! Only {product.stock} left.")
+            except InsufficientStock as exc:
+                messages.error(request, str(exc))
         else:
             messages.error(request, "Invalid sale data.")
     return redirect('sales')
 
+@write_transaction
+def _record_sale(sale):
+    sale.save()
+    remove_stock(sale.product_id, sale.quantity, StockMovement.SALE, user=sale.user, sale=sale)
+
+def _parse_lines(request, form_class, line_form_class):
+    """
+    Validate a JSON body of the form ``{..., "lines": [{...}, ...]}``.
+    Returns ``(form, line_forms, None)`` or ``(None, None, error_response)``.
+    """
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return None, None, JsonResponse({'error': 'Request body must be JSON.'}, status=400)
+    if not isinstance(payload, dict) or not isinstance(payload.get('lines'), list):
+        return None, None, JsonResponse({'error': 'Expected an object with a "lines" list.'}, status=400)
+
+    form = form_class(payload)
+    line_forms = [line_form_class(line if isinstance(line, dict) else {}) for line in payload['lines']]
+    errors = {}
+    if not form.is_valid():
+        errors.update(form.errors.get_json_data())
+    for i, line_form in enumerate(line_forms):
+        if not line_form.is_valid():
+            errors[f'lines.{i}'] = line_form.errors.get_json_data()
+    if errors:
+        return None, None, JsonResponse({'errors': errors}, status=400)
+    return form, line_forms, None
+
+@login_required
+@require_POST
+def invoice_add(request):
+    form, line_forms, error = _parse_lines(request, InvoiceForm, InvoiceLineForm)
+    if error:
+        return error
+
+    try:
+        invoice = create_invoice(request.user, [f.cleaned_data for f in line_forms],
+                                 customer_id=form.cleaned_data['customer'])
+    except InvoiceError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    except InsufficientStock as exc:
+        return JsonResponse({'error': str(exc), 'product': exc.product_id, 'available': exc.available},
+                            status=409)
+    return JsonResponse({'invoice': invoice.id, 'total': str(invoice.total), 'lines': len(line_forms)},
+                        status=201)
+
+@login_required
+@require_POST
+def purchase_order_add(request):
+    form, line_forms, error = _parse_lines(request, PurchaseOrderForm, PurchaseOrderLineForm)
+    if error:
+        return error
+
+    try:
+        order = receive_purchase_order(request.user, form.cleaned_data['supplier'],
+                                       [f.cleaned_data for f in line_forms])
+    except PurchaseOrderError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse({'order': order.id, 'total': str(order.total), 'lines': len(line_forms)}, status=201)
+
 @login_required
 def purchase_add(request):
     if request.method == 'POST':
-        form = PurchaseForm(request.POST)
+        form = PurchaseForm(request.POST, user=request.user)
         if form.is_valid():
             purchase = form.save(commit=False)
             purchase.user = request.user
-            purchase.save()
+            purchase.product_name = purchase.product.name
 
-            # Update stock based on product name
-            try:
-                prod = Product.objects.get(name=purchase.product_name, user=request.user)
-                prod.stock += purchase.quantity
-                prod.save()
-                messages.success(request, 'Purchase recorded and stock increased!')
-            except Product.DoesNotExist:
-                messages.warning(request, 'Purchase saved, but no matching product name found to update stock.')
+            _record_purchase(purchase, form.cleaned_data['expiry_date'])
+            messages.success(request, 'Purchase recorded and stock increased!')
         else:
             messages.error(request, "Invalid purchase data.")
-    return redirect('purchases')
\ No newline at end of file
+    return redirect('purchases')
+
+@write_transaction
+def _record_purchase(purchase, expiry_date):
+    purchase.save()
+    add_stock(purchase.product_id, purchase.quantity, StockMovement.PURCHASE, user=purchase.user, purchase=purchase,
+              expiry_date=expiry_date, unit_cost=lots.unit_cost(purchase.total_price, purchase.quantity))
+
+
+@login_required
+@caching.conditional_page
+@reads_from_replica
+def reports(request):
+    start, end = rollups.year_to_date()
+    form = ReportForm(request.GET or None)
+    if form.is_valid():
+        start = form.cleaned_data['start'] or start
+        end = form.cleaned_data['end'] or end
+    report = caching.cached(request.user.id, 'report', lambda: rollups.report(request.user, start, end), start, end)
+    return render(request, 'inventory/reports.html', {'form': form, 'start': start, 'end': end, **report})
+
+
+EXPIRY_DAYS = 7
+EXPIRY_MAX_DAYS = 365
+EXPIRED_LOTS_SHOWN = 50
+
+
+@login_required
+@caching.conditional_page
+@reads_from_replica
+def expiring(request):
+    try:
+        days = min(max(int(request.GET.get('days', EXPIRY_DAYS)), 0), EXPIRY_MAX_DAYS)
+    except ValueError:
+        days = EXPIRY_DAYS
+    today = date.today()
+    context = caching.cached(request.user.id, 'expiring', lambda: {
+        'expiring_lots': list(lots.expiring(request.user, days, today)),
+        'expired_lots': list(lots.expired(request.user, today)[:EXPIRED_LOTS_SHOWN]),
+        'expired': lots.expired_stock(request.user, today),
+    }, days, today)
+    return render(request, 'inventory/expiring.html', {'days': days, **context})
+
+
+@staff_member_required
+def metrics(request):
+    return HttpResponse(profiling_registry.render() + caching.render_metrics(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def serve_media(request, path):
+    """
+    Uploaded files, for development (``DEBUG``) only. Files named by their
+    content hash never change, so browsers may keep them for a year
+    without asking again.
+    """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if response.status_code == 200 and is_immutable(path):
+        patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
@@ -0,0 +1,38 @@
+"""
+Autocomplete widget for choosing a product, customer or supplier.
+
+A ``<select>`` lists every row the user owns, so it grows with the shop.
+This widget renders only the chosen row's label; as the user types, the
+browser fetches matches a page at a time from ``/autocomplete/<kind>/``
+(``static/js/autocomplete.js``). The field's queryset still validates the
+submitted id, with a single primary-key lookup.
+"""
+from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+
+class Autocomplete(forms.Widget):
+    template_name = 'inventory/widgets/autocomplete.html'
+
+    def __init__(self, kind, attrs=None):
+        super().__init__(attrs)
+        self.kind = kind
+        # Set by ModelChoiceField to an iterator over its queryset.
+        self.choices = ()
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['url'] = reverse('autocomplete', args=[self.kind])
+        context['widget']['label'] = self.label_for(context['widget']['value'])
+        return context
+
+    def label_for(self, value):
+        queryset = getattr(self.choices, 'queryset', None)
+        if value is None or queryset is None:
+            return ''
+        try:
+            obj = queryset.filter(pk=value).first()
+        except (ValueError, TypeError, ValidationError):
+            return ''
+        return self.choices.field.label_from_instance(obj) if obj else ''
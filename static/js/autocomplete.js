@@ -0,0 +1,78 @@
+// Autocomplete for the widgets in inventory/widgets.py. Typing in the
+// visible input fetches matches from the widget's URL; picking one stores
+// its id in the hidden input that is submitted. Events are delegated from
+// the document so forms loaded into modals later work too.
+(function () {
+  var DELAY = 150;
+
+  function results(box) { return box.querySelector('.autocomplete-results'); }
+
+  function load(box, params, append) {
+    var seq = String(Number(box.dataset.seq || 0) + 1);
+    box.dataset.seq = seq;
+    fetch(box.dataset.autocompleteUrl + '?' + new URLSearchParams(params), {credentials: 'same-origin'})
+      .then(function (response) { return response.json(); })
+      .then(function (data) {
+        if (box.dataset.seq !== seq) return;  // a newer request is on its way
+        var list = results(box);
+        if (!append) list.innerHTML = '';
+        var more = list.querySelector('[data-next]');
+        if (more) more.remove();
+        data.results.forEach(function (item) {
+          var option = document.createElement('button');
+          option.type = 'button';
+          option.className = 'list-group-item list-group-item-action';
+          option.dataset.id = item.id;
+          option.textContent = item.text;
+          list.appendChild(option);
+        });
+        if (data.next) {
+          more = document.createElement('button');
+          more.type = 'button';
+          more.className = 'list-group-item list-group-item-action text-muted';
+          more.dataset.next = data.next;
+          more.textContent = 'More...';
+          list.appendChild(more);
+        }
+        if (!list.children.length) {
+          list.innerHTML = '<span class="list-group-item text-muted">No matches</span>';
+        }
+      });
+  }
+
+  function closeAll(except) {
+    document.querySelectorAll('.autocomplete').forEach(function (box) {
+      if (box !== except) results(box).innerHTML = '';
+    });
+  }
+
+  document.addEventListener('input', function (event) {
+    var box = event.target.closest('.autocomplete');
+    if (!box || event.target.type !== 'search') return;
+    box.querySelector('input[type=hidden]').value = '';
+    clearTimeout(box._timer);
+    box._timer = setTimeout(function () { load(box, {q: event.target.value}, false); }, DELAY);
+  });
+
+  document.addEventListener('focusin', function (event) {
+    var box = event.target.closest('.autocomplete');
+    closeAll(box);
+    if (box && event.target.type === 'search' && !results(box).children.length) {
+      load(box, {q: event.target.value}, false);
+    }
+  });
+
+  document.addEventListener('click', function (event) {
+    var box = event.target.closest('.autocomplete');
+    var item = event.target.closest('.autocomplete-results button');
+    if (!box) {
+      closeAll(null);
+    } else if (item && item.dataset.next) {
+      load(box, {q: box.querySelector('input[type=search]').value, after: item.dataset.next}, true);
+    } else if (item) {
+      box.querySelector('input[type=hidden]').value = item.dataset.id;
+      box.querySelector('input[type=search]').value = item.textContent;
+      results(box).innerHTML = '';
+    }
+  });
+})();